@@ -1,8 +1,9 @@
-from langchain_openai import ChatOpenAI
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode, tools_condition
 
+import backends
+
 # Tool
 def multiply(a: int, b: int) -> int:
     """Multiplies a and b.
@@ -14,7 +15,8 @@ def multiply(a: int, b: int) -> int:
     return a * b
 
 # LLM with bound tool
-llm = ChatOpenAI(model="gpt-4o")
+# No Configuration in this graph, so the fake backend is selected with the BACKEND=fake env var (see backends.py)
+llm = backends.chat_model(model="gpt-4o")
 llm_with_tools = llm.bind_tools([multiply])
 
 # Node
@@ -0,0 +1,195 @@
+""" Compare the stock SqliteSaver with TunedSqliteSaver on chatbot checkpoints.
+
+A short chatbot session is recorded once against a fake model, then replayed
+(checkpoint + pending writes per super-step) into fresh databases to measure
+write throughput with concurrent threads, and into a database of --checkpoints
+rows to measure get_state / get_state_history latency.
+
+Run from this directory:
+
+    python bench_checkpointer.py --checkpoints 100000 --workers 8
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+import chatbot
+from checkpointer import TunedSqliteSaver
+
+def record_session(turns: int) -> list:
+
+    """ Run the chatbot for a few turns and return its checkpoint tuples, oldest first """
+
+    chatbot.model = FakeListChatModel(responses=[
+        "Sure, here is a longer answer that mentions a few details about the question you asked.",
+        "Summary: the user introduced themselves and asked about football teams and players.",
+    ])
+    memory = MemorySaver()
+    graph = chatbot.workflow.compile(checkpointer=memory)
+    config = {"configurable": {"thread_id": "template"}}
+    for turn in range(turns):
+        graph.invoke({"messages": [HumanMessage(content=f"Question {turn}: tell me about the 49ers?")]}, config)
+    return list(reversed(list(memory.list(config))))
+
+def replay(saver, thread_id: str, session: list, interval: float = 0.0) -> int:
+
+    """ Write a recorded session under a new thread id, one super-step every `interval` seconds """
+
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    for step in session:
+        time.sleep(interval)
+        checkpoint = {**step.checkpoint, "id": str(uuid6())}
+        config = saver.put(config, checkpoint, step.metadata, {})
+        writes = defaultdict(list)
+        for task_id, channel, value in step.pending_writes:
+            writes[task_id].append((channel, value))
+        for task_id, task_writes in writes.items():
+            saver.put_writes(config, task_writes, task_id)
+    return len(session)
+
+def open_saver(kind: str, path: str):
+    if kind == "stock":
+        return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+    return TunedSqliteSaver(sqlite3.connect(path, check_same_thread=False, cached_statements=256))
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {p50 * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms"
+
+def bench_writes(kind: str, session: list, total: int, workers: int, tmp: str, rate: float = 0) -> None:
+
+    """ Checkpoints per second with `workers` threads writing, plus read latency meanwhile.
+
+    With a `rate` the writers are paced to that many checkpoints per second in
+    total, so read latency is compared under the same load.
+    """
+
+    path = os.path.join(tmp, f"writes_{kind}_{rate}.db")
+    saver = open_saver(kind, path)
+    saver.setup()
+    replay(saver, "probe", session)
+    probe = {"configurable": {"thread_id": "probe"}}
+
+    # One reader polls the latest checkpoint while the writers run
+    done, read_latency = threading.Event(), []
+    def poll():
+        while not done.is_set():
+            start = time.perf_counter()
+            saver.get_tuple(probe)
+            read_latency.append(time.perf_counter() - start)
+    reader = threading.Thread(target=poll)
+    reader.start()
+
+    threads = max(total // len(session), workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        interval = workers / rate if rate else 0.0
+        written = sum(pool.map(lambda i: replay(saver, f"thread-{i}", session, interval), range(threads)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    reader.join()
+    print(f"{kind:<6} {written / elapsed:9.0f} checkpoints/s   get_tuple during writes: {percentiles(read_latency)}")
+
+def populate(path: str, session: list, total: int, workers: int) -> list[str]:
+
+    """ Fill a database with `total` checkpoints and return the thread ids """
+
+    saver = open_saver("tuned", path)
+    saver.setup()
+    thread_ids = [f"thread-{i}" for i in range(total // len(session))]
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda thread_id: replay(saver, thread_id, session), thread_ids))
+    saver.close()
+    return thread_ids
+
+def bench_history(kind: str, path: str, thread_ids: list[str], samples: int) -> None:
+
+    """ get_state, get_state_history and a parent -> children lookup on sampled threads """
+
+    saver = open_saver(kind, path)
+    graph = chatbot.workflow.compile(checkpointer=saver)
+    sampled = thread_ids[::max(len(thread_ids) // samples, 1)][:samples]
+
+    state_latency, history_latency, children_latency = [], [], []
+    conn = sqlite3.connect(path)
+    for thread_id in sampled:
+        config = {"configurable": {"thread_id": thread_id}}
+        start = time.perf_counter()
+        graph.get_state(config)
+        state_latency.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        history = list(graph.get_state_history(config))
+        history_latency.append(time.perf_counter() - start)
+
+        # Which checkpoints branch off this one, e.g. to find forks after time travel
+        parent = history[-1].config["configurable"]["checkpoint_id"]
+        start = time.perf_counter()
+        conn.execute("SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' AND parent_checkpoint_id = ?",
+                     (thread_id, parent)).fetchall()
+        children_latency.append(time.perf_counter() - start)
+    conn.close()
+
+    print(f"{kind:<6} get_state          {percentiles(state_latency)}")
+    print(f"{kind:<6} get_state_history  {percentiles(history_latency)}   ({len(history)} states per thread)")
+    print(f"{kind:<6} children lookup    {percentiles(children_latency)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20, help="Chatbot turns in the recorded session")
+    parser.add_argument("--writes", type=int, default=5000, help="Checkpoints written in the throughput test")
+    parser.add_argument("--checkpoints", type=int, default=100_000, help="Checkpoints in the history test database")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=500, help="Paced write rate (checkpoints/s) for read latency under load")
+    parser.add_argument("--samples", type=int, default=50, help="Threads sampled for history latency")
+    args = parser.parse_args()
+
+    session = record_session(args.turns)
+    print(f"recorded session: {len(session)} checkpoints over {args.turns} turns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\nwrites ({args.workers} threads, {args.writes} checkpoints)")
+        for kind in ("stock", "tuned"):
+            bench_writes(kind, session, args.writes, args.workers, tmp)
+
+        # Unpaced writers saturate the interpreter, so compare reads at a fixed write rate too
+        print(f"\nwrites paced to {args.rate:.0f} checkpoints/s")
+        for kind in ("stock", "tuned"):
+            bench_writes(kind, session, args.writes // 2, args.workers, tmp, args.rate)
+
+        tuned_path = os.path.join(tmp, "history_tuned.db")
+        start = time.perf_counter()
+        thread_ids = populate(tuned_path, session, args.checkpoints, args.workers)
+        print(f"\npopulated {len(thread_ids) * len(session)} checkpoints in {time.perf_counter() - start:.1f}s")
+
+        # The stock saver gets the same rows without the parent index
+        stock_path = os.path.join(tmp, "history_stock.db")
+        shutil.copy(tuned_path, stock_path)
+        with sqlite3.connect(stock_path) as conn:
+            conn.execute("DROP INDEX checkpoints_parent_idx")
+
+        print(f"\nhistory ({args.samples} threads)")
+        for kind, path in (("stock", stock_path), ("tuned", tuned_path)):
+            bench_history(kind, path, thread_ids, args.samples)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+""" Measure what compaction reclaims and how it affects live checkpoint writes.
+
+A database is filled with replayed chatbot sessions. Then the same write load
+runs twice, once alone and once with the compactor working through the
+database, and the put latency percentiles of the two runs are compared.
+
+Run from this directory:
+
+    python bench_compaction.py --threads 500 --keep-last 10
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from bench_checkpointer import record_session, replay
+from checkpointer import DeltaSqliteSaver, TunedSqliteSaver
+from compaction import Compactor, file_bytes
+
+def timed(saver_class):
+
+    """ A saver class that records how long every put takes """
+
+    class TimedSaver(saver_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def put(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().put(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    return TimedSaver
+
+def percentile(samples: list[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+def write_load(saver, session: list, prefix: str, threads: int, workers: int, interval: float) -> list[float]:
+    saver.latencies = []
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda i: replay(saver, f"{prefix}-{i}", session, interval), range(threads)))
+    return saver.latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=500, help="Threads in the database before compaction")
+    parser.add_argument("--keep-last", type=int, default=10)
+    parser.add_argument("--live-threads", type=int, default=40, help="Threads written during each measured run")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.002, help="Seconds between super-steps per writer")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.001)
+    parser.add_argument("--delta", action="store_true", help="Use DeltaSqliteSaver instead of TunedSqliteSaver")
+    args = parser.parse_args()
+
+    session = record_session(20)
+    saver_class = timed(DeltaSqliteSaver if args.delta else TunedSqliteSaver)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoints.db")
+        saver = saver_class(sqlite3.connect(path, check_same_thread=False))
+        with ThreadPoolExecutor(args.workers) as pool:
+            list(pool.map(lambda i: replay(saver, f"old-{i}", session), range(args.threads)))
+        saver.flush()
+        print(f"database: {args.threads * len(session)} checkpoints, {file_bytes(path) / 1e6:.1f} MB")
+
+        alone = write_load(saver, session, "alone", args.live_threads, args.workers, args.interval)
+
+        compactor = Compactor(path, keep_last=args.keep_last, batch_size=args.batch_size, pause=args.pause)
+        stats, compaction_seconds = {}, [0.0]
+        def compact():
+            start = time.perf_counter()
+            stats.update(compactor.run())
+            compaction_seconds[0] = time.perf_counter() - start
+        worker = threading.Thread(target=compact)
+        worker.start()
+        during = write_load(saver, session, "during", args.live_threads, args.workers, args.interval)
+        worker.join()
+        compactor.close()
+
+        # Every thread must still load after compaction
+        for thread_id in ("old-0", f"old-{args.threads - 1}", "during-0"):
+            assert saver.get_tuple({"configurable": {"thread_id": thread_id}}) is not None
+        saver.close()
+
+    print(f"compaction: {compaction_seconds[0]:.1f}s, {stats['transactions']} transactions, "
+          f"{stats['checkpoints_deleted']} checkpoints, {stats['writes_deleted'] + stats.get('writes_dropped', 0)} writes, "
+          f"{stats.get('rebased', 0)} rebased")
+    print(f"reclaimed: {stats['bytes_deleted'] / 1e6:.1f} MB of rows, {stats['free_bytes'] / 1e6:.1f} MB of free pages")
+    print(f"{'put latency':<22}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, samples in (("alone", alone), ("during compaction", during)):
+        print(f"{name:<22}{statistics.median(samples) * 1000:>9.2f}{percentile(samples, 0.99):>9.2f}{max(samples) * 1000:>9.2f}")
+
+if __name__ == "__main__":
+    main()
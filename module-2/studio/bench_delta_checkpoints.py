@@ -0,0 +1,110 @@
+""" Compare full and delta-encoded checkpoints on one long chatbot thread.
+
+The chatbot runs without summarization, so `messages` grows every turn and each
+full checkpoint re-serializes the whole conversation.
+
+Run from this directory:
+
+    python bench_delta_checkpoints.py --turns 500 --snapshot-every 50
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from langgraph.graph import StateGraph, START, END
+
+import chatbot
+from checkpointer import DeltaSqliteSaver, TunedSqliteSaver
+
+def build_graph():
+
+    """ The chatbot's conversation node on its own, with no summarization """
+
+    builder = StateGraph(chatbot.State)
+    builder.add_node("conversation", chatbot.call_model)
+    builder.add_edge(START, "conversation")
+    builder.add_edge("conversation", END)
+    return builder
+
+def open_saver(kind: str, path: str, snapshot_every: int):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    if kind == "full":
+        return TunedSqliteSaver(conn)
+    return DeltaSqliteSaver(conn, snapshot_every=snapshot_every)
+
+def ms(samples: list[float]) -> str:
+    samples = sorted(samples)
+    return f"p50 {statistics.median(samples) * 1000:7.2f} ms   p99 {samples[int(len(samples) * 0.99)] * 1000:7.2f} ms"
+
+def run(kind: str, args, tmp: str) -> None:
+    path = os.path.join(tmp, f"{kind}.db")
+    config = {"configurable": {"thread_id": "long"}}
+
+    saver = open_saver(kind, path, args.snapshot_every)
+    graph = build_graph().compile(checkpointer=saver)
+    start = time.perf_counter()
+    for turn in range(args.turns):
+        graph.invoke({"messages": [HumanMessage(content=f"Turn {turn}: tell me more about the 49ers' season.")]}, config)
+    elapsed = time.perf_counter() - start
+    saver.close()
+
+    conn = sqlite3.connect(path)
+    rows, checkpoint_bytes = conn.execute("SELECT COUNT(*), SUM(LENGTH(checkpoint)) FROM checkpoints").fetchone()
+    conn.close()
+
+    # A fresh saver so reads start with an empty value cache, as in a new process
+    saver = open_saver(kind, path, args.snapshot_every)
+    graph = build_graph().compile(checkpointer=saver)
+    ids = [state.config["configurable"]["checkpoint_id"] for state in graph.get_state_history(config)]
+
+    cold = open_saver(kind, path, args.snapshot_every)
+    cold_graph = build_graph().compile(checkpointer=cold)
+    start = time.perf_counter()
+    cold_graph.get_state(config)
+    latest = time.perf_counter() - start
+
+    random_reads = []
+    rng = random.Random(0)
+    for checkpoint_id in rng.sample(ids, min(args.samples, len(ids))):
+        reader = open_saver(kind, path, args.snapshot_every)
+        reader_graph = build_graph().compile(checkpointer=reader)
+        start = time.perf_counter()
+        reader_graph.get_state({"configurable": {"thread_id": "long", "checkpoint_id": checkpoint_id}})
+        random_reads.append(time.perf_counter() - start)
+        reader.close()
+
+    start = time.perf_counter()
+    list(graph.get_state_history(config))
+    history = time.perf_counter() - start
+
+    print(f"{kind:<6} checkpoint bytes {checkpoint_bytes / 1e6:8.2f} MB   file {os.path.getsize(path) / 1e6:8.2f} MB   "
+          f"rows {rows}   run {elapsed:6.2f}s")
+    print(f"{kind:<6} cold get_state latest {latest * 1000:7.2f} ms   cold get_state random {ms(random_reads)}   "
+          f"full history {history:6.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--snapshot-every", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=50, help="Random checkpoints read back cold")
+    args = parser.parse_args()
+
+    chatbot.model = FakeListChatModel(responses=[
+        "They had a strong season, with a top-ranked defense and a deep playoff run behind a healthy roster.",
+    ])
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ("full", "delta"):
+            run(kind, args, tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+""" Compare the chatbot's summarization modes against a fake chat model.
+
+legacy     summarize after the reply once there are more than 6 messages, resending all of them
+tokens     summarize after the reply once the messages exceed the token budget, folding only removed ones
+parallel   like tokens, but the summary runs next to the reply in the same step
+
+Reports summarizer prompt tokens, and per turn the time until the reply is
+streamed and until the turn ends.
+
+Run from this directory:
+
+    python bench_summarization.py --turns 60 --latency 0.3
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from typing import Literal
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, RemoveMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+
+import chatbot
+import fakes
+import tokens
+
+class PromptTokens(BaseCallbackHandler):
+
+    """ Sums prompt tokens per graph node """
+
+    def __init__(self):
+        self.tokens, self.calls = {}, {}
+
+    def on_chat_model_start(self, serialized, messages, *, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "?")
+        self.tokens[node] = self.tokens.get(node, 0) + tokens.message_tokens(messages[0])
+        self.calls[node] = self.calls.get(node, 0) + 1
+
+def legacy_graph():
+
+    """ The chatbot as it was: a message-count trigger and a full resend """
+
+    def should_continue(state) -> Literal["summarize_conversation", "__end__"]:
+        return "summarize_conversation" if len(state["messages"]) > 6 else END
+
+    def summarize_conversation(state):
+        summary = state.get("summary", "")
+        prompt = (f"This is summary of the conversation to date: {summary}\n\n"
+                  "Extend the summary by taking into account the new messages above:"
+                  if summary else "Create a summary of the conversation above:")
+        response = chatbot.model.invoke(state["messages"] + [HumanMessage(content=prompt)])
+        return {"summary": response.content, "messages": [RemoveMessage(id=m.id) for m in state["messages"][:-2]]}
+
+    builder = StateGraph(chatbot.State)
+    builder.add_node("conversation", chatbot.call_model)
+    builder.add_node(summarize_conversation)
+    builder.add_edge(START, "conversation")
+    builder.add_conditional_edges("conversation", should_continue)
+    builder.add_edge("summarize_conversation", END)
+    return builder
+
+def user_messages(turns: int) -> list[str]:
+    rng = random.Random(0)
+    return [" ".join(rng.choice(fakes.WORDS) for _ in range(rng.choice((8, 20, 60, 150)))) for _ in range(turns)]
+
+def run(mode: str, args) -> None:
+    builder = legacy_graph() if mode == "legacy" else chatbot.workflow
+    graph = builder.compile(checkpointer=MemorySaver())
+    recorder = PromptTokens()
+    config = {"configurable": {"thread_id": mode, "parallel_summary": mode == "parallel"}, "callbacks": [recorder]}
+
+    reply_latency, turn_latency = [], []
+    for text in user_messages(args.turns):
+        start = time.perf_counter()
+        for update in graph.stream({"messages": [HumanMessage(content=text)]}, config, stream_mode="updates"):
+            if "conversation" in update:
+                reply_latency.append(time.perf_counter() - start)
+        turn_latency.append(time.perf_counter() - start)
+
+    def p(samples, q):
+        return sorted(samples)[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+    state = graph.get_state(config)
+    print(f"{mode:<10}{recorder.calls.get('summarize_conversation', 0):>11}"
+          f"{recorder.tokens.get('summarize_conversation', 0):>16,}{recorder.tokens.get('conversation', 0):>15,}"
+          f"{statistics.median(reply_latency) * 1000:>11.0f}{p(reply_latency, 0.99):>11.0f}"
+          f"{statistics.median(turn_latency) * 1000:>11.0f}{p(turn_latency, 0.99):>11.0f}"
+          f"{tokens.message_tokens(state.values['messages']):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM latency per call (seconds)")
+    args = parser.parse_args()
+
+    chatbot.model = fakes.FakeChatModel(latency=args.latency)
+    print(f"{'mode':<10}{'summaries':>11}{'summary tokens':>16}{'reply tokens':>15}"
+          f"{'reply p50':>11}{'reply p99':>11}{'turn p50':>11}{'turn p99':>11}{'context':>10}")
+    for mode in ("legacy", "tokens", "parallel"):
+        run(mode, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+""" Turn latency of the chatbot with inline, parallel and background summarization.
+
+Several conversations run at once against a fake chat model. In background
+mode turns go through SummaryWorker.run_turn and summaries are applied later
+with update_state.
+
+Run from this directory:
+
+    python bench_summary_worker.py --conversations 8 --turns 30 --latency 0.3
+"""
+
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+import chatbot
+import fakes
+import tokens
+from bench_summarization import user_messages
+from summary_worker import SummaryWorker
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    def p(q):
+        return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return f"{statistics.median(samples) * 1000:>9.0f}{p(0.95):>9.0f}{p(0.99):>9.0f}"
+
+def run(mode: str, args) -> None:
+    graph = chatbot.workflow.compile(checkpointer=MemorySaver())
+    worker = SummaryWorker(graph, workers=args.workers) if mode == "background" else None
+    texts = user_messages(args.turns)
+
+    def conversation(i: int) -> list[float]:
+        config = {"configurable": {"thread_id": f"{mode}-{i}", "parallel_summary": mode == "parallel"}}
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            if worker:
+                worker.run_turn({"messages": [HumanMessage(content=text)]}, config)
+            else:
+                graph.invoke({"messages": [HumanMessage(content=text)]}, config)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(args.think)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.conversations) as pool:
+        latencies = [latency for result in pool.map(conversation, range(args.conversations)) for latency in result]
+    if worker:
+        worker.close()
+    elapsed = time.perf_counter() - start
+
+    # Background summaries must leave every thread within budget, with no message lost or duplicated
+    context = []
+    for i in range(args.conversations):
+        values = graph.get_state({"configurable": {"thread_id": f"{mode}-{i}"}}).values
+        context.append(tokens.message_tokens(values["messages"]))
+        assert len({m.id for m in values["messages"]}) == len(values["messages"])
+
+    stats = worker.stats if worker else {}
+    print(f"{mode:<12}{percentiles(latencies)}{elapsed:>9.1f}{max(context):>13}"
+          f"{stats.get('applied', '-'):>9}{stats.get('conflicts', '-'):>11}{stats.get('coalesced', '-'):>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--think", type=float, default=0.05, help="Pause between a reply and the next message")
+    parser.add_argument("--workers", type=int, default=2, help="Background summary workers")
+    args = parser.parse_args()
+
+    chatbot.model = fakes.FakeChatModel(latency=args.latency)
+    print(f"{'mode':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'total s':>9}{'max context':>13}"
+          f"{'applied':>9}{'conflicts':>11}{'coalesced':>11}")
+    for mode in ("inline", "parallel", "background"):
+        run(mode, args)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 from typing import Literal
 from langchain_core.messages import HumanMessage, SystemMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
 
+import backends
+import configuration
+import llm_cache
+import tokens
+
 # We will use this model for both the conversation and the summarization
-from langchain_openai import ChatOpenAI
-model = ChatOpenAI(model="gpt-4o", temperature=0) 
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache())
+
+# Set in the configurable by SummaryWorker.run_turn (summary_worker.py) for the turns it will summarize after
+SUMMARY_WORKER_KEY = "summary_worker"
 
 # State class to store messages and summary
 class State(MessagesState):
@@ -32,21 +40,60 @@ def call_model(state: State):
     response = model.invoke(messages)
     return {"messages": response}
 
+def over_budget(state: State, config: RunnableConfig) -> bool:
+    
+    """Whether the conversation's messages have outgrown the token budget."""
+    
+    configurable = configuration.Configuration.from_runnable_config(config)
+    return tokens.message_tokens(state["messages"]) > configurable.summary_trigger_tokens
+
+def background_summary(config: RunnableConfig) -> bool:
+    
+    """Whether a SummaryWorker summarizes after this turn, rather than the graph."""
+    
+    configurable = configuration.Configuration.from_runnable_config(config)
+    # Without a worker attached nothing would ever summarize, so the graph does it inline
+    return configurable.background_summary and bool(config.get("configurable", {}).get(SUMMARY_WORKER_KEY))
+
+# Start the turn, summarizing alongside the reply when running in parallel mode
+def route_turn(state: State, config: RunnableConfig) -> list[str]:
+    
+    """Return the nodes to run for this turn."""
+    
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if configurable.parallel_summary and not background_summary(config) and over_budget(state, config):
+        # The reply is produced from the messages as they are now; the summary
+        # node only removes older ones, so the two updates never conflict.
+        # Both run in the same super-step, so the turn still waits for the summary
+        return ["conversation", "summarize_conversation"]
+    return ["conversation"]
+
 # Determine whether to end or summarize the conversation
-def should_continue(state: State) -> Literal["summarize_conversation", "__end__"]:
+def should_continue(state: State, config: RunnableConfig) -> Literal["summarize_conversation", "__end__"]:
     
     """Return the next node to execute."""
     
-    messages = state["messages"]
+    configurable = configuration.Configuration.from_runnable_config(config)
     
-    # If there are more than six messages, then we summarize the conversation
-    if len(messages) > 6:
+    # A SummaryWorker (summary_worker.py) summarizes after the turn has returned
+    if background_summary(config):
+        return END
+    
+    # If the messages no longer fit the token budget, then we summarize the conversation
+    if not configurable.parallel_summary and over_budget(state, config):
         return "summarize_conversation"
     
     # Otherwise we can just end
     return END
 
-def summarize_conversation(state: State):
+def summarize_conversation(state: State, config: RunnableConfig):
+    
+    configurable = configuration.Configuration.from_runnable_config(config)
+    
+    # Only the messages about to be removed are folded into the summary
+    to_fold, _ = tokens.split_for_summary(state["messages"], configurable.summary_keep_tokens)
+    if not to_fold:
+        return {}
     
     # First get the summary if it exists
     summary = state.get("summary", "")
@@ -64,21 +111,21 @@ def summarize_conversation(state: State):
         # If no summary exists, just create a new one
         summary_message = "Create a summary of the conversation above:"
 
-    # Add prompt to our history
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
+    # Add prompt to the messages being folded
+    messages = to_fold + [HumanMessage(content=summary_message)]
     response = model.invoke(messages)
     
-    # Delete all but the 2 most recent messages and add our summary to the state 
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
+    # Delete the folded messages and add our summary to the state 
+    delete_messages = [RemoveMessage(id=m.id) for m in to_fold]
     return {"summary": response.content, "messages": delete_messages}
 
 # Define a new graph
-workflow = StateGraph(State)
+workflow = StateGraph(State, config_schema=configuration.Configuration)
 workflow.add_node("conversation", call_model)
 workflow.add_node(summarize_conversation)
 
-# Set the entrypoint as conversation
-workflow.add_edge(START, "conversation")
+# Set the entrypoint as conversation, plus the summary in parallel mode
+workflow.add_conditional_edges(START, route_turn, ["conversation", "summarize_conversation"])
 workflow.add_conditional_edges("conversation", should_continue)
 workflow.add_edge("summarize_conversation", END)
 
@@ -0,0 +1,246 @@
+""" Compact a checkpoint database by dropping old checkpoints and their writes.
+
+Keeps the last N checkpoints of every thread and/or those younger than a TTL,
+and works in small transactions so it can run next to live graphs. Writes of
+retained checkpoints are kept unless --drop-writes is given:
+
+    python compaction.py ../state_db/example.db --keep-last 5
+    python compaction.py checkpoints.sqlite --ttl 86400 --batch-size 200 --pause 0.01
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from checkpointer import DELTA_TYPE_PREFIX, DeltaSqliteSaver
+
+# Offset between the UUID epoch (1582-10-15) and the Unix epoch, in 100 ns ticks
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+def checkpoint_time(checkpoint_id: str) -> float:
+
+    """ Unix time at which a checkpoint was created, read from its uuid6 id """
+
+    value = uuid.UUID(checkpoint_id).int
+    ticks = ((value >> 96) << 28) | (((value >> 80) & 0xFFFF) << 12) | ((value >> 64) & 0x0FFF)
+    return (ticks - UUID_EPOCH_OFFSET) / 1e7
+
+def _batches(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _placeholders(n: int) -> str:
+    return ", ".join("?" * n)
+
+def file_bytes(database_path: str) -> int:
+
+    """ Size of the database on disk, counting the write-ahead log """
+
+    wal_path = database_path + "-wal"
+    return os.path.getsize(database_path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+def retained(rows: list[tuple[str, Optional[str]]], keep_last: Optional[int], ttl: Optional[float], now: float) -> set[str]:
+
+    """ Checkpoint ids to keep for one thread, given (checkpoint_id, parent_id) rows newest first.
+
+    A checkpoint is kept if it is among the last `keep_last` or younger than
+    `ttl` seconds. The latest checkpoint is always kept.
+    """
+
+    keep = {rows[0][0]}
+    if keep_last:
+        keep.update(checkpoint_id for checkpoint_id, _ in rows[:keep_last])
+    if ttl:
+        keep.update(checkpoint_id for checkpoint_id, _ in rows if now - checkpoint_time(checkpoint_id) < ttl)
+    return keep
+
+class Compactor:
+
+    """ Applies a retention policy to a checkpoint database one thread at a time.
+
+    Each step commits on its own, so a live saver on the same file only ever
+    waits for one small transaction.
+    """
+
+    def __init__(self,
+                 database_path: str,
+                 keep_last: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 drop_writes: bool = False,
+                 batch_size: int = 500,
+                 pause: float = 0.0,
+                 busy_timeout_ms: int = 5000):
+        if not keep_last and not ttl:
+            raise ValueError("Set keep_last and/or ttl")
+        self.database_path = database_path
+        self.keep_last = keep_last
+        self.ttl = ttl
+        self.drop_writes = drop_writes
+        self.batch_size = batch_size
+        self.pause = pause
+        self.conn = sqlite3.connect(database_path, check_same_thread=False)
+        self.conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        # Only used to decode, rebuild and re-encode delta checkpoints
+        self.saver = DeltaSqliteSaver(self.conn, pool_size=0)
+        self.stats = defaultdict(int)
+
+    def _commit(self) -> None:
+        self.conn.commit()
+        self.stats["transactions"] += 1
+        if self.pause:
+            time.sleep(self.pause)
+
+    def _row_bytes(self, table: str, size_expr: str, where: str, params: list) -> int:
+        return self.conn.execute(f"SELECT COALESCE(SUM({size_expr}), 0) FROM {table} WHERE {where}", params).fetchone()[0]
+
+    def _delete_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_ids: list[str], stat: str) -> None:
+        for batch in _batches(checkpoint_ids, self.batch_size):
+            where = f"thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({_placeholders(len(batch))})"
+            params = [thread_id, checkpoint_ns, *batch]
+            self.stats["bytes_deleted"] += self._row_bytes("writes", "COALESCE(LENGTH(value), 0)", where, params)
+            self.stats[stat] += self.conn.execute(f"DELETE FROM writes WHERE {where}", params).rowcount
+            self._commit()
+
+    def _rebase(self, thread_id: str, checkpoint_ns: str, keep: set[str]) -> None:
+
+        """ Store kept delta checkpoints in full when their base is about to go """
+
+        rows = self.conn.execute(
+            "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND type LIKE ?",
+            (thread_id, checkpoint_ns, DELTA_TYPE_PREFIX + "%"),
+        ).fetchall()
+        cur = self.conn.cursor()
+        for checkpoint_id, type_, blob in rows:
+            delta = self.saver.serde.loads_typed((type_, blob))
+            if checkpoint_id not in keep or delta["base"] in keep:
+                continue
+            values, _ = self.saver._resolve(cur, thread_id, checkpoint_ns, checkpoint_id, delta)
+            full = {**delta["checkpoint"], "id": checkpoint_id, "channel_values": values}
+            cur.execute(
+                "UPDATE checkpoints SET type = ?, checkpoint = ? WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (*self.saver.serde.dumps_typed(full), thread_id, checkpoint_ns, checkpoint_id),
+            )
+            self.stats["rebased"] += 1
+            self._commit()
+        cur.close()
+
+    def compact_thread(self, thread_id: str, checkpoint_ns: str, now: float) -> None:
+        rows = self.conn.execute(
+            "SELECT checkpoint_id, parent_checkpoint_id FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC",
+            (thread_id, checkpoint_ns),
+        ).fetchall()
+        if not rows:
+            return
+        keep = retained(rows, self.keep_last, self.ttl, now)
+        doomed = [checkpoint_id for checkpoint_id, _ in rows if checkpoint_id not in keep]
+
+        if doomed:
+            self._rebase(thread_id, checkpoint_ns, keep)
+
+            # The oldest kept checkpoints become roots
+            orphaned = [checkpoint_id for checkpoint_id, parent_id in rows
+                        if checkpoint_id in keep and parent_id is not None and parent_id not in keep]
+            for batch in _batches(orphaned, self.batch_size):
+                self.conn.execute(
+                    f"UPDATE checkpoints SET parent_checkpoint_id = NULL "
+                    f"WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({_placeholders(len(batch))})",
+                    [thread_id, checkpoint_ns, *batch],
+                )
+                self._commit()
+
+            # Writes first, so a crash never leaves writes without their checkpoint
+            self._delete_writes(thread_id, checkpoint_ns, doomed, "writes_deleted")
+            for batch in _batches(doomed, self.batch_size):
+                where = f"thread_id = ? AND checkpoint_ns = ? AND checkpoint_id IN ({_placeholders(len(batch))})"
+                params = [thread_id, checkpoint_ns, *batch]
+                self.stats["bytes_deleted"] += self._row_bytes("checkpoints", "COALESCE(LENGTH(checkpoint), 0) + COALESCE(LENGTH(metadata), 0)", where, params)
+                self.stats["checkpoints_deleted"] += self.conn.execute(f"DELETE FROM checkpoints WHERE {where}", params).rowcount
+                self._commit()
+
+        if self.drop_writes:
+            # A kept checkpoint with a kept child already has its writes applied in the child, so the
+            # latest state loads without them. Replaying or forking from that checkpoint does not:
+            # its finished tasks run again. Only the tips keep theirs, since resuming there needs them.
+            parents = {parent_id for checkpoint_id, parent_id in rows if checkpoint_id in keep}
+            dropped = [checkpoint_id for checkpoint_id, _ in rows if checkpoint_id in keep and checkpoint_id in parents]
+            self._delete_writes(thread_id, checkpoint_ns, dropped, "writes_dropped")
+
+        self.stats["threads"] += 1
+
+    def collect_orphaned_writes(self) -> None:
+
+        """ Delete writes whose checkpoint no longer exists """
+
+        while True:
+            rowids = [rowid for rowid, in self.conn.execute(
+                "SELECT w.rowid FROM writes w WHERE NOT EXISTS ("
+                "SELECT 1 FROM checkpoints c WHERE c.thread_id = w.thread_id "
+                "AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id) LIMIT ?",
+                (self.batch_size,),
+            )]
+            if not rowids:
+                return
+            where = f"rowid IN ({_placeholders(len(rowids))})"
+            self.stats["bytes_deleted"] += self._row_bytes("writes", "COALESCE(LENGTH(value), 0)", where, rowids)
+            self.stats["orphaned_writes_deleted"] += self.conn.execute(f"DELETE FROM writes WHERE {where}", rowids).rowcount
+            self._commit()
+
+    def run(self, vacuum: bool = False) -> dict:
+
+        """ Compact every thread, collect orphaned writes and report what was reclaimed """
+
+        size_before = file_bytes(self.database_path)
+        now = time.time()
+        threads = self.conn.execute("SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints").fetchall()
+        for thread_id, checkpoint_ns in threads:
+            self.compact_thread(thread_id, checkpoint_ns, now)
+        self.collect_orphaned_writes()
+
+        # Freed pages are reused by later writes; only VACUUM shrinks the file, and it locks the database
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        self.stats["free_bytes"] = self.conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        if vacuum:
+            self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.stats["file_bytes_before"] = size_before
+        self.stats["file_bytes_after"] = file_bytes(self.database_path)
+        return dict(self.stats)
+
+    def close(self) -> None:
+        self.conn.close()
+
+def compact(database_path: str, keep_last: Optional[int] = None, ttl: Optional[float] = None,
+            vacuum: bool = False, **kwargs) -> dict:
+
+    """ Run one compaction pass over a database and return its stats """
+
+    compactor = Compactor(database_path, keep_last=keep_last, ttl=ttl, **kwargs)
+    try:
+        return compactor.run(vacuum=vacuum)
+    finally:
+        compactor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database")
+    parser.add_argument("--keep-last", type=int, help="Checkpoints to keep per thread")
+    parser.add_argument("--ttl", type=float, help="Keep checkpoints younger than this many seconds")
+    parser.add_argument("--drop-writes", action="store_true",
+                        help="Also delete writes of kept checkpoints that have a kept child (replay from them re-runs their tasks)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between transactions")
+    parser.add_argument("--vacuum", action="store_true", help="Shrink the file afterwards (locks the database)")
+    args = parser.parse_args()
+
+    stats = compact(args.database, keep_last=args.keep_last, ttl=args.ttl, vacuum=args.vacuum,
+                    drop_writes=args.drop_writes, batch_size=args.batch_size, pause=args.pause)
+    for key, value in stats.items():
+        print(f"{key:<24}{value:>14,}")
+
+if __name__ == "__main__":
+    main()
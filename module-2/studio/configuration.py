@@ -0,0 +1,36 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+@dataclass(kw_only=True)
+class Configuration:
+    """The configurable fields for the chatbot."""
+    summary_trigger_tokens: int = 1000 # Summarize once the conversation's messages exceed this many tokens
+    summary_keep_tokens: int = 250 # Recent messages kept verbatim after summarizing (the last 2 are always kept)
+    parallel_summary: bool = False # Summarize alongside the reply instead of after it; the turn still waits for both, so latency is the slower of the two (only background_summary takes it off the turn)
+    background_summary: bool = False # End the turn after the reply and leave summarizing to a SummaryWorker (inline without one)
+    backend: str = "live" # "fake" runs on the local stand-ins in fakes.py, see backends.py (or set BACKEND)
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None
+    ) -> "Configuration":
+        """Create a Configuration instance from a RunnableConfig."""
+        configurable = (
+            config["configurable"] if config and "configurable" in config else {}
+        )
+        values: dict[str, Any] = {
+            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
+            for f in fields(cls)
+            if f.init
+        }
+        # Environment variables arrive as strings, and 0 / False are valid overrides
+        types = {f.name: f.type for f in fields(cls)}
+        return cls(**{k: _parse(types[k], v) for k, v in values.items() if v is not None and v != ""})
+
+def _parse(type_, value):
+    if type_ is bool and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type_(value)
@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+import weakref
+from collections import Counter
+from typing import Any, Optional
+
+from langchain_core.messages import RemoveMessage
+from langchain_core.runnables import RunnableConfig
+
+import chatbot
+
+logger = logging.getLogger(__name__)
+
+class SummaryWorker:
+
+    """ Summarizes chatbot threads in the background, off the conversation turn.
+
+    Run turns through `run_turn`, which enables `background_summary` and tells
+    the graph a worker is attached: the graph ends right after the reply and
+    the thread is queued here once it is over its token budget. Turns that set
+    `background_summary` without going through a worker still summarize inline. A worker thread reads the thread's state, makes the
+    summary call without holding anything, then applies the summary and the
+    RemoveMessage edits with `update_state` through the checkpointer.
+
+    Updates are versioned. The edit is only applied if the thread's `summary`
+    channel is still at the version the summary was computed from and every
+    folded message is still there; otherwise the job is recomputed from the
+    new state. Applying takes the thread's lock, which `run_turn` holds for the
+    whole turn, so an edit never lands between a turn reading the state and
+    writing its reply (that turn would write over it). A thread's lock lives
+    only as long as a turn or an edit is using it.
+    """
+
+    def __init__(self, graph, workers: int = 1, max_attempts: int = 3):
+        self.graph = graph
+        self.max_attempts = max_attempts
+        self.stats = Counter()
+        self._queue: queue.Queue = queue.Queue()
+        self._queued: set[str] = set()
+        self._locks: weakref.WeakValueDictionary[str, threading.Lock] = weakref.WeakValueDictionary()
+        self._guard = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def lock(self, thread_id: str) -> threading.Lock:
+        """ The lock that orders turns and summary edits on one thread """
+        with self._guard:
+            return self._locks.setdefault(thread_id, threading.Lock())
+
+    def run_turn(self, input: Any, config: RunnableConfig) -> dict:
+
+        """ Run one conversation turn, then queue the thread if it needs a summary """
+
+        config = {**config, "configurable": {**config.get("configurable", {}), "background_summary": True,
+                                             chatbot.SUMMARY_WORKER_KEY: True}}
+        with self.lock(config["configurable"]["thread_id"]):
+            values = self.graph.invoke(input, config)
+        if chatbot.over_budget(values, config):
+            self.submit(config)
+        return values
+
+    def submit(self, config: RunnableConfig) -> None:
+        """ Queue a thread for summarizing; a thread already waiting is not queued twice """
+        thread_id = config["configurable"]["thread_id"]
+        with self._guard:
+            if thread_id in self._queued:
+                self.stats["coalesced"] += 1
+                return
+            self._queued.add(thread_id)
+        self._queue.put(config)
+
+    def join(self) -> None:
+        """ Wait until every queued summary has been applied """
+        self._queue.join()
+
+    def close(self) -> None:
+        self.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while (config := self._queue.get()) is not None:
+            with self._guard:
+                self._queued.discard(config["configurable"]["thread_id"])
+            try:
+                self.summarize(config)
+            except Exception:
+                logger.exception("Summarizing thread %s failed", config["configurable"]["thread_id"])
+                self.stats["failed"] += 1
+            finally:
+                self._queue.task_done()
+
+    def _summary_version(self, config: RunnableConfig) -> Optional[str]:
+        checkpoint = self.graph.checkpointer.get_tuple(config)
+        return checkpoint.checkpoint["channel_versions"].get("summary") if checkpoint else None
+
+    def summarize(self, config: RunnableConfig) -> bool:
+
+        """ Summarize one thread now. Returns whether an edit was applied. """
+
+        for attempt in range(self.max_attempts):
+            snapshot = self.graph.get_state(config)
+            if not chatbot.over_budget(snapshot.values, config):
+                self.stats["skipped"] += 1
+                return False
+            version = self._summary_version(snapshot.config)
+
+            # The slow part runs unlocked, so turns on this thread carry on meanwhile
+            update = chatbot.summarize_conversation(snapshot.values, config)
+            if not update:
+                self.stats["skipped"] += 1
+                return False
+            removed = {m.id for m in update["messages"] if isinstance(m, RemoveMessage)}
+
+            with self.lock(config["configurable"]["thread_id"]):
+                latest = self.graph.get_state(config)
+                present = {m.id for m in latest.values.get("messages", [])}
+                if self._summary_version(latest.config) == version and removed <= present:
+                    self.graph.update_state(latest.config, update, as_node="summarize_conversation")
+                    self.stats["applied"] += 1
+                    return True
+            # Another summary landed first; start again from the new state
+            self.stats["conflicts"] += 1
+        self.stats["gave_up"] += 1
+        return False
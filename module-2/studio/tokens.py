@@ -0,0 +1,42 @@
+import math
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage
+
+# Prefer the model's own tokenizer, fall back to a characters-per-token estimate
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+# Role and framing tokens the chat format adds to every message
+MESSAGE_OVERHEAD = 4
+
+def count_tokens(text: str) -> int:
+    """ Number of tokens in text """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """ Number of tokens the messages take up in a prompt """
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD for m in messages)
+
+def split_for_summary(messages: Sequence[BaseMessage], keep_tokens: int, min_keep: int = 2) -> tuple[list, list]:
+
+    """ Split messages into (to fold into the summary, to keep verbatim).
+
+    The most recent messages are kept while they fit in `keep_tokens`, and at
+    least the last `min_keep` are kept whatever their size.
+    """
+
+    kept, used = 0, 0
+    for message in reversed(messages):
+        size = message_tokens([message])
+        if kept >= min_keep and used + size > keep_tokens:
+            break
+        kept += 1
+        used += size
+    split = len(messages) - kept
+    return list(messages[:split]), list(messages[split:])
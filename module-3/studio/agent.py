@@ -1,9 +1,10 @@
 from langchain_core.messages import SystemMessage
-from langchain_openai import ChatOpenAI
 
 from langgraph.graph import START, StateGraph, MessagesState
 from langgraph.prebuilt import tools_condition, ToolNode
 
+import backends
+
 def add(a: int, b: int) -> int:
     """Adds a and b.
 
@@ -34,7 +35,8 @@ def divide(a: int, b: int) -> float:
 tools = [add, multiply, divide]
 
 # Define LLM with bound tools
-llm = ChatOpenAI(model="gpt-4o")
+# No Configuration in this graph, so the fake backend is selected with the BACKEND=fake env var (see backends.py)
+llm = backends.chat_model(model="gpt-4o")
 llm_with_tools = llm.bind_tools(tools)
 
 # System message
@@ -0,0 +1,116 @@
+import functools
+import os
+from typing import Any, Callable, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config
+from langchain_openai import ChatOpenAI
+
+import fakes
+
+BACKENDS = ("live", "fake")
+
+def backend(config: Optional[RunnableConfig] = None) -> str:
+
+    """ The backend a run uses: "live" (OpenAI, Tavily, Wikipedia) or "fake" (the stand-ins in fakes.py).
+
+    The BACKEND environment variable wins over the run's `backend` configurable,
+    as for every Configuration field. Inside a graph node the node's config is
+    picked up even when it isn't passed. The module-1 and module-3 graphs have no
+    Configuration, so Studio shows no `backend` field for them: set BACKEND=fake.
+    """
+
+    configurable = ensure_config(config).get("configurable", {})
+    name = os.environ.get("BACKEND") or configurable.get("backend") or "live"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS}")
+    return name
+
+def cache_namespace(name: str, config: Optional[RunnableConfig] = None) -> str:
+    """ `name` on the live backend and "fake:<name>" on the fake one, so shared caches never mix the two """
+    return name if backend(config) == "live" else f"fake:{name}"
+
+def _env(name: str, type_: type, default: Any) -> Any:
+    value = os.environ.get(name)
+    return type_(value) if value else default
+
+# ChatOpenAI arguments the fake chat model takes too; the rest (model name, API settings) only apply live
+FAKE_MODEL_KWARGS = ("cache", "temperature")
+
+# Chat model methods that derive a new runnable and that Runnable itself doesn't have (bind, with_config
+# and the like wrap the BackendSwitch instead, which switches already)
+DERIVE_METHODS = frozenset({"bind_tools", "with_structured_output"})
+
+def fake_chat_model(**kwargs) -> fakes.FakeChatModel:
+    """ The fake chat model, tuned with FAKE_LATENCY, FAKE_TOKEN_LATENCY, FAKE_PROMPT_TOKEN_LATENCY, FAKE_REPLY_TOKENS and FAKE_SEED """
+    return fakes.FakeChatModel(latency=_env("FAKE_LATENCY", float, 0.0),
+                               token_latency=_env("FAKE_TOKEN_LATENCY", float, 0.0),
+                               prompt_token_latency=_env("FAKE_PROMPT_TOKEN_LATENCY", float, 0.0),
+                               reply_tokens=_env("FAKE_REPLY_TOKENS", int, 24),
+                               seed=_env("FAKE_SEED", int, 0),
+                               **kwargs)
+
+class BackendSwitch(Runnable):
+
+    """ Runs one of several alternatives, picked on every call by `backend(config)`.
+
+    Methods that derive a runnable (DERIVE_METHODS, such as bind_tools or
+    with_structured_output) are applied to each alternative when it is first
+    used, so what they return switches too (LangChain's configurable_alternatives
+    binds them to the default instead). Nothing is built at import time, so the
+    fake backend runs without an OpenAI key. Any other attribute is read from
+    the alternative of the backend current when it is read.
+    """
+
+    def __init__(self, alternatives: dict[str, Callable[[], Runnable]]):
+        self.alternatives = {name: functools.cache(factory) for name, factory in alternatives.items()}
+
+    def pick(self, config: Optional[RunnableConfig] = None) -> Runnable:
+        return self.alternatives[backend(config)]()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or name == "alternatives":
+            raise AttributeError(name)
+        if name not in DERIVE_METHODS:
+            return getattr(self.pick(), name)
+
+        def derive(*args, **kwargs):
+            return BackendSwitch({
+                key: lambda factory=factory: getattr(factory(), name)(*args, **kwargs)
+                for key, factory in self.alternatives.items()
+            })
+
+        return derive
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return self.pick(config).invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return await self.pick(config).ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        yield from self.pick(config).stream(input, config, **kwargs)
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        async for chunk in self.pick(config).astream(input, config, **kwargs):
+            yield chunk
+
+def chat_model(**kwargs) -> Runnable:
+    """ ChatOpenAI(**kwargs) on the live backend, the fake chat model with the FAKE_MODEL_KWARGS of kwargs (such as the LLM cache) on the fake one """
+    fake_kwargs = {key: value for key, value in kwargs.items() if key in FAKE_MODEL_KWARGS}
+    return BackendSwitch({"live": lambda: ChatOpenAI(**kwargs), "fake": lambda: fake_chat_model(**fake_kwargs)})
+
+def web_search(config: Optional[RunnableConfig] = None, max_results: int = 3):
+    """ TavilySearchResults on the live backend, FakeTavilySearch (FAKE_SEARCH_LATENCY) on the fake one """
+    if backend(config) == "fake":
+        return fakes.FakeTavilySearch(max_results=max_results, latency=_env("FAKE_SEARCH_LATENCY", float, 0.0))
+    # Imported here so graphs that never search don't load langchain_community
+    from langchain_community.tools import TavilySearchResults
+    return TavilySearchResults(max_results=max_results)
+
+def wikipedia_loader(query: str, load_max_docs: int = 2, config: Optional[RunnableConfig] = None):
+    """ WikipediaLoader on the live backend, FakeWikipediaLoader (FAKE_SEARCH_LATENCY) on the fake one """
+    if backend(config) == "fake":
+        return fakes.FakeWikipediaLoader(query=query, load_max_docs=load_max_docs, latency=_env("FAKE_SEARCH_LATENCY", float, 0.0))
+    from langchain_community.document_loaders import WikipediaLoader
+    return WikipediaLoader(query=query, load_max_docs=load_max_docs)
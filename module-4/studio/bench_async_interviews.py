@@ -0,0 +1,70 @@
+""" Wall-clock time of the research_assistant interviews versus analyst count, using fake LLM and search backends.
+
+Run from this directory:
+
+    python bench_async_interviews.py --analysts 1 5 10 20 --llm-latency 0.2 --search-latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("SEARCH_CACHE", "off")
+os.environ.setdefault("BACKEND", "fake")
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import fakes
+import research_assistant
+
+async def run(num_analysts: int, args) -> float:
+
+    """ Create analysts, approve them, and time the interviews plus report writing """
+
+    graph = research_assistant.builder.compile(interrupt_before=["human_feedback"], checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": str(num_analysts),
+                               "max_llm_concurrency": args.max_llm_concurrency,
+                               "max_search_concurrency": args.max_search_concurrency}}
+
+    await graph.ainvoke({"topic": args.topic, "max_analysts": num_analysts, "max_num_turns": args.turns}, config)
+
+    # Swap in exactly num_analysts personas, as a human reviewer would
+    analysts = [research_assistant.Analyst(affiliation="Fake Labs", name=f"Analyst {i}",
+                                           role="Researcher", description=f"Focus area {i}")
+                for i in range(num_analysts)]
+    await graph.aupdate_state(config, {"analysts": analysts, "human_analyst_feedback": "approve"}, as_node="human_feedback")
+
+    start = time.perf_counter()
+    await graph.ainvoke(None, config)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topic", default="The benefits of adopting LangGraph as an agent framework")
+    parser.add_argument("--analysts", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--max-llm-concurrency", type=int, default=32)
+    parser.add_argument("--max-search-concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    research_assistant.llm = fakes.FakeChatModel(latency=args.llm_latency)
+    os.environ["FAKE_SEARCH_LATENCY"] = str(args.search_latency)
+
+    # Critical path of one interview: per turn a question, query generation, search and answer; then the section and the report writers
+    per_turn = 2 * args.llm_latency + args.search_latency + args.llm_latency
+    single = args.turns * per_turn + 2 * args.llm_latency
+
+    print(f"llm_concurrency={args.max_llm_concurrency} search_concurrency={args.max_search_concurrency} "
+          f"(one interview + report ~{single:.2f}s)")
+    print(f"{'analysts':>9}{'seconds':>10}{'vs one':>9}")
+    for num_analysts in args.analysts:
+        elapsed = asyncio.run(run(num_analysts, args))
+        print(f"{num_analysts:>9}{elapsed:>10.2f}{elapsed / single:>8.2f}x")
+
+if __name__ == "__main__":
+    main()
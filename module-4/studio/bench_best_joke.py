@@ -0,0 +1,51 @@
+""" best_joke judging as one call over every joke versus a tournament of fixed-size groups, against a fake chat model.
+
+Run from this directory:
+
+    python bench_best_joke.py --jokes 10 100 1000 --group-size 8 --latency 0.1 --prompt-token-latency 0.0001
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+import context_budget
+import fakes
+import map_reduce
+
+class CountingModel(fakes.FakeChatModel):
+
+    """ Fake model that records the size of every prompt it is sent """
+
+    prompt_tokens: list = []
+
+    def _respond(self, messages, tools=None, tool_choice=None):
+        self.prompt_tokens.append(sum(context_budget.count_tokens(str(m.content)) for m in messages))
+        return super()._respond(messages, tools, tool_choice)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jokes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--group-size", type=int, default=8)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0001)
+    args = parser.parse_args()
+
+    print(f"{'jokes':>7}{'mode':>12}{'seconds':>10}{'calls':>8}{'max prompt tokens':>20}")
+    for count in args.jokes:
+        jokes = [f"Joke {i}: why did the {fakes.WORDS[i % len(fakes.WORDS)]} cross the road? To reach the other side." for i in range(count)]
+        for mode, group_size in (("one call", 0), ("tournament", args.group_size)):
+            model = CountingModel(latency=args.latency, prompt_token_latency=args.prompt_token_latency, prompt_tokens=[])
+            map_reduce.model = model
+            config = {"configurable": {"best_joke_group_size": group_size, "joke_max_concurrency": args.max_concurrency}}
+            start = time.perf_counter()
+            map_reduce.best_joke({"topic": "animals", "jokes": jokes}, config)
+            elapsed = time.perf_counter() - start
+            print(f"{count:>7}{mode:>12}{elapsed:>10.2f}{len(model.prompt_tokens):>8}{max(model.prompt_tokens):>20}")
+
+if __name__ == "__main__":
+    main()
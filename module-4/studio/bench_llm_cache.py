@@ -0,0 +1,66 @@
+""" Replay a research_assistant run against a fake chat model with and without the LLM cache.
+
+Run from this directory:
+
+    python bench_llm_cache.py --analysts 3 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("SEARCH_CACHE", "off")
+# Search runs on the fake backend so only LLM latency is measured
+os.environ.setdefault("BACKEND", "fake")
+
+import fakes
+import llm_cache
+import research_assistant
+
+def run(cache, args) -> float:
+
+    """ Run the full research graph once and return the wall-clock time """
+
+    research_assistant.llm = fakes.FakeChatModel(latency=args.latency, cache=cache)
+    graph = research_assistant.builder.compile()
+    start = time.perf_counter()
+    asyncio.run(graph.ainvoke({"topic": args.topic, "max_analysts": args.analysts, "max_num_turns": args.turns}))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topic", default="The benefits of adopting LangGraph as an agent framework")
+    parser.add_argument("--analysts", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency per call (seconds)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.db")
+
+        uncached = run(False, args)
+        cache = llm_cache.TieredCache(database_path=path)
+        cold = run(cache, args)
+        cold_stats = cache.stats()
+        warm_memory = run(cache, args)
+        memory_stats = cache.stats()
+
+        # A fresh process only has the SQLite tier to go on
+        disk_cache = llm_cache.TieredCache(database_path=path)
+        warm_disk = run(disk_cache, args)
+        disk_stats = disk_cache.stats()
+
+    print(f"{'run':<14}{'seconds':>10}{'memory hits':>14}{'disk hits':>12}{'misses':>10}")
+    print(f"{'no cache':<14}{uncached:>10.2f}{'-':>14}{'-':>12}{'-':>10}")
+    print(f"{'cold cache':<14}{cold:>10.2f}{cold_stats['memory_hits']:>14}{cold_stats['disk_hits']:>12}{cold_stats['misses']:>10}")
+    print(f"{'warm memory':<14}{warm_memory:>10.2f}{memory_stats['memory_hits'] - cold_stats['memory_hits']:>14}"
+          f"{memory_stats['disk_hits'] - cold_stats['disk_hits']:>12}{memory_stats['misses'] - cold_stats['misses']:>10}")
+    print(f"{'warm disk':<14}{warm_disk:>10.2f}{disk_stats['memory_hits']:>14}{disk_stats['disk_hits']:>12}{disk_stats['misses']:>10}")
+    print(f"latency saved on replay: {uncached - warm_memory:.2f}s ({1 - warm_memory / uncached:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+""" Joke generation in map_reduce: one Send per subject versus batched Sends, against a fake chat model.
+
+Run from this directory:
+
+    python bench_map_reduce.py --subjects 10 100 1000 --batch-size 50 --latency 0.05
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langgraph.graph import END, START, StateGraph
+
+import configuration
+import fakes
+import map_reduce
+
+def build_graph():
+
+    """ map_reduce with generate_topics replaced by subjects passed in the input """
+
+    builder = StateGraph(map_reduce.OverallState, config_schema=configuration.Configuration)
+    builder.add_node("generate_topics", lambda state: {})
+    builder.add_node("generate_joke", map_reduce.generate_joke)
+    builder.add_node("generate_jokes", map_reduce.generate_jokes)
+    builder.add_node("best_joke", map_reduce.best_joke)
+    builder.add_edge(START, "generate_topics")
+    builder.add_conditional_edges("generate_topics", map_reduce.continue_to_jokes, ["generate_joke", "generate_jokes"])
+    builder.add_edge("generate_joke", "best_joke")
+    builder.add_edge("generate_jokes", "best_joke")
+    builder.add_edge("best_joke", END)
+    return builder.compile()
+
+def run(graph, subjects: list[str], configurable: dict, max_concurrency: int) -> tuple[float, int, int]:
+
+    """ Wall-clock time, graph tasks and jokes for one run """
+
+    start = time.perf_counter()
+    tasks, jokes = 0, 0
+    for chunk in graph.stream({"topic": "animals", "subjects": subjects},
+                              {"configurable": configurable, "max_concurrency": max_concurrency},
+                              stream_mode="updates"):
+        for node, update in chunk.items():
+            tasks += 1
+            if node in ("generate_joke", "generate_jokes"):
+                jokes += len(update["jokes"])
+    return time.perf_counter() - start, tasks, jokes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subjects", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Graph tasks and batched requests in flight")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    map_reduce.model = fakes.FakeChatModel(latency=args.latency)
+    graph = build_graph()
+
+    print(f"{'subjects':>9}{'mode':>10}{'seconds':>10}{'tasks':>8}{'jokes':>8}")
+    for count in args.subjects:
+        subjects = [f"subject {i}" for i in range(count)]
+        for mode, batch_size in (("per-Send", 0), ("batched", args.batch_size)):
+            configurable = {"joke_batch_size": batch_size, "joke_max_concurrency": args.max_concurrency}
+            elapsed, tasks, jokes = run(graph, subjects, configurable, args.max_concurrency)
+            print(f"{count:>9}{mode:>10}{elapsed:>10.2f}{tasks:>8}{jokes:>8}")
+
+if __name__ == "__main__":
+    main()
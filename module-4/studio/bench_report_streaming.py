@@ -0,0 +1,73 @@
+""" Time to first byte of the final research report: waiting for finalize_report versus streaming with astream_report.
+
+Run from this directory:
+
+    python bench_report_streaming.py --sections 5 --latency 0.5 --token-latency 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("SEARCH_CACHE", "off")
+
+from langgraph.graph import END, START, StateGraph
+
+import fakes
+import report_assembler
+import research_assistant
+
+def build_reduce_graph():
+
+    """ The report-writing half of research_assistant, starting from finished sections """
+
+    builder = StateGraph(research_assistant.ResearchGraphState, config_schema=research_assistant.configuration.Configuration)
+    builder.add_node("digest_sections", research_assistant.digest_sections)
+    builder.add_node("write_report", research_assistant.write_report)
+    builder.add_node("write_introduction", research_assistant.write_introduction)
+    builder.add_node("write_conclusion", research_assistant.write_conclusion)
+    builder.add_node("finalize_report", research_assistant.finalize_report)
+    builder.add_edge(START, "digest_sections")
+    for node in ("write_report", "write_introduction", "write_conclusion"):
+        builder.add_edge("digest_sections", node)
+    builder.add_edge(["write_conclusion", "write_report", "write_introduction"], "finalize_report")
+    builder.add_edge("finalize_report", END)
+    return builder.compile()
+
+async def blocking(graph, state) -> tuple[float, float]:
+    start = time.perf_counter()
+    await graph.ainvoke(state)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+async def streaming(graph, state) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _ in report_assembler.astream_report(graph, state):
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM time to first token (seconds)")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Fake LLM time per token after the first (seconds)")
+    args = parser.parse_args()
+
+    research_assistant.llm = fakes.FakeChatModel(latency=args.latency, token_latency=args.token_latency)
+    graph = build_reduce_graph()
+    state = {"topic": "The benefits of adopting LangGraph as an agent framework",
+             "sections": [f"## Section {i}\n### Summary\nFindings of analyst {i} [1].\n### Sources\n[1] https://example.com/{i}"
+                          for i in range(args.sections)]}
+
+    print(f"{'mode':<12}{'first byte (s)':>16}{'complete (s)':>14}")
+    for name, run in (("blocking", blocking), ("streaming", streaming)):
+        first, total = asyncio.run(run(graph, state))
+        print(f"{name:<12}{first:>16.2f}{total:>14.2f}")
+
+if __name__ == "__main__":
+    main()
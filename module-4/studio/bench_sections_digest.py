@@ -0,0 +1,86 @@
+""" Prompt tokens and latency of the report writers with full sections versus compact section summaries, on a fixed fixture.
+
+Run from this directory:
+
+    python bench_sections_digest.py --sections 10 --prompt-token-latency 0.0002
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("SEARCH_CACHE", "off")
+
+import context_budget
+import fakes
+import research_assistant
+from bench_report_streaming import build_reduce_graph
+
+def fixture_sections(num_sections: int, words: int = 400) -> list[str]:
+
+    """ Sections shaped like write_section output: title, ~400 word summary, sources """
+
+    rng = random.Random(0)
+    sections = []
+    for i in range(num_sections):
+        body = " ".join(rng.choice(fakes.WORDS) for _ in range(words))
+        sources = "\n".join(f"[{j}] https://example.com/{i}/{j}  " for j in range(1, 6))
+        sections.append(f"## Section {i}: Findings\n### Summary\n{body} [1]\n### Sources\n{sources}")
+    return sections
+
+def prompt_tokens(state: dict) -> dict:
+
+    """ Tokens in the prompt of each report writer """
+
+    report = research_assistant.report_writer_instructions.format(topic=state["topic"], context=state["sections_digest"])
+    full = research_assistant.intro_conclusion_instructions.format(topic=state["topic"], formatted_str_sections=state["sections_digest"])
+    compact = research_assistant.intro_conclusion_instructions.format(topic=state["topic"], formatted_str_sections=state["section_summaries"])
+    return {"write_report": context_budget.count_tokens(report),
+            "intro / conclusion (full)": context_budget.count_tokens(full),
+            "intro / conclusion (compact)": context_budget.count_tokens(compact)}
+
+async def timed(graph, state: dict, compact: bool) -> tuple[float, float]:
+
+    """ Latency of the introduction writer alone and of the whole reduce phase """
+
+    config = {"configurable": {"compact_intro_conclusion": compact}}
+    start = time.perf_counter()
+    await research_assistant.write_introduction(state, config)
+    writer = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await graph.ainvoke({"topic": state["topic"], "sections": state["sections"]}, config)
+    return writer, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0002, help="Fake LLM prefill time per prompt token (seconds)")
+    args = parser.parse_args()
+
+    research_assistant.llm = fakes.FakeChatModel(latency=args.latency, prompt_token_latency=args.prompt_token_latency)
+    state = {"topic": "The benefits of adopting LangGraph as an agent framework",
+             "sections": fixture_sections(args.sections)}
+    state.update(research_assistant.digest_sections(state))
+
+    print(f"{'prompt':<32}{'tokens':>8}")
+    tokens = prompt_tokens(state)
+    for name, count in tokens.items():
+        print(f"{name:<32}{count:>8}")
+    full = tokens["write_report"] + 2 * tokens["intro / conclusion (full)"]
+    compact = tokens["write_report"] + 2 * tokens["intro / conclusion (compact)"]
+    print(f"reduce phase total: {full} -> {compact} tokens ({1 - compact / full:.0%} fewer)")
+
+    graph = build_reduce_graph()
+    print(f"{'mode':<32}{'intro writer (s)':>18}{'reduce phase (s)':>18}")
+    for name, compact_mode in (("full sections", False), ("compact summaries", True)):
+        writer, total = asyncio.run(timed(graph, state, compact_mode))
+        print(f"{name:<32}{writer:>18.2f}{total:>18.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+@dataclass(kw_only=True)
+class Configuration:
+    """The configurable fields for the module 4 graphs."""
+    max_llm_concurrency: int = 8 # LLM calls in flight across all interviews
+    max_search_concurrency: int = 4 # Tavily / Wikipedia calls in flight across all interviews
+    num_search_queries: int = 1 # Queries planned per interview turn and shared by every retriever
+    context_token_budget: int = 8000 # Max tokens of source docs in answer / section prompts (0 for no limit)
+    measure_raw_prompt_tokens: bool = False # Also count prompt tokens without the budget (debug: tokenizes the whole raw context)
+    compact_intro_conclusion: bool = True # Intro / conclusion writers see per-section summaries instead of full sections
+    joke_batch_size: int = 0 # Subjects per generate_jokes batch in map_reduce (0 for one Send per subject)
+    joke_max_concurrency: int = 8 # Joke requests in flight within one batch or judging round
+    best_joke_group_size: int = 8 # Jokes judged per call in best_joke; larger sets play a tournament (0 for one call over all jokes)
+    backend: str = "live" # "fake" runs on the local stand-ins in fakes.py, see backends.py (or set BACKEND)
+
+    @classmethod
+    def from_runnable_config(
+        cls, config: Optional[RunnableConfig] = None
+    ) -> "Configuration":
+        """Create a Configuration instance from a RunnableConfig."""
+        configurable = (
+            config["configurable"] if config and "configurable" in config else {}
+        )
+        values: dict[str, Any] = {
+            f.name: os.environ.get(f.name.upper(), configurable.get(f.name))
+            for f in fields(cls)
+            if f.init
+        }
+        # Environment variables arrive as strings, and 0 / False are valid overrides
+        types = {f.name: f.type for f in fields(cls)}
+        return cls(**{k: _parse(types[k], v) for k, v in values.items() if v is not None and v != ""})
+
+def _parse(type_, value):
+    if type_ is bool and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type_(value)
@@ -0,0 +1,134 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Prefer the model's own tokenizer, fall back to a characters-per-token estimate
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+DOCUMENT_SEPARATOR = "\n\n---\n\n"
+
+# Closes a document cut short by the budget
+TRUNCATION_MARKER = "\n[truncated]\n</Document>"
+
+def count_tokens(text: str) -> int:
+    """ Number of tokens in text """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """ Cut text down to at most max_tokens tokens """
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+def _terms(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def _shingles(text: str, size: int = 5) -> set:
+    terms = _terms(text)
+    return {tuple(terms[i:i + size]) for i in range(max(len(terms) - size + 1, 1))}
+
+def _source(document: str) -> str:
+    """ The <Document href=... /> or <Document source=... page=... /> header """
+    return document.split("\n", 1)[0].strip()
+
+def split_documents(context: list[str]) -> list[str]:
+
+    """ Split the formatted context entries into individual documents """
+
+    return [doc for entry in context for doc in entry.split(DOCUMENT_SEPARATOR) if doc.strip()]
+
+def dedup_documents(documents: list[str], overlap: float = 0.8) -> list[str]:
+
+    """ Drop repeated sources and documents whose text mostly overlaps an earlier one """
+
+    kept, kept_shingles, seen_sources = [], [], set()
+    for doc in documents:
+        source = _source(doc)
+        if source.startswith("<Document") and source in seen_sources:
+            continue
+        shingles = _shingles(doc.split("\n", 1)[-1])
+        if any(len(shingles & other) / len(shingles | other) >= overlap for other in kept_shingles):
+            continue
+        seen_sources.add(source)
+        kept_shingles.append(shingles)
+        kept.append(doc)
+    return kept
+
+def bm25_scores(query: str, documents: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+
+    """ Okapi BM25 relevance of each document to the query """
+
+    tokenized = [_terms(doc) for doc in documents]
+    if not tokenized:
+        return []
+    avg_length = sum(len(terms) for terms in tokenized) / len(tokenized) or 1
+    document_frequency = Counter(term for terms in tokenized for term in set(terms))
+    scores = []
+    for terms in tokenized:
+        frequencies = Counter(terms)
+        score = 0.0
+        for term in set(_terms(query)):
+            if term not in frequencies:
+                continue
+            idf = math.log(1 + (len(tokenized) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            tf = frequencies[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(terms) / avg_length))
+        scores.append(score)
+    return scores
+
+def fit_context(context: list[str], question: str, budget: int, min_tokens: int = 64) -> str:
+
+    """ Format the context so it fits in `budget` tokens.
+
+    Documents are deduplicated first. If they still exceed the budget, the most
+    relevant ones to the question (BM25) are kept whole, the next one is truncated
+    to whatever room is left, and the rest are dropped. Kept documents stay in
+    their original order. Separators and the truncation marker count against the
+    budget too. A budget of 0 disables the limit.
+    """
+
+    documents = dedup_documents(split_documents(context))
+    separator, marker = count_tokens(DOCUMENT_SEPARATOR), count_tokens(TRUNCATION_MARKER)
+    sizes = [count_tokens(doc) + separator for doc in documents]
+    if budget <= 0 or sum(sizes) - separator <= budget:
+        return DOCUMENT_SEPARATOR.join(documents)
+
+    scores = bm25_scores(question, documents)
+    ranked = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+    # The first document kept has no separator in front of it
+    selected, remaining = {}, budget + separator
+    for i in ranked:
+        if sizes[i] <= remaining:
+            selected[i] = documents[i]
+            remaining -= sizes[i]
+        elif remaining - separator - marker >= min_tokens:
+            selected[i] = truncate_tokens(documents[i], remaining - separator - marker) + TRUNCATION_MARKER
+            remaining = 0
+        if remaining - separator < min_tokens:
+            break
+    return DOCUMENT_SEPARATOR.join(selected[i] for i in sorted(selected))
+
+def prompt_token_stats(node: str, after: str, before: Optional[str] = None) -> dict:
+
+    """ Record and log the prompt size of a node, and without the budget when `before` is given.
+
+    Counting `before` tokenizes the whole raw context, the cost the budget is
+    there to avoid, so nodes only pass it when measure_raw_prompt_tokens is set.
+    """
+
+    stats = {"node": node, "before": count_tokens(before) if before is not None else None, "after": count_tokens(after)}
+    if before is None:
+        logger.info("%s prompt tokens: %d", node, stats["after"])
+    else:
+        logger.info("%s prompt tokens: %d -> %d", node, stats["before"], stats["after"])
+    return stats
@@ -1,21 +1,30 @@
+import logging
 import operator
+import random
 from typing import Annotated
 from typing_extensions import TypedDict
 
 from pydantic import BaseModel
 
-from langchain_openai import ChatOpenAI 
+from langchain_core.runnables import RunnableConfig
 
 from langgraph.constants import Send
 from langgraph.graph import END, StateGraph, START
 
+import backends
+import configuration
+import llm_cache
+
+logger = logging.getLogger(__name__)
+
 # Prompts we will use
 subjects_prompt = """Generate a list of 3 sub-topics that are all related to this overall topic: {topic}."""
 joke_prompt = """Generate a joke about {subject}"""
 best_joke_prompt = """Below are a bunch of jokes about {topic}. Select the best one! Return the ID of the best one, starting 0 as the ID for the first joke. Jokes: \n\n  {jokes}"""
+best_joke_retry_prompt = """\n\nThe ID must be between 0 and {max_id}."""
 
 # LLM
-model = ChatOpenAI(model="gpt-4o", temperature=0) 
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache())
 
 # Define the state
 class Subjects(BaseModel):
@@ -46,23 +55,86 @@ def generate_joke(state: JokeState):
     response = model.with_structured_output(Joke).invoke(prompt)
     return {"jokes": [response.joke]}
 
-def best_joke(state: OverallState):
-    jokes = "\n\n".join(state["jokes"])
-    prompt = best_joke_prompt.format(topic=state["topic"], jokes=jokes)
-    response = model.with_structured_output(BestJoke).invoke(prompt)
-    return {"best_selected_joke": state["jokes"][response.id]}
+class JokeBatchState(TypedDict):
+    subjects: list
+
+def generate_jokes(state: JokeBatchState, config: RunnableConfig):
+    # One joke per subject, in subject order, so the jokes reducer sees the same entries as with generate_joke
+    max_concurrency = configuration.Configuration.from_runnable_config(config).joke_max_concurrency
+    prompts = [joke_prompt.format(subject=subject) for subject in state["subjects"]]
+    responses = model.with_structured_output(Joke).batch(prompts, config={"max_concurrency": max_concurrency})
+    return {"jokes": [response.joke for response in responses]}
+
+def judge(topic: str, jokes: list[str], groups: list[list[int]], max_concurrency: int) -> list[int]:
+
+    """ The index of the best joke in each group, judged in parallel.
+
+    A group whose answer is not a valid ID is asked once more with the valid
+    range spelled out; if that fails too, its first joke advances and a
+    warning is logged.
+    """
+
+    winners: dict[int, int] = {}
+    pending = list(range(len(groups)))
+    for attempt in range(2):
+        prompts = [best_joke_prompt.format(topic=topic, jokes="\n\n".join(jokes[i] for i in groups[g])) +
+                   (best_joke_retry_prompt.format(max_id=len(groups[g]) - 1) if attempt else "")
+                   for g in pending]
+        responses = model.with_structured_output(BestJoke).batch(prompts, config={"max_concurrency": max_concurrency})
+        for g, response in zip(pending, responses):
+            if 0 <= response.id < len(groups[g]):
+                winners[g] = groups[g][response.id]
+        pending = [g for g in pending if g not in winners]
+        if not pending:
+            break
+    for g in pending:
+        logger.warning("best_joke: no valid ID for a group of %d jokes, advancing its first joke", len(groups[g]))
+        winners[g] = groups[g][0]
+    return [winners[g] for g in range(len(groups))]
+
+def best_joke(state: OverallState, config: RunnableConfig):
+    configurable = configuration.Configuration.from_runnable_config(config)
+    group_size = configurable.best_joke_group_size
+    candidates = list(range(len(state["jokes"])))
+
+    # Tournament: judge fixed-size groups in parallel and advance each group's winner until one remains
+    round_number = 0
+    while len(candidates) > 1:
+        if 1 < group_size < len(candidates):
+            # Reshuffle between rounds so no joke keeps the same position in its group. Seeded by the
+            # topic, so a rerun of the same topic replays the same bracket (and hits the LLM cache)
+            random.Random(f"{state['topic']}:{round_number}").shuffle(candidates)
+            groups = [candidates[i:i + group_size] for i in range(0, len(candidates), group_size)]
+        else:
+            groups = [candidates]
+
+        # A group of one advances without a judge
+        contested = [group for group in groups if len(group) > 1]
+        winners = iter(judge(state["topic"], state["jokes"], contested, configurable.joke_max_concurrency))
+        candidates = [next(winners) if len(group) > 1 else group[0] for group in groups]
+        round_number += 1
+
+    return {"best_selected_joke": state["jokes"][candidates[0]]}
 
-def continue_to_jokes(state: OverallState):
+def continue_to_jokes(state: OverallState, config: RunnableConfig):
+    batch_size = configuration.Configuration.from_runnable_config(config).joke_batch_size
+    if batch_size > 0:
+        # Batched mode: one Send per chunk of subjects
+        subjects = state["subjects"]
+        return [Send("generate_jokes", {"subjects": subjects[i:i + batch_size]})
+                for i in range(0, len(subjects), batch_size)]
     return [Send("generate_joke", {"subject": s}) for s in state["subjects"]]
 
 # Construct the graph: here we put everything together to construct our graph
-graph_builder = StateGraph(OverallState)
+graph_builder = StateGraph(OverallState, config_schema=configuration.Configuration)
 graph_builder.add_node("generate_topics", generate_topics)
 graph_builder.add_node("generate_joke", generate_joke)
+graph_builder.add_node("generate_jokes", generate_jokes)
 graph_builder.add_node("best_joke", best_joke)
 graph_builder.add_edge(START, "generate_topics")
-graph_builder.add_conditional_edges("generate_topics", continue_to_jokes, ["generate_joke"])
+graph_builder.add_conditional_edges("generate_topics", continue_to_jokes, ["generate_joke", "generate_jokes"])
 graph_builder.add_edge("generate_joke", "best_joke")
+graph_builder.add_edge("generate_jokes", "best_joke")
 graph_builder.add_edge("best_joke", END)
 
 # Compile the graph
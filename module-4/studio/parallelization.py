@@ -4,58 +4,60 @@ from typing_extensions import TypedDict
 
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, SystemMessage
-
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools import TavilySearchResults
-
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
 
 from langgraph.graph import StateGraph, START, END
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0) 
+import backends
+import llm_cache
+import search_cache
+
+llm = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache())
 
 class State(TypedDict):
     question: str
     answer: str
     context: Annotated[list, operator.add]
+    search_cache_stats: dict # Search cache hit rates for this run
 
-def search_web(state):
+def search_web(state, config: RunnableConfig):
     
     """ Retrieve docs from web search """
 
     # Search
-    tavily_search = TavilySearchResults(max_results=3)
-    search_docs = tavily_search.invoke(state['question'])
+    tavily_search = backends.web_search(config, max_results=3)
+
+    def fetch(query):
+        search_docs = tavily_search.invoke(query)
+        return [(doc["url"], f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>')
+                for doc in search_docs]
+
+    search_docs = search_cache.cached_search(backends.cache_namespace("web", config), state['question'], fetch, config)
 
      # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    formatted_search_docs = "\n\n---\n\n".join([doc for _, doc in search_docs])
 
     return {"context": [formatted_search_docs]} 
 
-def search_wikipedia(state):
+def search_wikipedia(state, config: RunnableConfig):
     
     """ Retrieve docs from wikipedia """
 
     # Search
-    search_docs = WikipediaLoader(query=state['question'], 
-                                  load_max_docs=2).load()
+    def fetch(query):
+        search_docs = backends.wikipedia_loader(query=query, 
+                                                load_max_docs=2, config=config).load()
+        return [(doc.metadata["source"], f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>')
+                for doc in search_docs]
+
+    search_docs = search_cache.cached_search(backends.cache_namespace("wikipedia", config), state['question'], fetch, config)
 
      # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    formatted_search_docs = "\n\n---\n\n".join([doc for _, doc in search_docs])
 
     return {"context": [formatted_search_docs]} 
 
-def generate_answer(state):
+def generate_answer(state, config: RunnableConfig):
     
     """ Node to answer a question """
 
@@ -71,8 +73,8 @@ def generate_answer(state):
     # Answer
     answer = llm.invoke([SystemMessage(content=answer_instructions)]+[HumanMessage(content=f"Answer the question.")])
       
-    # Append it to state
-    return {"answer": answer}
+    # Append it to state, with the search cache's hit rates now that both searches are done
+    return {"answer": answer, "search_cache_stats": search_cache.run_stats(config)}
 
 # Add nodes
 builder = StateGraph(State)
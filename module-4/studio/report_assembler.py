@@ -0,0 +1,128 @@
+from typing import AsyncIterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+# Report parts in the order they appear, and the tag put on the LLM call that writes each one
+REPORT_PARTS = ("introduction", "content", "conclusion")
+REPORT_TAGS = {f"report:{part}": part for part in REPORT_PARTS}
+
+PART_SEPARATOR = "\n\n---\n\n"
+
+class ReportAssembler:
+
+    """ Incrementally assemble the final report from the three report writers.
+
+    Text can be fed in any order and in any size, from single tokens to whole
+    sections. It is released in report order as soon as everything before it is
+    done: the introduction streams straight through, the body is held only until
+    the introduction finishes, and so on. The body's "## Insights" header is
+    dropped and its "## Sources" block is moved to the end of the report.
+    """
+
+    def __init__(self):
+        self._pending = {part: [] for part in REPORT_PARTS}
+        self._received = set()
+        self._done = set()
+        self._current = 0
+
+        # Body filtering works a line at a time
+        self._line = ""
+        self._body_started = False
+        self._in_sources = False
+        self._blank_lines = 0
+        self._sources = []
+
+    def _body_line(self, line: str) -> None:
+        stripped = line.strip()
+        if not self._body_started:
+            if not stripped or stripped == "## Insights":
+                return
+            self._body_started = True
+            self._pending["content"].append(line)
+            return
+        if stripped == "## Sources":
+            self._in_sources = True
+        elif self._in_sources:
+            self._sources.append(line)
+        elif not stripped:
+            # Blank lines are held back so none trail the body
+            self._blank_lines += 1
+        else:
+            self._pending["content"].append("\n" * (self._blank_lines + 1) + line)
+            self._blank_lines = 0
+
+    def _flush(self) -> str:
+        released = []
+        while self._current < len(REPORT_PARTS):
+            part = REPORT_PARTS[self._current]
+            released.extend(self._pending[part])
+            self._pending[part] = []
+            if part not in self._done:
+                break
+            self._current += 1
+            if self._current < len(REPORT_PARTS):
+                released.append(PART_SEPARATOR)
+            elif self._sources:
+                released.append("\n\n## Sources\n" + "\n".join(self._sources).strip("\n"))
+        return "".join(released)
+
+    def feed(self, part: str, text: str) -> str:
+        """ Add text to a part and return whatever can now be emitted """
+        if text:
+            self._received.add(part)
+        if part == "content":
+            lines = (self._line + text).split("\n")
+            self._line = lines.pop()
+            for line in lines:
+                self._body_line(line)
+        else:
+            self._pending[part].append(text)
+        return self._flush()
+
+    def finish(self, part: str, text: Optional[str] = None) -> str:
+        """ Mark a part complete and return whatever can now be emitted.
+
+        `text` is the part's full output. It is only used if nothing was streamed
+        for the part, e.g. when the response came from the cache.
+        """
+        released = self.feed(part, text) if part not in self._received and text else ""
+        if part == "content" and self._line:
+            self._body_line(self._line)
+            self._line = ""
+        self._done.add(part)
+        return released + self._flush()
+
+    @property
+    def done(self) -> bool:
+        return self._current == len(REPORT_PARTS)
+
+def assemble_report(introduction: str, content: str, conclusion: str) -> str:
+
+    """ Assemble a report from finished parts """
+
+    assembler = ReportAssembler()
+    return "".join([assembler.finish("introduction", introduction),
+                    assembler.finish("content", content),
+                    assembler.finish("conclusion", conclusion)])
+
+async def astream_report(graph, input, config: Optional[RunnableConfig] = None) -> AsyncIterator[str]:
+
+    """ Run the graph and yield the final report as it is written.
+
+    The first chunk is the first token of the introduction rather than the
+    finished report.
+    """
+
+    assembler = ReportAssembler()
+    async for event in graph.astream_events(input, config, version="v2"):
+        part = next((REPORT_TAGS[tag] for tag in event.get("tags", []) if tag in REPORT_TAGS), None)
+        if part is None:
+            continue
+        if event["event"] == "on_chat_model_stream":
+            released = assembler.feed(part, event["data"]["chunk"].content)
+        elif event["event"] == "on_chat_model_end":
+            released = assembler.finish(part, event["data"]["output"].content)
+        else:
+            continue
+        if released:
+            yield released
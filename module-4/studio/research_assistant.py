@@ -1,19 +1,42 @@
+import asyncio
 import operator
+import weakref
 from pydantic import BaseModel, Field
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from typing_extensions import TypedDict
 
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, get_buffer_string
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
 
 from langgraph.constants import Send
 from langgraph.graph import END, MessagesState, START, StateGraph
 
+import backends
+import configuration
+import context_budget
+import llm_cache
+import report_assembler
+import search_cache
+
 ### LLM
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0) 
+llm = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache())
+
+### Concurrency limits
+
+# One semaphore per kind of call, shared by every interview running on the event loop
+_semaphores = weakref.WeakKeyDictionary()
+
+def limiter(kind: str, config: RunnableConfig) -> asyncio.Semaphore:
+
+    """ Global semaphore bounding in-flight "llm" or "search" calls """
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+    limit = configurable.max_llm_concurrency if kind == "llm" else configurable.max_search_concurrency
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if (kind, limit) not in semaphores:
+        semaphores[(kind, limit)] = asyncio.Semaphore(limit)
+    return semaphores[(kind, limit)]
 
 ### Schema 
 
@@ -48,6 +71,9 @@ class GenerateAnalystsState(TypedDict):
 class InterviewState(MessagesState):
     max_num_turns: int # Number turns of conversation
     context: Annotated[list, operator.add] # Source docs
+    sources: Annotated[list, operator.add] # URLs of the source docs already in context
+    search_queries: list # Queries for the current turn, shared by every retriever
+    prompt_tokens: Annotated[list, operator.add] # Prompt size per node with the context budget (and without, if measure_raw_prompt_tokens)
     analyst: Analyst # Analyst asking questions
     interview: str # Interview transcript
     sections: list # Final key we duplicate in outer state for Send() API
@@ -55,16 +81,33 @@ class InterviewState(MessagesState):
 class SearchQuery(BaseModel):
     search_query: str = Field(None, description="Search query for retrieval.")
 
+class SearchQueries(BaseModel):
+    search_queries: List[str] = Field(
+        description="Search queries for retrieval, each approaching the question from a different angle.",
+    )
+
+def merge_sources(left: list, right: Optional[list]) -> list:
+    """ Union of source URLs in first-seen order; None starts a new run with none """
+    if right is None:
+        return []
+    seen = set(left)
+    return left + [url for url in dict.fromkeys(right) if url not in seen]
+
 class ResearchGraphState(TypedDict):
     topic: str # Research topic
     max_analysts: int # Number of analysts
     human_analyst_feedback: str # Human feedback
     analysts: List[Analyst] # Analyst asking questions
     sections: Annotated[list, operator.add] # Send() API key
+    sections_digest: str # All sections joined once for the report writers
+    section_summaries: str # Compact title + summary of each section for the intro / conclusion writers
     introduction: str # Introduction for the final report
     content: str # Content for the final report
     conclusion: str # Conclusion for the final report
     final_report: str # Final report
+    search_cache_stats: dict # Search cache hit rates for this run
+    sources: Annotated[list, merge_sources] # URLs of the source docs the run's interviews already put in context
+    prompt_tokens: Annotated[list, operator.add] # Prompt size per node with the context budget (and without, if measure_raw_prompt_tokens)
 
 ### Nodes and edges
 
@@ -83,7 +126,7 @@ analyst_instructions="""You are tasked with creating a set of AI analyst persona
 
 5. Assign one analyst to each theme."""
 
-def create_analysts(state: GenerateAnalystsState):
+async def create_analysts(state: GenerateAnalystsState, config: RunnableConfig):
     
     """ Create analysts """
     
@@ -100,10 +143,11 @@ def create_analysts(state: GenerateAnalystsState):
                                                             max_analysts=max_analysts)
 
     # Generate question 
-    analysts = structured_llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content="Generate the set of analysts.")])
+    async with limiter("llm", config):
+        analysts = await structured_llm.ainvoke([SystemMessage(content=system_message)]+[HumanMessage(content="Generate the set of analysts.")])
     
-    # Write the list of analysis to state
-    return {"analysts": analysts.analysts}
+    # Write the list of analysis to state, starting the run with no sources used
+    return {"analysts": analysts.analysts, "sources": None}
 
 def human_feedback(state: GenerateAnalystsState):
     """ No-op node that should be interrupted on """
@@ -128,7 +172,7 @@ When you are satisfied with your understanding, complete the interview with: "Th
 
 Remember to stay in character throughout your response, reflecting the persona and goals provided to you."""
 
-def generate_question(state: InterviewState):
+async def generate_question(state: InterviewState, config: RunnableConfig):
 
     """ Node to generate a question """
 
@@ -138,7 +182,8 @@ def generate_question(state: InterviewState):
 
     # Generate question 
     system_message = question_instructions.format(goals=analyst.persona)
-    question = llm.invoke([SystemMessage(content=system_message)]+messages)
+    async with limiter("llm", config):
+        question = await llm.ainvoke([SystemMessage(content=system_message)]+messages)
         
     # Write messages to state
     return {"messages": [question]}
@@ -154,51 +199,77 @@ Pay particular attention to the final question posed by the analyst.
 
 Convert this final question into a well-structured web search query""")
 
-def search_web(state: InterviewState):
-    
-    """ Retrieve docs from web search """
+# Appended to the search instructions when asking for several queries in one call
+diversify_instructions = """
 
-    # Search
-    tavily_search = TavilySearchResults(max_results=3)
+Write {num_queries} distinct queries. Each should approach the final question from a different angle (for example: definitions, recent developments, concrete examples) so that together they retrieve complementary sources."""
+
+async def plan_queries(state: InterviewState, config: RunnableConfig):
+
+    """ Write the search queries for this turn once, for every retriever to share """
+
+    num_queries = configuration.Configuration.from_runnable_config(config).num_search_queries
+
+    # Single query, as before
+    if num_queries <= 1:
+        structured_llm = llm.with_structured_output(SearchQuery)
+        async with limiter("llm", config):
+            search_query = await structured_llm.ainvoke([search_instructions]+state['messages'])
+        return {"search_queries": [search_query.search_query]}
 
-    # Search query
-    structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions]+state['messages'])
+    # Several diversified queries from a single structured call
+    instructions = SystemMessage(content=search_instructions.content + diversify_instructions.format(num_queries=num_queries))
+    structured_llm = llm.with_structured_output(SearchQueries)
+    async with limiter("llm", config):
+        search_queries = await structured_llm.ainvoke([instructions]+state['messages'])
+    return {"search_queries": search_queries.search_queries[:num_queries]}
+
+async def retrieve(state: InterviewState, config: RunnableConfig, source: str, fetch) -> dict:
+
+    """ Run every planned query against one retriever and format the new documents """
+
+    # Search, reusing results cached for the same or a similar query
+    results = await asyncio.gather(*[search_cache.acached_search(backends.cache_namespace(source, config), query, fetch, config)
+                                     for query in state["search_queries"]])
+    search_docs = [doc for docs in results for doc in docs]
+
+    # Skip pages this run already put in context
+    search_docs = search_cache.dedup(search_docs, state.get("sources", []), config)
+
+     # Format
+    formatted_search_docs = "\n\n---\n\n".join([doc for _, doc in search_docs])
+
+    return {"context": [formatted_search_docs] if search_docs else [],
+            "sources": [url for url, _ in search_docs]}
+
+async def search_web(state: InterviewState, config: RunnableConfig):
     
+    """ Retrieve docs from web search """
+
     # Search
-    search_docs = tavily_search.invoke(search_query.search_query)
+    tavily_search = backends.web_search(config, max_results=3)
 
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-            for doc in search_docs
-        ]
-    )
+    async def fetch(query):
+        async with limiter("search", config):
+            search_docs = await tavily_search.ainvoke(query)
+        return [(doc["url"], f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>')
+                for doc in search_docs]
 
-    return {"context": [formatted_search_docs]} 
+    return await retrieve(state, config, "web", fetch)
 
-def search_wikipedia(state: InterviewState):
+async def search_wikipedia(state: InterviewState, config: RunnableConfig):
     
     """ Retrieve docs from wikipedia """
 
-    # Search query
-    structured_llm = llm.with_structured_output(SearchQuery)
-    search_query = structured_llm.invoke([search_instructions]+state['messages'])
-    
     # Search
-    search_docs = WikipediaLoader(query=search_query.search_query, 
-                                  load_max_docs=2).load()
+    async def fetch(query):
+        async with limiter("search", config):
+            search_docs = await backends.wikipedia_loader(query=query, 
+                                                          load_max_docs=2, config=config).aload()
+        return [(doc.metadata["source"], f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>')
+                for doc in search_docs]
 
-     # Format
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ]
-    )
-
-    return {"context": [formatted_search_docs]} 
+    return await retrieve(state, config, "wikipedia", fetch)
 
 # Generate expert answer
 answer_instructions = """You are an expert being interviewed by an analyst.
@@ -229,7 +300,7 @@ When answering questions, follow these guidelines:
         
 And skip the addition of the brackets as well as the Document source preamble in your citation."""
 
-def generate_answer(state: InterviewState):
+async def generate_answer(state: InterviewState, config: RunnableConfig):
     
     """ Node to answer a question """
 
@@ -238,15 +309,25 @@ def generate_answer(state: InterviewState):
     messages = state["messages"]
     context = state["context"]
 
+    # Keep the context within budget, favouring documents relevant to the latest question
+    configurable = configuration.Configuration.from_runnable_config(config)
+    fitted_context = context_budget.fit_context(context, messages[-1].content, configurable.context_token_budget)
+
     # Answer question
-    system_message = answer_instructions.format(goals=analyst.persona, context=context)
-    answer = llm.invoke([SystemMessage(content=system_message)]+messages)
+    system_message = answer_instructions.format(goals=analyst.persona, context=fitted_context)
+    async with limiter("llm", config):
+        answer = await llm.ainvoke([SystemMessage(content=system_message)]+messages)
             
     # Name the message as coming from the expert
     answer.name = "expert"
+
+    # Prompt size with the fitted context, and with the raw one when measuring
+    transcript = get_buffer_string(messages)
+    raw = answer_instructions.format(goals=analyst.persona, context=context) + transcript if configurable.measure_raw_prompt_tokens else None
+    stats = context_budget.prompt_token_stats("answer_question", system_message + transcript, raw)
     
     # Append it to state
-    return {"messages": [answer]}
+    return {"messages": [answer], "prompt_tokens": [stats]}
 
 def save_interview(state: InterviewState):
     
@@ -339,7 +420,7 @@ There should be no redundant sources. It should simply be:
 - Include no preamble before the title of the report
 - Check that all guidelines have been followed"""
 
-def write_section(state: InterviewState):
+async def write_section(state: InterviewState, config: RunnableConfig):
 
     """ Node to write a section """
 
@@ -348,16 +429,27 @@ def write_section(state: InterviewState):
     context = state["context"]
     analyst = state["analyst"]
    
+    # Keep the context within budget, favouring documents relevant to the analyst's focus
+    configurable = configuration.Configuration.from_runnable_config(config)
+    fitted_context = context_budget.fit_context(context, analyst.description, configurable.context_token_budget)
+
     # Write section using either the gathered source docs from interview (context) or the interview itself (interview)
     system_message = section_writer_instructions.format(focus=analyst.description)
-    section = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Use this source to write your section: {context}")]) 
+    async with limiter("llm", config):
+        section = await llm.ainvoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Use this source to write your section: {fitted_context}")]) 
+
+    # Prompt size with the fitted context, and with the raw one when measuring
+    raw = system_message + f"Use this source to write your section: {context}" if configurable.measure_raw_prompt_tokens else None
+    stats = context_budget.prompt_token_stats("write_section",
+                                              system_message + f"Use this source to write your section: {fitted_context}", raw)
                 
     # Append it to state
-    return {"sections": [section.content]}
+    return {"sections": [section.content], "prompt_tokens": [stats]}
 
 # Add nodes and edges 
 interview_builder = StateGraph(InterviewState)
 interview_builder.add_node("ask_question", generate_question)
+interview_builder.add_node("plan_queries", plan_queries)
 interview_builder.add_node("search_web", search_web)
 interview_builder.add_node("search_wikipedia", search_wikipedia)
 interview_builder.add_node("answer_question", generate_answer)
@@ -366,8 +458,9 @@ interview_builder.add_node("write_section", write_section)
 
 # Flow
 interview_builder.add_edge(START, "ask_question")
-interview_builder.add_edge("ask_question", "search_web")
-interview_builder.add_edge("ask_question", "search_wikipedia")
+interview_builder.add_edge("ask_question", "plan_queries")
+interview_builder.add_edge("plan_queries", "search_web")
+interview_builder.add_edge("plan_queries", "search_wikipedia")
 interview_builder.add_edge("search_web", "answer_question")
 interview_builder.add_edge("search_wikipedia", "answer_question")
 interview_builder.add_conditional_edges("answer_question", route_messages,['ask_question','save_interview'])
@@ -391,7 +484,8 @@ def initiate_all_interviews(state: ResearchGraphState):
                                            "messages": [HumanMessage(
                                                content=f"So you said you were writing an article on {topic}?"
                                            )
-                                                       ]}) for analyst in state["analysts"]]
+                                                       ],
+                                           "sources": state.get("sources", [])}) for analyst in state["analysts"]]
 
 # Write a report based on the interviews
 report_writer_instructions = """You are a technical writer creating a report on this overall topic: 
@@ -428,20 +522,49 @@ Here are the memos from your analysts to build your report from:
 
 {context}"""
 
-def write_report(state: ResearchGraphState):
+def summarize_section(section: str, max_words: int = 60) -> str:
 
-    """ Node to write the final report body """
+    """ Title plus the opening of the summary of a section, without its sources """
+
+    lines = section.strip().splitlines()
+    title = next((line for line in lines if line.startswith("## ")), "")
+
+    # Sections follow the Title / ### Summary / ### Sources layout; fall back to the whole body otherwise
+    in_summary = not any(line.lower().startswith("### summary") for line in lines)
+    summary = []
+    for line in lines:
+        if line.startswith("### "):
+            in_summary = line.lower().startswith("### summary")
+        elif in_summary and line.strip() and line != title:
+            summary.append(line.strip())
+    words = " ".join(summary).split()
+    text = " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+    return f"{title}\n{text}".strip()
+
+def digest_sections(state: ResearchGraphState):
+
+    """ Build the sections digest once for all three report writers """
 
     # Full set of sections
     sections = state["sections"]
-    topic = state["topic"]
 
-    # Concat all sections together
+    # Concat all sections together, and a compact summary of each one
     formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
+    section_summaries = "\n\n".join([summarize_section(section) for section in sections])
+    return {"sections_digest": formatted_str_sections, "section_summaries": section_summaries}
+
+async def write_report(state: ResearchGraphState, config: RunnableConfig):
+
+    """ Node to write the final report body """
+
+    # Full set of sections
+    formatted_str_sections = state["sections_digest"]
+    topic = state["topic"]
     
     # Summarize the sections into a final report
     system_message = report_writer_instructions.format(topic=topic, context=formatted_str_sections)    
-    report = llm.invoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Write a report based upon these memos.")]) 
+    async with limiter("llm", config):
+        report = await llm.with_config(tags=["report:content"]).ainvoke([SystemMessage(content=system_message)]+[HumanMessage(content=f"Write a report based upon these memos.")]) 
     return {"content": report.content}
 
 # Write the introduction or conclusion
@@ -467,66 +590,58 @@ For your conclusion, use ## Conclusion as the section header.
 
 Here are the sections to reflect on for writing: {formatted_str_sections}"""
 
-def write_introduction(state: ResearchGraphState):
+def intro_conclusion_sections(state: ResearchGraphState, config: RunnableConfig) -> str:
+
+    """ Section summaries, or the full sections when compact_intro_conclusion is off """
+
+    if configuration.Configuration.from_runnable_config(config).compact_intro_conclusion:
+        return state["section_summaries"]
+    return state["sections_digest"]
+
+async def write_introduction(state: ResearchGraphState, config: RunnableConfig):
 
     """ Node to write the introduction """
 
-    # Full set of sections
-    sections = state["sections"]
+    # Sections to reflect on
+    formatted_str_sections = intro_conclusion_sections(state, config)
     topic = state["topic"]
-
-    # Concat all sections together
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
     
     # Summarize the sections into a final report
     
     instructions = intro_conclusion_instructions.format(topic=topic, formatted_str_sections=formatted_str_sections)    
-    intro = llm.invoke([instructions]+[HumanMessage(content=f"Write the report introduction")]) 
+    async with limiter("llm", config):
+        intro = await llm.with_config(tags=["report:introduction"]).ainvoke([instructions]+[HumanMessage(content=f"Write the report introduction")]) 
     return {"introduction": intro.content}
 
-def write_conclusion(state: ResearchGraphState):
+async def write_conclusion(state: ResearchGraphState, config: RunnableConfig):
 
     """ Node to write the conclusion """
 
-    # Full set of sections
-    sections = state["sections"]
+    # Sections to reflect on
+    formatted_str_sections = intro_conclusion_sections(state, config)
     topic = state["topic"]
-
-    # Concat all sections together
-    formatted_str_sections = "\n\n".join([f"{section}" for section in sections])
     
     # Summarize the sections into a final report
     
     instructions = intro_conclusion_instructions.format(topic=topic, formatted_str_sections=formatted_str_sections)    
-    conclusion = llm.invoke([instructions]+[HumanMessage(content=f"Write the report conclusion")]) 
+    async with limiter("llm", config):
+        conclusion = await llm.with_config(tags=["report:conclusion"]).ainvoke([instructions]+[HumanMessage(content=f"Write the report conclusion")]) 
     return {"conclusion": conclusion.content}
 
-def finalize_report(state: ResearchGraphState):
+def finalize_report(state: ResearchGraphState, config: RunnableConfig):
 
     """ The is the "reduce" step where we gather all the sections, combine them, and reflect on them to write the intro/conclusion """
 
-    # Save full final report
-    content = state["content"]
-    if content.startswith("## Insights"):
-        content = content.strip("## Insights")
-    if "## Sources" in content:
-        try:
-            content, sources = content.split("\n## Sources\n")
-        except:
-            sources = None
-    else:
-        sources = None
-
-    final_report = state["introduction"] + "\n\n---\n\n" + content + "\n\n---\n\n" + state["conclusion"]
-    if sources is not None:
-        final_report += "\n\n## Sources\n" + sources
-    return {"final_report": final_report}
+    # Save full final report, using the same assembler that streams it (see report_assembler.astream_report)
+    final_report = report_assembler.assemble_report(state["introduction"], state["content"], state["conclusion"])
+    return {"final_report": final_report, "search_cache_stats": search_cache.run_stats(config)}
 
 # Add nodes and edges 
-builder = StateGraph(ResearchGraphState)
+builder = StateGraph(ResearchGraphState, config_schema=configuration.Configuration)
 builder.add_node("create_analysts", create_analysts)
 builder.add_node("human_feedback", human_feedback)
 builder.add_node("conduct_interview", interview_builder.compile())
+builder.add_node("digest_sections",digest_sections)
 builder.add_node("write_report",write_report)
 builder.add_node("write_introduction",write_introduction)
 builder.add_node("write_conclusion",write_conclusion)
@@ -536,9 +651,10 @@ builder.add_node("finalize_report",finalize_report)
 builder.add_edge(START, "create_analysts")
 builder.add_edge("create_analysts", "human_feedback")
 builder.add_conditional_edges("human_feedback", initiate_all_interviews, ["create_analysts", "conduct_interview"])
-builder.add_edge("conduct_interview", "write_report")
-builder.add_edge("conduct_interview", "write_introduction")
-builder.add_edge("conduct_interview", "write_conclusion")
+builder.add_edge("conduct_interview", "digest_sections")
+builder.add_edge("digest_sections", "write_report")
+builder.add_edge("digest_sections", "write_introduction")
+builder.add_edge("digest_sections", "write_conclusion")
 builder.add_edge(["write_conclusion", "write_report", "write_introduction"], "finalize_report")
 builder.add_edge("finalize_report", END)
 
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+
+# Next to this module, so the cache doesn't land in whatever directory the server was started from
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".search_cache.db")
+
+# Runs whose hit rates are kept until they are read with `run_stats`
+MAX_RUNS = 1000
+
+# Slack for the float arithmetic of the similarity bounds
+EPSILON = 1e-9
+
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from how i in is it of on or that the
+this to was what when where which who why will with you your
+""".split())
+
+def normalize_query(query: str) -> str:
+
+    """ Lowercase, drop punctuation and stopwords, and sort the remaining terms """
+
+    terms = re.findall(r"[a-z0-9]+", query.lower())
+    return " ".join(sorted({t for t in terms if t not in STOPWORDS}))
+
+def similarity(a: str, b: str) -> float:
+
+    """ Jaccard similarity of two normalized queries """
+
+    a_terms, b_terms = set(a.split()), set(b.split())
+    if not a_terms or not b_terms:
+        return float(a_terms == b_terms)
+    return len(a_terms & b_terms) / len(a_terms | b_terms)
+
+def unique_docs(docs: list[tuple[str, str]], seen: list[str]) -> list[tuple[str, str]]:
+
+    """ Keep the first (url, formatted document) pair per URL not already in `seen` """
+
+    seen = set(seen)
+    unique = []
+    for url, formatted in docs:
+        if url not in seen:
+            seen.add(url)
+            unique.append((url, formatted))
+    return unique
+
+def run_key(config: Optional[RunnableConfig]) -> str:
+
+    """ Runs are told apart by thread id; graphs invoked without one share a key """
+
+    return (config or {}).get("configurable", {}).get("thread_id") or "default"
+
+class SearchCache:
+
+    """ Normalized-query cache for search results with URL-level document storage.
+
+    A query maps to the URLs it returned and every URL is formatted once, so two
+    retrievers or two analysts hitting the same page share a single copy. Similar
+    queries are found through a term index, so a lookup only scores the cached
+    queries that share enough terms with it.
+    """
+
+    def __init__(self,
+                 database_path: str = DEFAULT_PATH,
+                 ttl: Optional[float] = 24 * 60 * 60,
+                 similarity_threshold: float = 0.8):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._stats: OrderedDict[str, Counter] = OrderedDict()
+
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Caches written before the term index existed are dropped rather than migrated
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(queries)")]
+        if columns and "n_terms" not in columns:
+            self._conn.execute("DROP TABLE queries")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            "source TEXT NOT NULL, "
+            "normalized TEXT NOT NULL, "
+            "n_terms INTEGER NOT NULL, "
+            "urls TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "PRIMARY KEY (source, normalized))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_terms ("
+            "source TEXT NOT NULL, "
+            "term TEXT NOT NULL, "
+            "normalized TEXT NOT NULL, "
+            "PRIMARY KEY (source, term, normalized))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "url TEXT PRIMARY KEY, "
+            "formatted TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def _count(self, run: str, kind: str, n: int = 1) -> None:
+        counts = self._stats.get(run)
+        if counts is None:
+            counts = self._stats[run] = Counter()
+            while len(self._stats) > MAX_RUNS:
+                self._stats.popitem(last=False)
+        counts[kind] += n
+
+    def _similar(self, source: str, normalized: str, cutoff: float) -> Optional[str]:
+
+        """ The URLs of the most similar cached query at or above the threshold.
+
+        Jaccard similarity t needs the two term sets within a factor t of each
+        other in size and sharing at least t(|a| + |b|) / (1 + t) terms, so SQL
+        narrows the candidates before any scoring.
+        """
+
+        terms = normalized.split()
+        t = self.similarity_threshold
+        if not terms or t <= 0:
+            return None
+        rows = self._conn.execute(
+            "SELECT q.n_terms, q.urls, COUNT(*) FROM query_terms AS qt "
+            "JOIN queries AS q ON q.source = qt.source AND q.normalized = qt.normalized "
+            f"WHERE qt.source = ? AND qt.term IN ({','.join('?' * len(terms))}) "
+            "AND q.created_at >= ? AND q.n_terms BETWEEN ? AND ? "
+            "GROUP BY q.normalized HAVING COUNT(*) * (1 + ?) >= ? * (q.n_terms + ?) - ?",
+            (source, *terms, cutoff, math.ceil(t * len(terms) - EPSILON), math.floor(len(terms) / t + EPSILON),
+             t, t, len(terms), EPSILON),
+        ).fetchall()
+        best = max(((shared / (n_terms + len(terms) - shared), urls) for n_terms, urls, shared in rows), default=None)
+        return best[1] if best and best[0] >= t - EPSILON else None
+
+    def lookup(self, source: str, query: str, run: str = "default") -> Optional[list[tuple[str, str]]]:
+
+        """ Return cached (url, formatted document) pairs for a query, or None on a miss """
+
+        normalized = normalize_query(query)
+        cutoff = self._cutoff()
+        with self._lock:
+
+            # Exact match on the normalized query, then the closest similar one
+            row = self._conn.execute(
+                "SELECT urls FROM queries WHERE source = ? AND normalized = ? AND created_at >= ?",
+                (source, normalized, cutoff),
+            ).fetchone()
+            urls, kind = (row[0], "hits") if row else (None, "misses")
+            if urls is None:
+                urls = self._similar(source, normalized, cutoff)
+                if urls is not None:
+                    kind = "similar_hits"
+
+            docs = None
+            if urls is not None:
+                urls = json.loads(urls)
+                formatted = dict(self._conn.execute(
+                    f"SELECT url, formatted FROM documents WHERE url IN ({','.join('?' * len(urls))})",
+                    urls,
+                ).fetchall()) if urls else {}
+                # A page evicted since the query was cached makes the entry unusable
+                if len(formatted) == len(urls):
+                    docs = [(url, formatted[url]) for url in urls]
+                else:
+                    kind = "misses"
+
+            self._count(run, kind)
+            return docs
+
+    def store(self, source: str, query: str, docs: list[tuple[str, str]]) -> None:
+
+        """ Save the URLs returned for a query and the formatted text of each page """
+
+        now = time.time()
+        normalized = normalize_query(query)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (url, formatted, created_at) VALUES (?, ?, ?)",
+                [(url, formatted, now) for url, formatted in docs],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO queries (source, normalized, n_terms, urls, created_at) VALUES (?, ?, ?, ?, ?)",
+                (source, normalized, len(normalized.split()), json.dumps([url for url, _ in docs]), now),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO query_terms (source, term, normalized) VALUES (?, ?, ?)",
+                [(source, term, normalized) for term in normalized.split()],
+            )
+            self._conn.commit()
+
+    def dedup(self, docs: list[tuple[str, str]], seen: list[str], run: str = "default") -> list[tuple[str, str]]:
+
+        """ Drop documents whose URL is already in `seen` (or earlier in `docs`) """
+
+        unique = unique_docs(docs, seen)
+        with self._lock:
+            self._count(run, "duplicate_docs", len(docs) - len(unique))
+        return unique
+
+    def evict_expired(self) -> None:
+        """ Delete queries and pages older than the TTL """
+        cutoff = self._cutoff()
+        with self._lock:
+            self._conn.execute("DELETE FROM queries WHERE created_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM query_terms WHERE NOT EXISTS (SELECT 1 FROM queries AS q "
+                               "WHERE q.source = query_terms.source AND q.normalized = query_terms.normalized)")
+            self._conn.execute("DELETE FROM documents WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def stats(self, run: str = "default", finished: bool = False) -> dict:
+        """ Hit rates for one run; a finished run's counters are dropped once read """
+        with self._lock:
+            counts = self._stats.pop(run, Counter()) if finished else self._stats.get(run, Counter())
+        lookups = counts["hits"] + counts["similar_hits"] + counts["misses"]
+        return {
+            "hits": counts["hits"],
+            "similar_hits": counts["similar_hits"],
+            "misses": counts["misses"],
+            "duplicate_docs": counts["duplicate_docs"],
+            "hit_rate": (counts["hits"] + counts["similar_hits"]) / lookups if lookups else 0.0,
+        }
+
+_cache: Optional[SearchCache] = None
+# Parallel search nodes make their first lookups at the same time
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[SearchCache]:
+    """ Shared search cache for this process, configured from the environment.
+
+    SEARCH_CACHE=off disables caching. SEARCH_CACHE_PATH (default: .search_cache.db
+    next to this module), SEARCH_CACHE_TTL (seconds, 0 for no expiry) and
+    SEARCH_CACHE_SIMILARITY (0-1) tune it.
+    """
+    global _cache
+    if os.environ.get("SEARCH_CACHE", "on").lower() in ("off", "false", "0"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttl = float(os.environ.get("SEARCH_CACHE_TTL", 24 * 60 * 60))
+            cache = SearchCache(database_path=os.environ.get("SEARCH_CACHE_PATH", DEFAULT_PATH),
+                                ttl=ttl or None,
+                                similarity_threshold=float(os.environ.get("SEARCH_CACHE_SIMILARITY", 0.8)))
+            cache.evict_expired()
+            _cache = cache
+    return _cache
+
+def cached_search(source: str, query: str, fetch, config: Optional[RunnableConfig] = None) -> list[tuple[str, str]]:
+
+    """ Return (url, formatted document) pairs for a query, calling `fetch(query)` only on a miss """
+
+    cache = get_cache()
+    docs = cache.lookup(source, query, run_key(config)) if cache else None
+    if docs is None:
+        docs = fetch(query)
+        if cache:
+            cache.store(source, query, docs)
+    return docs
+
+# (source, normalized query) -> fetch in progress, so concurrent interviews searching the same thing fetch it once
+_inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+async def acached_search(source: str, query: str, fetch, config: Optional[RunnableConfig] = None) -> list[tuple[str, str]]:
+
+    """ Async version of cached_search where `fetch(query)` is a coroutine function.
+
+    SQLite runs in a worker thread so the event loop keeps serving the other
+    retrievers and interviews.
+    """
+
+    cache = get_cache()
+    if not cache:
+        return await fetch(query)
+    docs = await asyncio.to_thread(cache.lookup, source, query, run_key(config))
+    if docs is not None:
+        return docs
+
+    async def fetch_and_store():
+        docs = await fetch(query)
+        await asyncio.to_thread(cache.store, source, query, docs)
+        return docs
+
+    # Join a fetch of the same query that is already under way
+    key = (source, normalize_query(query))
+    task = _inflight.get(key)
+    if task is None:
+        task = _inflight[key] = asyncio.ensure_future(fetch_and_store())
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+def dedup(docs: list[tuple[str, str]], seen: list[str], config: Optional[RunnableConfig] = None) -> list[tuple[str, str]]:
+
+    """ Drop documents already seen in this run, counting them when the cache is enabled """
+
+    cache = get_cache()
+    return cache.dedup(docs, seen, run_key(config)) if cache else unique_docs(docs, seen)
+
+def run_stats(config: Optional[RunnableConfig] = None) -> dict:
+
+    """ Hit rates for the run identified by `config`, which ends its bookkeeping """
+
+    cache = get_cache()
+    return cache.stats(run_key(config), finished=True) if cache else {}
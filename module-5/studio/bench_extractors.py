@@ -0,0 +1,101 @@
+""" Per-call overhead of building a Trustcall extractor in update_todos versus reusing a pooled one.
+
+rebuilt   create_extractor(...).with_listeners(on_end=Spy()) on every call, as update_todos did
+pooled    extractors.get_extractor(...) with the Spy passed as a callback of the call
+
+Both run against a fake chat model with no latency, so the numbers are pure
+framework overhead. The two paths are interleaved call by call, and each call
+is timed from build to result. Both must capture the same tool calls
+(Trustcall's prompts vary between calls, so only the tool names are compared).
+
+Run from this directory:
+
+    python bench_extractors.py --calls 200
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from trustcall import create_extractor
+
+import extractors
+import fakes
+import memory_agent
+
+class RunTreeSpy:
+
+    """ The Spy as update_todos used it: a listener walking the finished run tree """
+
+    def __init__(self):
+        self.called_tools = []
+
+    def __call__(self, run):
+        q = [run]
+        while q:
+            r = q.pop()
+            if r.child_runs:
+                q.extend(r.child_runs)
+            if r.run_type == "chat_model":
+                self.called_tools.append(r.outputs["generations"][0][0]["message"]["kwargs"]["tool_calls"])
+
+def rebuilt(model, payload):
+    spy = RunTreeSpy()
+    extractor = create_extractor(model, tools=[memory_agent.ToDo], tool_choice="ToDo", enable_inserts=True).with_listeners(on_end=spy)
+    extractor.invoke(payload)
+    return spy.called_tools
+
+def pooled(model, payload):
+    spy = memory_agent.Spy()
+    extractor = extractors.get_extractor(model, [memory_agent.ToDo], tool_choice="ToDo", enable_inserts=True)
+    extractor.invoke(payload, {"callbacks": [spy]})
+    return spy.called_tools
+
+def tool_names(called_tools):
+    return [[call["name"] for call in calls] for calls in called_tools]
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def percentile(latencies: list[float], q: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--existing", type=int, default=5, help="ToDos already in the store")
+    args = parser.parse_args()
+
+    model = fakes.FakeChatModel()
+    existing = [(f"todo-{i}", "ToDo", {"task": f"Task {i}", "time_to_complete": 30, "deadline": None,
+                                       "solutions": ["Look it up"], "status": "not started"})
+                for i in range(args.existing)]
+    payload = {"messages": [SystemMessage(content=memory_agent.TRUSTCALL_INSTRUCTION.format(time="2024-01-01T00:00:00")),
+                            HumanMessage(content="Add a task to book the dentist for mom")],
+               "existing": existing}
+
+    assert tool_names(rebuilt(model, payload)) == tool_names(pooled(model, payload))
+
+    # Interleaved call by call, alternating which goes first, so both see the same drift within the process
+    latencies = {"rebuilt": [], "pooled": []}
+    paths = [("rebuilt", rebuilt), ("pooled", pooled)]
+    for i in range(args.calls):
+        for name, fn in paths if i % 2 else paths[::-1]:
+            latencies[name].append(timed(lambda: fn(model, payload)))
+    saved = [r - p for r, p in zip(latencies["rebuilt"], latencies["pooled"])]
+
+    print(f"{'path':<10}{'build+call p50 ms':>19}{'build+call p99 ms':>19}")
+    for name, _ in paths:
+        print(f"{name:<10}{statistics.median(latencies[name]) * 1000:>19.2f}{percentile(latencies[name], 0.99) * 1000:>19.2f}")
+    print(f"\npooled saves {statistics.median(saved) * 1000:.2f} ms per call (median of paired differences)")
+
+if __name__ == "__main__":
+    main()
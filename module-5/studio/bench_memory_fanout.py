@@ -0,0 +1,94 @@
+""" LLM round trips and turn latency of the ToDo agent with sequential and parallel memory updates.
+
+Every user message asks for a profile, ToDo and instructions update at once.
+The agent's model is scripted to request all three: one per turn of the loop
+when parallel tool calls are off, all together when they are on.
+
+Run from this directory:
+
+    python bench_memory_fanout.py --turns 10 --latency 0.3
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.store.memory import InMemoryStore
+
+import fakes
+import memory_agent
+
+UPDATE_TYPES = ["user", "todo", "instructions"]
+
+class ScriptedAgentModel(fakes.FakeChatModel):
+
+    """ Requests every memory update not yet answered since the last user message, then replies """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tools = kwargs.get("tools") or []
+        if not any(tool["function"]["name"] == "UpdateMemory" for tool in tools):
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+        turn = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        requested = [call["args"]["update_type"] for m in messages[turn:] if isinstance(m, AIMessage) for call in m.tool_calls]
+        pending = [update_type for update_type in UPDATE_TYPES if update_type not in requested]
+        if kwargs.get("parallel_tool_calls") is False:
+            pending = pending[:1]
+        if pending:
+            message = AIMessage(content="", tool_calls=[
+                {"name": "UpdateMemory", "args": {"update_type": update_type}, "id": f"call_{turn}_{update_type}"}
+                for update_type in pending
+            ])
+        else:
+            message = AIMessage(content="Got it, your memory is updated.")
+        time.sleep(self._first_token_latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+class CallCounter(BaseCallbackHandler):
+
+    """ Counts chat model calls per graph node """
+
+    def __init__(self):
+        self.calls = {}
+
+    def on_chat_model_start(self, serialized, messages, *, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "?")
+        self.calls[node] = self.calls.get(node, 0) + 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM latency per call (seconds)")
+    args = parser.parse_args()
+
+    memory_agent.model = ScriptedAgentModel(latency=args.latency)
+    print(f"{'mode':<12}{'agent calls':>13}{'total calls':>13}{'turn p50 ms':>13}{'turn max ms':>13}{'answered':>10}")
+    for parallel in (False, True):
+        graph = memory_agent.builder.compile(store=InMemoryStore())
+        counter = CallCounter()
+        config = {"configurable": {"user_id": "lance", "parallel_memory_updates": parallel}, "callbacks": [counter]}
+        latencies, messages = [], []
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            messages = graph.invoke({"messages": messages + [HumanMessage(content=(
+                f"I'm Lance, I live in SF. Add task {turn}: book the dentist. And always add deadlines.")
+            )]}, config)["messages"]
+            latencies.append(time.perf_counter() - start)
+
+        # Every tool call is answered exactly once
+        calls = [call["id"] for m in messages if isinstance(m, AIMessage) for call in m.tool_calls]
+        answers = [m.tool_call_id for m in messages if isinstance(m, ToolMessage)]
+        assert sorted(calls) == sorted(answers)
+        print(f"{'parallel' if parallel else 'sequential':<12}{counter.calls['task_mAIstro'] / args.turns:>13.1f}"
+              f"{sum(counter.calls.values()) / args.turns:>13.1f}{statistics.median(latencies) * 1000:>13.0f}"
+              f"{max(latencies) * 1000:>13.0f}{len(answers) / args.turns:>10.1f}")
+
+if __name__ == "__main__":
+    main()
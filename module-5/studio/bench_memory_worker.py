@@ -0,0 +1,107 @@
+""" Turn latency and LLM calls of the memory graphs with inline and deferred memory writes.
+
+Several users chat at once, each sending turns in quick succession against a
+fake chat model. In deferred mode turns go through MemoryWorker.run_turn and
+write_memory runs later, once per burst of turns.
+
+Run from this directory:
+
+    python bench_memory_worker.py --graph memory_store --users 4 --turns 8 --latency 0.3
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+from pydantic import PrivateAttr
+from trustcall import create_extractor
+
+import fakes
+import memory_store
+import memoryschema_collection
+from memory_worker import MemoryWorker
+
+GRAPHS = {"memory_store": memory_store, "collection": memoryschema_collection}
+
+class CountingChatModel(fakes.FakeChatModel):
+
+    """ A fake chat model that counts its calls, wherever they are made from """
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self._lock:
+            self._calls += 1
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+def run(mode: str, module, args) -> None:
+    model = CountingChatModel(latency=args.latency)
+    module.model = model
+    if module is memoryschema_collection:
+        module.trustcall_extractor = create_extractor(model, tools=[module.Memory], tool_choice="Memory", enable_inserts=True)
+
+    store = InMemoryStore()
+    graph = module.builder.compile(checkpointer=MemorySaver(), store=store)
+    worker = MemoryWorker(module.write_memory, store, delay=args.delay, workers=args.workers) if mode == "deferred" else None
+
+    def user(i: int) -> list[float]:
+        config = {"configurable": {"thread_id": f"{mode}-{i}", "user_id": f"user-{i}"}}
+        latencies = []
+        for turn in range(args.turns):
+            message = {"messages": [HumanMessage(content=f"Hi, I'm user {i}. Fact {turn}: I like hobby number {turn}.")]}
+            start = time.perf_counter()
+            if worker:
+                worker.run_turn(graph, message, config)
+            else:
+                graph.invoke(message, config)
+            latencies.append(time.perf_counter() - start)
+            time.sleep(args.think)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.users) as pool:
+        latencies = sorted(latency for result in pool.map(user, range(args.users)) for latency in result)
+    turns_done = time.perf_counter() - start
+    if worker:
+        worker.close()
+    settled = time.perf_counter() - start
+
+    # Every user ends up with a memory either way
+    assert all(store.search(ns) for ns in store.list_namespaces())
+    assert len(store.list_namespaces()) == args.users
+
+    writes = worker.stats["writes"] if worker else args.users * args.turns
+    print(f"{mode:<10}{statistics.median(latencies) * 1000:>9.0f}{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:>9.0f}"
+          f"{turns_done:>11.1f}{settled:>11.1f}{model.calls:>11}{writes:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--graph", choices=GRAPHS, default="memory_store")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--think", type=float, default=0.2, help="Pause between a reply and the user's next message")
+    parser.add_argument("--delay", type=float, default=1.0, help="How long a deferred write waits for more turns")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'p50 ms':>9}{'p99 ms':>9}{'turns s':>11}{'settled s':>11}{'LLM calls':>11}{'writes':>9}")
+    for mode in ("inline", "deferred"):
+        run(mode, GRAPHS[args.graph], args)
+
+if __name__ == "__main__":
+    main()
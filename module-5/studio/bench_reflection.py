@@ -0,0 +1,188 @@
+""" Prompt tokens the ToDo agent's memory updates send Trustcall with full and incremental reflection.
+
+full         every update reflects on the whole thread, as before
+incremental  every update reflects on the messages since its last one
+
+A scripted conversation is replayed against a rule-based model: each user
+message states facts ("My name is ...", "Add task: ...", "Mark ... done"), the
+agent requests the matching updates and the extractor turns the facts it is
+shown into inserts or JSON patches against the existing memories, skipping
+those already applied. Both modes must leave the same memories after every turn.
+
+Run from this directory:
+
+    python bench_reflection.py --turns 40 --prompt-token-latency 0.0001
+"""
+
+import argparse
+import ast
+import os
+import re
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.memory import InMemoryStore
+
+import fakes
+import memory_agent
+
+FACTS = [
+    "My name is Lance.",
+    "I live in San Francisco.",
+    "Add task: book the dentist.",
+    "I work as an engineer.",
+    "I like biking.",
+    "Add task: renew the passport.",
+    "Mark book the dentist done.",
+    "I like baking.",
+    "I live in Oakland.",
+    "Add task: plan the team offsite.",
+    "Mark renew the passport done.",
+    "Add task: buy a birthday gift.",
+]
+CHATTER = ["How is my week looking?", "Thanks, that helps.", "Anything I should do first?"]
+
+PROFILE = re.compile(r"My name is (?P<name>[^.]+)\.|I live in (?P<location>[^.]+)\.|I work as (?:an? )?(?P<job>[^.]+)\.|I like (?P<interest>[^.]+)\.")
+TODO = re.compile(r"Add task: (?P<add>[^.]+)\.|Mark (?P<done>.+?) done\.")
+INSTANCE = re.compile(r'<instance id=(\S+) schema_type="(\w+)">\n(.*?)\n</instance>', re.DOTALL)
+
+def conversation(turns: int) -> list[str]:
+    """ Facts interleaved with small talk, every fact said once """
+    script = []
+    for i in range(turns):
+        script.append(FACTS[i // 2] if i % 2 == 0 and i // 2 < len(FACTS) else CHATTER[i % len(CHATTER)])
+    return script
+
+def said(messages) -> str:
+    return " ".join(m.content for m in messages if isinstance(m, HumanMessage))
+
+class ReplayModel(fakes.FakeChatModel):
+
+    """ Answers the agent and Trustcall from the facts in the messages it is shown """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        names = [tool["function"]["name"] for tool in kwargs.get("tools") or []]
+        if "UpdateMemory" in names:
+            message = self._route(messages, kwargs.get("parallel_tool_calls"))
+        elif names:
+            instances = [match for m in messages if isinstance(m, SystemMessage) for match in INSTANCE.findall(m.content)]
+            existing = {doc_id: ast.literal_eval(doc) for doc_id, _, doc in instances}
+            # With existing memories only PatchDoc may be bound, so their type tells the schema
+            extract = self._profile if "Profile" in names + [schema for _, schema, _ in instances] else self._todos
+            message = AIMessage(content="", tool_calls=[{**call, "id": f"call_{i}"}
+                                                        for i, call in enumerate(extract(said(messages), existing))])
+        else:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        time.sleep(self._first_token_latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _route(self, messages, parallel_tool_calls):
+        turn = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        wanted = [update_type for update_type, pattern in (("user", PROFILE), ("todo", TODO))
+                  if pattern.search(messages[turn].content)]
+        requested = [call["args"]["update_type"] for m in messages[turn:] if isinstance(m, AIMessage) for call in m.tool_calls]
+        pending = [update_type for update_type in wanted if update_type not in requested]
+        if parallel_tool_calls is False:
+            pending = pending[:1]
+        if not pending:
+            return AIMessage(content="Noted.")
+        return AIMessage(content="", tool_calls=[
+            {"name": "UpdateMemory", "args": {"update_type": update_type}, "id": f"call_{turn}_{update_type}"}
+            for update_type in pending
+        ])
+
+    def _profile(self, text, existing):
+        profile = {"name": None, "location": None, "job": None, "connections": [], "interests": []}
+        doc_id, current = next(iter(existing.items()), (None, profile))
+        updated = {**current, "interests": list(current["interests"])}
+        for match in PROFILE.finditer(text):
+            field, value = next((k, v) for k, v in match.groupdict().items() if v)
+            if field == "interest":
+                if value not in updated["interests"]:
+                    updated["interests"].append(value)
+            else:
+                updated[field] = value
+        if doc_id is None:
+            return [{"name": "Profile", "args": updated}]
+        patches = [{"op": "replace", "path": f"/{k}", "value": v} for k, v in updated.items() if current.get(k) != v]
+        return [{"name": "PatchDoc", "args": {"json_doc_id": doc_id, "planned_edits": "", "patches": patches}}]
+
+    def _todos(self, text, existing):
+        tasks = {doc["task"]: doc_id for doc_id, doc in existing.items()}
+        done = {match["done"] for match in TODO.finditer(text) if match["done"]}
+        calls, added = [], set()
+        for task in (match["add"] for match in TODO.finditer(text) if match["add"]):
+            if task not in tasks and task not in added:
+                added.add(task)
+                calls.append({"name": "ToDo", "args": {"task": task, "time_to_complete": 30, "deadline": None,
+                                                       "solutions": [f"Set aside time to {task}"],
+                                                       "status": "done" if task in done else "not started"}})
+        for task in done:
+            if task in tasks and existing[tasks[task]]["status"] != "done":
+                calls.append({"name": "PatchDoc", "args": {"json_doc_id": tasks[task], "planned_edits": "",
+                                                           "patches": [{"op": "replace", "path": "/status", "value": "done"}]}})
+        if not calls and existing:
+            calls.append({"name": "PatchDoc", "args": {"json_doc_id": next(iter(existing)), "planned_edits": "", "patches": []}})
+        return calls
+
+class ExtractorTokens(BaseCallbackHandler):
+
+    """ Prompt tokens (about 4 characters each) of the chat model calls made by the memory update nodes """
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, *, metadata=None, **kwargs):
+        # Trustcall runs as a subgraph, so the update node is the outer part of the namespace
+        if (metadata or {}).get("langgraph_checkpoint_ns", "").split(":")[0] in ("update_profile", "update_todos"):
+            self.calls += 1
+            self.tokens += sum(len(str(m.content)) for m in messages[0]) // 4
+
+def memories(store, user_id: str):
+    profile = [item.value for item in store.search(("profile", user_id))]
+    todos = sorted((item.value["task"], item.value["status"]) for item in store.search(("todo", user_id), limit=100))
+    return profile, todos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0001, help="Fake LLM latency per prompt token (seconds)")
+    parser.add_argument("--parallel", action="store_true", help="Run the memory updates of a turn in parallel")
+    args = parser.parse_args()
+
+    memory_agent.model = ReplayModel(prompt_token_latency=args.prompt_token_latency)
+    script = conversation(args.turns)
+    snapshots = {}
+    print(f"{'mode':<13}{'extractor calls':>17}{'prompt tokens':>15}{'last turn tokens':>18}{'turn p50 ms':>13}{'turn max ms':>13}")
+    for incremental in (False, True):
+        store = InMemoryStore()
+        graph = memory_agent.builder.compile(checkpointer=MemorySaver(), store=store)
+        counter = ExtractorTokens()
+        config = {"configurable": {"thread_id": "replay", "user_id": "lance", "incremental_reflection": incremental,
+                                   "parallel_memory_updates": args.parallel},
+                  "callbacks": [counter]}
+        latencies, snapshots[incremental], last = [], [], 0
+        for line in script:
+            before, start = counter.tokens, time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=line)]}, config)
+            latencies.append(time.perf_counter() - start)
+            snapshots[incremental].append(memories(store, "lance"))
+            last = counter.tokens - before or last
+        print(f"{'incremental' if incremental else 'full':<13}{counter.calls:>17}{counter.tokens:>15}{last:>18}"
+              f"{statistics.median(latencies) * 1000:>13.1f}{max(latencies) * 1000:>13.1f}")
+
+    # Both modes hold the same memories after every turn
+    assert snapshots[False] == snapshots[True]
+    profile, todos = snapshots[True][-1]
+    print(f"\nprofile: {profile}\ntodos:   {todos}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+""" Prompt size and latency of task_mAIstro for a user with thousands of ToDos.
+
+all      plain store.search(namespace), as the graphs did before (the store's default page)
+dump     every ToDo in the prompt
+ranked   top-k by similarity to the latest messages, blended with recency
+
+Each turn asks about one specific ToDo; "hit" is how often it made the prompt.
+ToDo ages are spread over the last --days days.
+
+Run from this directory:
+
+    python bench_retrieval.py --todos 5000 --turns 30
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.store.base import PutOp
+
+import fakes
+import memory_agent
+import memory_retrieval
+from embeddings import DIMS, HashingEmbeddings
+from sqlite_store import SqliteStore
+
+VERBS = ["book", "renew", "buy", "call", "fix", "plan", "email", "schedule", "clean", "pay", "return", "order"]
+OBJECTS = ["dentist", "passport", "groceries", "bike", "insurance", "flights", "plumber", "gift", "taxes", "laptop",
+           "car", "garden", "library", "vet", "gym", "electrician", "hotel", "bank", "school", "doctor", "rent",
+           "printer", "phone", "camera", "kitchen", "roof", "boiler", "visa", "wedding", "concert"]
+QUALIFIERS = ["for mom", "for the kids", "before the holidays", "with Sarah", "for the office", "in Lisbon",
+              "for the anniversary", "with the landlord", "next spring", "for grandma", "in Berlin", "for the team",
+              "after the move", "with Tom", "for the reunion", "in Paris", "for the conference", "with the neighbours"]
+
+class PromptTokens(BaseCallbackHandler):
+
+    """ Records the approximate prompt tokens of every chat model call """
+
+    def __init__(self):
+        self.tokens = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.tokens.append(sum(len(str(m.content)) for m in messages[0]) // 4)
+
+def populate(store: SqliteStore, user_id: str, todos: int, days: float) -> list[dict]:
+    rng = random.Random(0)
+    items = []
+    for i in range(todos):
+        task = f"{rng.choice(VERBS).capitalize()} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}"
+        items.append({"task": task, "time_to_complete": rng.choice([15, 30, 60, 120]), "deadline": None,
+                      "solutions": [f"Look up {task.split()[1]} options online"], "status": "not started"})
+    for i in range(0, todos, 500):
+        store.batch([PutOp(("todo", user_id), f"todo-{j}", items[j]) for j in range(i, min(i + 500, todos))])
+    # Spread the ToDos' ages over the last `days` days
+    now = time.time()
+    with store.lock, store.conn:
+        store.conn.executemany("UPDATE store SET updated_at = ? WHERE key = ?",
+                               [(now - rng.random() * days * 86400, f"todo-{j}") for j in range(todos)])
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--todos", type=int, default=5000)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--days", type=float, default=180)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM time to first token (seconds)")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.00002, help="Extra seconds per prompt token")
+    args = parser.parse_args()
+
+    memory_agent.model = fakes.FakeChatModel(latency=args.latency, prompt_token_latency=args.prompt_token_latency)
+    recall = memory_retrieval.recall
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SqliteStore.from_path(os.path.join(tmp, "store.db"), index={"embed": HashingEmbeddings(), "dims": DIMS})
+        todos = populate(store, "lance", args.todos, args.days)
+        rng = random.Random(1)
+        targets = rng.sample(range(args.todos), args.turns)
+
+        print(f"{'mode':<8}{'prompt tokens':>15}{'retrieval ms':>14}{'turn p50 ms':>13}{'turn p99 ms':>13}{'hit':>7}")
+        for mode in ("all", "dump", "ranked"):
+            if mode == "dump":
+                memory_retrieval.recall = lambda store, namespace, messages, config: store.search(namespace, limit=args.todos)
+            else:
+                memory_retrieval.recall = recall
+            retrieval, turns, hits = [], [], 0
+            recorder = PromptTokens()
+            # Run the node as a runnable so the model call inherits the callbacks
+            node = RunnableLambda(lambda state, config: memory_agent.task_mAIstro(state, config, store))
+            config = {"configurable": {"user_id": "lance", "memory_retrieval": "all" if mode == "all" else "ranked"},
+                      "callbacks": [recorder]}
+            for target in targets:
+                words = todos[target]["task"].split()
+                messages = [HumanMessage(content=f"What was the plan to {words[0].lower()} the {' '.join(words[1:])}?")]
+
+                start = time.perf_counter()
+                memories = memory_retrieval.recall(store, ("todo", "lance"), messages, config)
+                retrieval.append(time.perf_counter() - start)
+                hits += f"todo-{target}" in {m.key for m in memories} or todos[target] in [m.value for m in memories]
+
+                start = time.perf_counter()
+                node.invoke({"messages": messages}, config)
+                turns.append(time.perf_counter() - start)
+
+            turns.sort()
+            print(f"{mode:<8}{statistics.mean(recorder.tokens):>15,.0f}{statistics.median(retrieval) * 1000:>14.1f}"
+                  f"{statistics.median(turns) * 1000:>13.0f}{turns[min(len(turns) - 1, int(len(turns) * 0.99))] * 1000:>13.0f}"
+                  f"{hits / len(targets):>7.0%}")
+        memory_retrieval.recall = recall
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+""" Search latency of InMemoryStore and SqliteStore on large memory namespaces.
+
+One user holds --items ToDo-like memories and --users other users hold a
+tenth as many each. Every query runs --samples times against both stores.
+
+Run from this directory:
+
+    python bench_store.py --items 10000 --users 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from langgraph.store.base import PutOp
+from langgraph.store.memory import InMemoryStore
+
+from sqlite_store import SqliteStore
+
+STATUSES = ["not started", "in progress", "done", "archived"]
+
+def todo(rng: random.Random, i: int) -> dict:
+    return {
+        "task": f"Task {i}: " + " ".join(rng.choice(["call", "book", "email", "buy", "plan", "fix"]) for _ in range(6)),
+        "time_to_complete": rng.randint(5, 240),
+        "deadline": None if rng.random() < 0.3 else f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "solutions": [f"option {j}" for j in range(rng.randint(1, 4))],
+        "status": rng.choice(STATUSES),
+    }
+
+def populate(store, items: int, users: int, batch_size: int = 500) -> float:
+    rng = random.Random(0)
+    ops = [PutOp(("todo", "user-0"), f"todo-{i}", todo(rng, i)) for i in range(items)]
+    ops += [PutOp(("todo", f"user-{u}"), f"todo-{i}", todo(rng, i)) for u in range(1, users + 1) for i in range(items // 10)]
+    start = time.perf_counter()
+    for i in range(0, len(ops), batch_size):
+        store.batch(ops[i:i + batch_size])
+    return time.perf_counter() - start
+
+QUERIES = {
+    "first page": dict(),
+    "filter status": dict(filter={"status": "done"}),
+    "filter range": dict(filter={"time_to_complete": {"$lte": 30}}),
+    "deep page": lambda items: dict(offset=items // 2),
+    "all items": lambda items: dict(limit=items),
+}
+
+def timed(fn, samples: int) -> str:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return f"{statistics.median(latencies) * 1000:>10.2f}{p99 * 1000:>10.2f}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="Memories of the user being searched")
+    parser.add_argument("--users", type=int, default=20, help="Other users in the store")
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.db")
+        stores = {"InMemoryStore": InMemoryStore(), "SqliteStore": SqliteStore.from_path(path)}
+        for name, store in stores.items():
+            print(f"{name}: loaded in {populate(store, args.items, args.users):.2f}s")
+        print(f"database: {os.path.getsize(path) / 1e6:.1f} MB\n")
+
+        print(f"{'query':<16}" + "".join(f"{name + ' p50':>20}{'p99 ms':>10}" for name in stores))
+        for query, kwargs in QUERIES.items():
+            kwargs = kwargs(args.items) if callable(kwargs) else kwargs
+            results = [store.search(("todo", "user-0"), **kwargs) for store in stores.values()]
+            assert len(results[0]) == len(results[1]), query
+            row = "".join(f"{'':>10}{timed(lambda: store.search(('todo', 'user-0'), **kwargs), args.samples)}"
+                          for store in stores.values())
+            print(f"{query:<16}{row}")
+        row = "".join(f"{'':>10}{timed(lambda: store.get(('todo', 'user-0'), 'todo-42'), args.samples)}"
+                      for store in stores.values())
+        print(f"{'get':<16}{row}")
+
+        # Everything is still there after reopening
+        stores["SqliteStore"].close()
+        with SqliteStore.from_conn_string(path) as reopened:
+            assert len(reopened.search(("todo", "user-0"), limit=args.items + 1)) == args.items
+        print("\nreopened: all items present")
+
+if __name__ == "__main__":
+    main()
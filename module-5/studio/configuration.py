@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field, fields
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 
 from langchain_core.runnables import RunnableConfig
 from typing_extensions import Annotated
@@ -10,6 +10,16 @@ from dataclasses import dataclass
 class Configuration:
     """The configurable fields for the chatbot."""
     user_id: str = "default-user"
+    memory_retrieval: Literal["ranked", "all"] = "ranked" # "all" loads memories with a plain store.search, as before
+    memory_top_k: int = 10 # Memories put in the prompt when ranking
+    memory_candidates: int = 50 # Most similar memories fetched from the store before re-ranking by recency
+    recency_weight: float = 0.3 # Share of the ranking score given to recency rather than similarity
+    recency_half_life_hours: float = 168.0 # Age at which a memory's recency score halves
+    memory_query_messages: int = 3 # Recent user messages used as the retrieval query
+    parallel_memory_updates: bool = False # Let the agent request several memory updates at once and run them in parallel
+    incremental_reflection: bool = True # Send the memory extractor only the messages since its last reflection on this thread
+    deferred_memory_writes: bool = False # End the turn after the reply and leave write_memory to a MemoryWorker (inline without one)
+    backend: str = "live" # "fake" runs on the local stand-ins in fakes.py, see backends.py (or set BACKEND)
 
     @classmethod
     def from_runnable_config(
@@ -24,4 +34,13 @@ class Configuration:
             for f in fields(cls)
             if f.init
         }
-        return cls(**{k: v for k, v in values.items() if v})
\ No newline at end of file
+        # Environment variables arrive as strings, and 0 / False are valid overrides
+        types = {f.name: f.type for f in fields(cls)}
+        return cls(**{k: _parse(types[k], v) for k, v in values.items() if v is not None and v != ""})
+
+def _parse(type_, value):
+    if type_ is bool and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    if type_ in (int, float):
+        return type_(value)
+    return value
@@ -0,0 +1,58 @@
+""" Local embeddings for semantic memory search, with no model download or API call.
+
+Use them as a store index:
+
+    store = InMemoryStore(index={"embed": HashingEmbeddings(), "dims": DIMS})
+
+or from langgraph.json, where `aembed_texts` is the embedding function.
+"""
+
+import math
+import re
+import zlib
+
+from langchain_core.embeddings import Embeddings
+
+DIMS = 256
+
+# Too common in memories to tell them apart; includes the keys of the memory schemas
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have i in is it me my of on or our so that the their this
+to was we were will with you your user task time_to_complete deadline solutions status content
+not started progress done archived none null true false
+""".split())
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+class HashingEmbeddings(Embeddings):
+
+    """ Bag-of-words vectors built with the hashing trick.
+
+    Words and adjacent word pairs are hashed into `dims` signed buckets and
+    the vector is normalized, so cosine similarity measures shared wording.
+    Good enough to rank memories against the latest messages; swap in a
+    model-backed Embeddings for paraphrase-level matching.
+    """
+
+    def __init__(self, dims: int = DIMS):
+        self.dims = dims
+
+    def _features(self, text: str) -> list[str]:
+        words = [w for w in TOKEN.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = [0.0] * self.dims
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dims] += 1.0 if h & 0x80000000 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+embeddings = HashingEmbeddings()
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    return embeddings.embed_documents(texts)
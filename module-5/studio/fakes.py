@@ -0,0 +1,223 @@
+import ast
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Optional
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+WORDS = ("agent", "graph", "state", "memory", "retrieval", "context", "latency", "token",
+         "model", "prompt", "search", "report", "analyst", "interview", "source", "summary")
+
+# The existing documents Trustcall shows the model: keyed by schema name, or by id with their schema type
+EXISTING = re.compile(r'<schema id=(\S+)>\n<instance>\n(.*?)\n</instance>|<instance id=(\S+) schema_type="\w+">\n(.*?)\n</instance>',
+                      re.DOTALL)
+
+def _existing_docs(messages: list[BaseMessage]) -> dict[str, Any]:
+
+    """ The documents Trustcall asked to patch, by json_doc_id """
+
+    docs = {}
+    for message in messages:
+        if not isinstance(message.content, str):
+            continue
+        for schema_id, schema_doc, instance_id, instance_doc in EXISTING.findall(message.content):
+            try:
+                docs[schema_id or instance_id] = ast.literal_eval(schema_doc or instance_doc)
+            except (ValueError, SyntaxError):
+                docs[schema_id or instance_id] = None
+    return docs
+
+def _fake_patch(docs: dict[str, Any], rng: random.Random) -> dict:
+
+    """ PatchDoc arguments for one of the existing documents.
+
+    Appends to one of its lists of strings if it has any, so the patched
+    document still validates; otherwise rewrites a field with its own value.
+    """
+
+    doc_id = rng.choice(sorted(docs))
+    doc = docs[doc_id] if isinstance(docs[doc_id], dict) else {}
+    lists = sorted(key for key, value in doc.items() if value and isinstance(value, list) and all(isinstance(v, str) for v in value))
+    if lists:
+        key = rng.choice(lists)
+        patches = [{"op": "add", "path": f"/{key}/-", "value": " ".join(rng.choice(WORDS) for _ in range(3))}]
+    elif doc:
+        key = sorted(doc)[0]
+        patches = [{"op": "replace", "path": f"/{key}", "value": doc[key]}]
+    else:
+        patches = []
+    return {"json_doc_id": doc_id, "planned_edits": "Fake edit", "patches": patches}
+
+def _fake_value(schema: dict, defs: dict, rng: random.Random, name: str = "value") -> Any:
+
+    """ Build a value that validates against a JSON schema """
+
+    if "$ref" in schema:
+        return _fake_value(defs[schema["$ref"].split("/")[-1]], defs, rng, name)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"] or schema["anyOf"]
+        return _fake_value(options[0], defs, rng, name)
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type", "string")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {key: _fake_value(value, defs, rng, key) for key, value in properties.items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), 2)
+        return [_fake_value(schema.get("items", {}), defs, rng, name) for _ in range(count)]
+    if kind == "integer":
+        return 0
+    if kind == "number":
+        return 0.0
+    if kind == "boolean":
+        return False
+    if schema.get("format") == "date-time":
+        return "2024-01-01T00:00:00"
+    return f"{name} " + " ".join(rng.choice(WORDS) for _ in range(4))
+
+class FakeChatModel(BaseChatModel):
+
+    """ Deterministic local chat model for offline benchmarks.
+
+    The same messages always produce the same reply. Bound tools (including the
+    ones added by `with_structured_output`) are answered with a tool call whose
+    arguments are generated from the tool's JSON schema, except right after a
+    tool result when no tool is forced: then the model replies in text, so agent
+    loops end. Trustcall's PatchDoc is answered with a patch to one of the
+    existing documents shown in the prompt. Replies are `reply_tokens` words long. `latency` is the time to
+    the first token, plus `prompt_token_latency` for every prompt token (roughly
+    4 characters), and `token_latency` the time for each token after it.
+    `temperature` is accepted for ChatOpenAI compatibility and only keys the cache.
+    """
+
+    model_name: str = "fake-chat-model"
+    temperature: float = 0.0
+    latency: float = 0.0
+    token_latency: float = 0.0
+    prompt_token_latency: float = 0.0
+    reply_tokens: int = 24
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name, "temperature": self.temperature, "seed": self.seed}
+
+    def bind_tools(self, tools, *, tool_choice: Optional[str] = None, **kwargs):
+        formatted_tools = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=formatted_tools, tool_choice=tool_choice, **kwargs)
+
+    def _respond(self, messages: list[BaseMessage], tools: Optional[list] = None,
+                 tool_choice: Any = None) -> AIMessage:
+        digest = hashlib.sha256(
+            "\n".join(f"{m.type}:{m.content}" for m in messages).encode()
+        ).hexdigest()
+        rng = random.Random(f"{self.seed}:{digest}")
+
+        forced = tool_choice is not None and tool_choice not in ("auto", "none")
+        if tools and (forced or not messages or messages[-1].type != "tool"):
+            names = [tool["function"]["name"] for tool in tools]
+            name = tool_choice if tool_choice in names else names[0]
+            parameters = next(t["function"]["parameters"] for t in tools if t["function"]["name"] == name)
+            docs = _existing_docs(messages) if name == "PatchDoc" else {}
+            args = _fake_patch(docs, rng) if docs else _fake_value(parameters, parameters.get("$defs", {}), rng, name)
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{digest[:12]}"}])
+
+        content = " ".join(rng.choice(WORDS) for _ in range(self.reply_tokens))
+        return AIMessage(content=f"Fake response {digest[:8]}: {content}")
+
+    def _first_token_latency(self, messages: list[BaseMessage]) -> float:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) / 4
+        return self.latency + self.prompt_token_latency * prompt_tokens
+
+    def _chunks(self, message: AIMessage) -> list[AIMessageChunk]:
+        if message.tool_calls:
+            return [AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ])]
+        words = message.content.split(" ")
+        return [AIMessageChunk(content=word if i == 0 else " " + word) for i, word in enumerate(words)]
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+        time.sleep(self._first_token_latency(messages) + self.token_latency * (len(self._chunks(message)) - 1))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+        await asyncio.sleep(self._first_token_latency(messages) + self.token_latency * (len(self._chunks(message)) - 1))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+        for i, chunk in enumerate(self._chunks(message)):
+            time.sleep(self._first_token_latency(messages) if i == 0 else self.token_latency)
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs):
+        message = self._respond(messages, kwargs.get("tools"), kwargs.get("tool_choice"))
+        for i, chunk in enumerate(self._chunks(message)):
+            await asyncio.sleep(self._first_token_latency(messages) if i == 0 else self.token_latency)
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+class FakeTavilySearch:
+
+    """ Stand-in for TavilySearchResults that returns canned documents """
+
+    def __init__(self, max_results: int = 3, latency: float = 0.0, **kwargs):
+        self.max_results = max_results
+        self.latency = latency
+
+    def _results(self, query: str) -> list[dict]:
+        slug = hashlib.sha256(query.encode()).hexdigest()[:8]
+        return [{"url": f"https://example.com/{slug}/{i}", "content": f"Web result {i} for {query}"}
+                for i in range(self.max_results)]
+
+    def invoke(self, query: str, config=None) -> list[dict]:
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def ainvoke(self, query: str, config=None) -> list[dict]:
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+class FakeWikipediaLoader:
+
+    """ Stand-in for WikipediaLoader that returns canned pages """
+
+    def __init__(self, query: str, load_max_docs: int = 2, latency: float = 0.0, **kwargs):
+        self.query = query
+        self.load_max_docs = load_max_docs
+        self.latency = latency
+
+    def _documents(self):
+        slug = hashlib.sha256(self.query.encode()).hexdigest()[:8]
+        return [Document(page_content=f"Wikipedia page {i} about {self.query}",
+                         metadata={"source": f"https://en.wikipedia.org/wiki/{slug}_{i}"})
+                for i in range(self.load_max_docs)]
+
+    def load(self):
+        time.sleep(self.latency)
+        return self._documents()
+
+    async def aload(self):
+        await asyncio.sleep(self.latency)
+        return self._documents()
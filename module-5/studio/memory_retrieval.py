@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore, Item, SearchItem
+
+import configuration
+
+def retrieval_query(messages: list[AnyMessage], count: int) -> str:
+    """ The text of the last `count` user messages, newest last """
+    texts = [m.content for m in messages if m.type == "human" and isinstance(m.content, str)]
+    return "\n".join(texts[-count:])
+
+def rank(items: list[SearchItem], top_k: int, recency_weight: float, half_life_hours: float,
+         now: Optional[datetime] = None) -> list[SearchItem]:
+
+    """ Order memories by similarity blended with recency, and keep the best `top_k`.
+
+    Recency halves every `half_life_hours` since the memory was last updated.
+    Items without a similarity score (a store with no index) rank by recency alone.
+    """
+
+    now = now or datetime.now(timezone.utc)
+    def score(item: SearchItem) -> float:
+        age_hours = max((now - item.updated_at).total_seconds(), 0.0) / 3600
+        recency = 0.5 ** (age_hours / half_life_hours)
+        similarity = item.score if item.score is not None else 0.0
+        return (1 - recency_weight) * similarity + recency_weight * recency
+    return sorted(items, key=score, reverse=True)[:top_k]
+
+def all_items(store: BaseStore, namespace: tuple[str, ...], page_size: int) -> list[SearchItem]:
+    """ Every memory in `namespace`, read a page at a time """
+    items = []
+    while page := store.search(namespace, limit=page_size, offset=len(items)):
+        items.extend(page)
+        if len(page) < page_size:
+            break
+    return items
+
+def recall(store: BaseStore, namespace: tuple[str, ...], messages: list[AnyMessage],
+           config: RunnableConfig) -> list[Item]:
+
+    """ Memories from `namespace` to put in the prompt for the current turn.
+
+    In "ranked" mode the store is searched with the latest user messages and
+    the candidates re-ranked by recency, so the prompt holds at most
+    `memory_top_k` memories however many the user has. A store with no index
+    cannot rank by similarity, so every memory is read and the newest kept.
+    "all" keeps the plain `store.search(namespace)` the graphs used before.
+    """
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if configurable.memory_retrieval == "all":
+        return store.search(namespace)
+
+    query = retrieval_query(messages, configurable.memory_query_messages)
+    limit = max(configurable.memory_candidates, configurable.memory_top_k)
+    candidates = store.search(namespace, query=query or None, limit=limit)
+
+    # A store with no index ignores the query and returns the oldest items first,
+    # so read the whole namespace and let recency pick
+    if len(candidates) == limit and all(item.score is None for item in candidates):
+        candidates = all_items(store, namespace, limit)
+    return rank(candidates, configurable.memory_top_k, configurable.recency_weight, configurable.recency_half_life_hours)
@@ -1,12 +1,14 @@
 from langchain_core.messages import SystemMessage
 from langchain_core.runnables.config import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.store.base import BaseStore
+import backends
 import configuration
+import llm_cache
+import memory_worker
 
 # Initialize the LLM
-model = ChatOpenAI(model="gpt-4o", temperature=0) 
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache()) 
 
 # Chatbot instruction
 MODEL_SYSTEM_MESSAGE = """You are a helpful assistant with memory that provides information about the user. 
@@ -94,11 +96,17 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
     key = "user_memory"
     store.put(namespace, key, {"memory": new_memory.content})
 
+def route_after_model(state: MessagesState, config: RunnableConfig):
+
+    """End the turn right after the reply when a MemoryWorker writes the memory later."""
+
+    return END if memory_worker.deferred(config) else "write_memory"
+
 # Define the graph
 builder = StateGraph(MessagesState,config_schema=configuration.Configuration)
 builder.add_node("call_model", call_model)
 builder.add_node("write_memory", write_memory)
 builder.add_edge(START, "call_model")
-builder.add_edge("call_model", "write_memory")
+builder.add_conditional_edges("call_model", route_after_model, ["write_memory", END])
 builder.add_edge("write_memory", END)
 graph = builder.compile()
\ No newline at end of file
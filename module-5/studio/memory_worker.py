@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable
+
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore
+
+import configuration
+
+logger = logging.getLogger(__name__)
+
+# Set in the configurable by MemoryWorker.run_turn for the turns it will write memory for
+MEMORY_WORKER_KEY = "memory_worker"
+
+def deferred(config: RunnableConfig) -> bool:
+
+    """ Whether a MemoryWorker writes this turn's memory, rather than the graph.
+
+    Without a worker attached nothing would ever write it, so turns that set
+    `deferred_memory_writes` outside `run_turn` write inline.
+    """
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+    return configurable.deferred_memory_writes and bool(config.get("configurable", {}).get(MEMORY_WORKER_KEY))
+
+class MemoryWorker:
+
+    """ Runs a graph's write_memory node in the background, off the conversation turn.
+
+    Run turns through `run_turn`, which enables `deferred_memory_writes` and
+    tells the graph a worker is attached: the graph ends right after the reply
+    and the turn's messages are queued here for their user. A user's write
+    waits `delay` seconds; turns that arrive meanwhile, or while that user's
+    previous write is still running, are coalesced: each thread the user
+    talked in gets one reflection over its latest messages, so messages of
+    different threads never share a reflection.
+
+    A user's writes never overlap, so each one starts from the memory the
+    previous one saved.
+    """
+
+    def __init__(self, write_memory: Callable, store: BaseStore, delay: float = 1.0, workers: int = 1):
+        self.write_memory = write_memory
+        self.store = store
+        self.delay = delay
+        self.stats = Counter()
+        self._queue: queue.Queue = queue.Queue()
+        # user_id -> thread_id -> (config, messages) of the turns not yet written
+        self._pending: dict[str, dict[str, tuple[RunnableConfig, list[AnyMessage]]]] = {}
+        self._queued: set[str] = set()
+        self._running: set[str] = set()
+        self._guard = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def run_turn(self, graph, input: Any, config: RunnableConfig) -> dict:
+
+        """ Run one conversation turn, then queue its messages for a memory write """
+
+        config = {**config, "configurable": {**config.get("configurable", {}), "deferred_memory_writes": True,
+                                             MEMORY_WORKER_KEY: True}}
+        values = graph.invoke(input, config)
+        self.submit(config, values["messages"])
+        return values
+
+    def submit(self, config: RunnableConfig, messages: list[AnyMessage]) -> None:
+        """ Queue a turn's messages; a user with a write already waiting gets them added to it """
+        user_id = configuration.Configuration.from_runnable_config(config).user_id
+        thread_id = config.get("configurable", {}).get("thread_id", "")
+        with self._guard:
+            self.stats["turns"] += 1
+            pending = self._pending.setdefault(user_id, {})
+            if pending:
+                self.stats["coalesced"] += 1
+            pending[thread_id] = (config, messages)
+            if user_id not in self._queued and user_id not in self._running:
+                self._schedule(user_id)
+
+    def _schedule(self, user_id: str) -> None:
+        self._queued.add(user_id)
+        self._queue.put((time.monotonic() + self.delay, user_id))
+
+    def join(self) -> None:
+        """ Wait until every queued write is done """
+        self._queue.join()
+
+    def close(self) -> None:
+        self.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while (item := self._queue.get()) is not None:
+            due, user_id = item
+            try:
+                time.sleep(max(0.0, due - time.monotonic()))
+                with self._guard:
+                    self._queued.discard(user_id)
+                    self._running.add(user_id)
+                    turns = self._pending.pop(user_id, {})
+                if turns:
+                    self.write(list(turns.values()))
+            except Exception:
+                logger.exception("Writing memory for user %s failed", user_id)
+                self.stats["failed"] += 1
+            finally:
+                with self._guard:
+                    self._running.discard(user_id)
+                    # Turns that came in during the write get their own, later write
+                    if self._pending.get(user_id) and user_id not in self._queued:
+                        self._schedule(user_id)
+                self._queue.task_done()
+
+    def write(self, turns: list[tuple[RunnableConfig, list[AnyMessage]]]) -> None:
+
+        """ One reflection per thread in `turns`, over that thread's latest messages, one after another """
+
+        for config, messages in turns:
+            self.write_memory({"messages": messages}, config, self.store)
+            self.stats["writes"] += 1
@@ -7,13 +7,16 @@ from trustcall import create_extractor
 from langchain_core.messages import SystemMessage
 from langchain_core.messages import merge_message_runs
 from langchain_core.runnables.config import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.store.base import BaseStore
+import backends
 import configuration
+import llm_cache
+import memory_worker
+import memory_retrieval
 
 # Initialize the LLM
-model = ChatOpenAI(model="gpt-4o", temperature=0) 
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache()) 
 
 # Memory schema
 class Memory(BaseModel):
@@ -53,9 +56,9 @@ def call_model(state: MessagesState, config: RunnableConfig, store: BaseStore):
     # Get the user ID from the config
     user_id = configurable.user_id
 
-    # Retrieve memory from the store
+    # Retrieve the memories most relevant to the latest messages
     namespace = ("memories", user_id)
-    memories = store.search(namespace)
+    memories = memory_retrieval.recall(store, namespace, state["messages"], config)
 
     # Format the memories for the system prompt
     info = "\n".join(f"- {mem.value['content']}" for mem in memories)
@@ -104,11 +107,17 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
                   r.model_dump(mode="json"),
             )
 
+def route_after_model(state: MessagesState, config: RunnableConfig):
+
+    """End the turn right after the reply when a MemoryWorker writes the memory later."""
+
+    return END if memory_worker.deferred(config) else "write_memory"
+
 # Define the graph
 builder = StateGraph(MessagesState,config_schema=configuration.Configuration)
 builder.add_node("call_model", call_model)
 builder.add_node("write_memory", write_memory)
 builder.add_edge(START, "call_model")
-builder.add_edge("call_model", "write_memory")
+builder.add_conditional_edges("call_model", route_after_model, ["write_memory", END])
 builder.add_edge("write_memory", END)
 graph = builder.compile()
\ No newline at end of file
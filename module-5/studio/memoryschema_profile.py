@@ -4,13 +4,14 @@ from trustcall import create_extractor
 
 from langchain_core.messages import SystemMessage
 from langchain_core.runnables.config import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.store.base import BaseStore
+import backends
 import configuration
+import llm_cache
 
 # Initialize the LLM
-model = ChatOpenAI(model="gpt-4o", temperature=0) 
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache()) 
 
 # Schema 
 class UserProfile(BaseModel):
@@ -87,6 +88,10 @@ def write_memory(state: MessagesState, config: RunnableConfig, store: BaseStore)
     # Invoke the extractor
     result = trustcall_extractor.invoke({"messages": [SystemMessage(content=TRUSTCALL_INSTRUCTION)]+state["messages"], "existing": existing_profile})
     
+    # Nothing to save if the model's patch could not be applied
+    if not result["responses"]:
+        return
+
     # Get the updated profile as a JSON object
     updated_profile = result["responses"][0].model_dump()
 
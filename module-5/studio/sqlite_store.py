@@ -0,0 +1,385 @@
+""" A persistent BaseStore on SQLite, a drop-in for InMemoryStore in the memory graphs.
+
+    store = SqliteStore.from_path("memories.db")
+    graph = builder.compile(checkpointer=MemorySaver(), store=store)
+
+Items live in one table keyed by (namespace, key). Namespaces are stored as
+their labels joined by a separator that also ends the string, so a namespace
+prefix is a range on the index. Values are compact JSON text: filters run
+inside SQLite with json_extract, and with mmap enabled pages are read straight
+from the mapped file. Embeddings, when an index is configured, are unit float32
+vectors stored as raw bytes and scored with numpy straight from those bytes.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import numpy as np
+import orjson
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    MatchCondition,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+)
+from langgraph.store.base.embed import ensure_embeddings, get_text_at_path, tokenize_path
+
+# Ends every namespace label; the next character bounds a prefix range
+SEPARATOR = "\x1f"
+PREFIX_END = chr(ord(SEPARATOR) + 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS store (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS store_namespace_updated_idx ON store (namespace, updated_at DESC, key);
+CREATE TABLE IF NOT EXISTS store_vectors (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (namespace, key, field)
+);
+"""
+
+PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-{cache_kb};
+PRAGMA mmap_size={mmap_bytes};
+PRAGMA busy_timeout={busy_timeout_ms};
+"""
+
+UPSERT = """
+INSERT INTO store (namespace, key, value, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+"""
+
+COMPARISONS = {"$eq": "IS", "$ne": "IS NOT", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def encode_namespace(namespace: tuple[str, ...]) -> str:
+    return "".join(label + SEPARATOR for label in namespace)
+
+def decode_namespace(text: str) -> tuple[str, ...]:
+    return tuple(text.split(SEPARATOR)[:-1])
+
+def _timestamp(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+def _encode_vector(vector: list[float]) -> bytes:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tobytes()
+
+def _json_path(path: list[str]) -> Optional[str]:
+    if any('"' in part for part in path):
+        return None
+    return "$." + ".".join(f'"{part}"' for part in path)
+
+def _scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def _filter_sql(filter: dict, path: list[str], clauses: list[str], params: list, rest: dict) -> None:
+
+    """ Turn the parts of a filter SQLite can check into clauses; the rest is matched in Python """
+
+    for field, expected in filter.items():
+        field_path = path + [field]
+        json_path = _json_path(field_path)
+        if json_path is None:
+            rest[tuple(field_path)] = expected
+        elif isinstance(expected, dict) and expected and not any(k.startswith("$") for k in expected):
+            # Nested objects match field by field
+            _filter_sql(expected, field_path, clauses, params, rest)
+        elif isinstance(expected, dict) and expected.keys() <= COMPARISONS.keys() and all(map(_scalar, expected.values())):
+            for operator, operand in expected.items():
+                numeric = operator not in ("$eq", "$ne")
+                if numeric and not isinstance(operand, (int, float)):
+                    rest.setdefault(tuple(field_path), {})[operator] = operand
+                    continue
+                column = f"json_extract(value, '{json_path}')"
+                if numeric:
+                    # Only numbers compare, as in InMemoryStore
+                    column = f"CASE WHEN json_type(value, '{json_path}') IN ('integer', 'real') THEN {column} END"
+                clauses.append(f"{column} {COMPARISONS[operator]} ?")
+                params.append(operand)
+        elif _scalar(expected):
+            clauses.append(f"json_extract(value, '{json_path}') IS ?")
+            params.append(expected)
+        else:
+            rest[tuple(field_path)] = expected
+
+def _lookup(value: Any, path: tuple[str, ...]) -> Any:
+    for part in path:
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def _compare(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, dict):
+        if any(k.startswith("$") for k in expected):
+            return all(_operator(actual, operator, operand) for operator, operand in expected.items())
+        return isinstance(actual, dict) and all(_compare(actual.get(k), v) for k, v in expected.items())
+    if isinstance(expected, (list, tuple)):
+        return (isinstance(actual, (list, tuple)) and len(actual) == len(expected)
+                and all(_compare(a, e) for a, e in zip(actual, expected)))
+    return actual == expected
+
+def _operator(actual: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return actual == operand
+    if operator == "$ne":
+        return actual != operand
+    if operator not in COMPARISONS:
+        raise ValueError(f"Unsupported operator: {operator}")
+    try:
+        actual, operand = float(actual), float(operand)
+    except (TypeError, ValueError):
+        return False
+    return {"$gt": actual > operand, "$gte": actual >= operand, "$lt": actual < operand, "$lte": actual <= operand}[operator]
+
+def _matches(namespace: tuple[str, ...], condition: MatchCondition) -> bool:
+    path = condition.path
+    if len(namespace) < len(path):
+        return False
+    labels = namespace[:len(path)] if condition.match_type == "prefix" else namespace[len(namespace) - len(path):]
+    return all(p == "*" or p == label for label, p in zip(labels, path))
+
+class SqliteStore(BaseStore):
+
+    """ Long-term memory in a SQLite file, with the same API as InMemoryStore.
+
+    Every batch runs in one transaction, so several puts cost one commit.
+    Search returns a namespace's items newest first, sub-namespaces after
+    their parent, in index order so a page stops reading once it is full.
+
+    With an `index` (the IndexConfig InMemoryStore takes), puts embed the
+    indexed fields and a search `query` ranks the matching items by cosine
+    similarity. Without one a `query` is ignored and items come back
+    unscored, as from an InMemoryStore without an index.
+    """
+
+    def __init__(self,
+                 conn: sqlite3.Connection,
+                 *,
+                 index: Optional[IndexConfig] = None,
+                 cache_kb: int = 64 * 1024,
+                 mmap_bytes: int = 256 * 1024 * 1024,
+                 busy_timeout_ms: int = 5000):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.index_config = dict(index) if index else None
+        self.embeddings = ensure_embeddings(index.get("embed")) if index else None
+        self._fields = [(path, tokenize_path(path) if path != "$" else path)
+                        for path in ((index or {}).get("fields") or ["$"])]
+        with self.lock:
+            self.conn.executescript(PRAGMAS.format(cache_kb=cache_kb, mmap_bytes=mmap_bytes,
+                                                   busy_timeout_ms=busy_timeout_ms))
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "SqliteStore":
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    @classmethod
+    @contextmanager
+    def from_conn_string(cls, path: str, **kwargs) -> Iterator["SqliteStore"]:
+        store = cls.from_path(path, **kwargs)
+        try:
+            yield store
+        finally:
+            store.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def batch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        # Embed outside the lock; a real model call can take a while
+        vectors = self._embed_puts(ops)
+        queries = {op.query: self.embeddings.embed_query(op.query) for op in ops
+                   if isinstance(op, SearchOp) and op.query and self.embeddings}
+        with self.lock, self.conn:
+            cur = self.conn.cursor()
+            results = []
+            for op in ops:
+                if isinstance(op, GetOp):
+                    results.append(self._get(cur, op))
+                elif isinstance(op, SearchOp):
+                    results.append(self._search(cur, op, queries.get(op.query)))
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(cur, op))
+                elif isinstance(op, PutOp):
+                    self._put(cur, op, vectors.get(id(op), []))
+                    results.append(None)
+                else:
+                    raise ValueError(f"Unknown operation type: {type(op)}")
+            return results
+
+    async def abatch(self, ops: Iterable[Op]) -> list[Result]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.batch, list(ops))
+
+    def _embed_puts(self, ops: list[Op]) -> dict[int, list[tuple[str, bytes]]]:
+
+        """ Embed the indexed fields of every put in one call, keyed by the id of the op """
+
+        if not self.embeddings:
+            return {}
+        texts, owners = [], []
+        for op in ops:
+            if not isinstance(op, PutOp) or op.value is None or op.index is False:
+                continue
+            paths = self._fields if op.index is None else [(path, tokenize_path(path)) for path in op.index]
+            for path, tokens in paths:
+                found = get_text_at_path(op.value, tokens)
+                for i, text in enumerate(found):
+                    texts.append(text)
+                    owners.append((id(op), path if len(found) == 1 else f"{path}.{i}"))
+        vectors = defaultdict(list)
+        if texts:
+            for (op_id, field), vector in zip(owners, self.embeddings.embed_documents(texts)):
+                vectors[op_id].append((field, _encode_vector(vector)))
+        return vectors
+
+    def _get(self, cur: sqlite3.Cursor, op: GetOp) -> Optional[Item]:
+        row = cur.execute(
+            "SELECT value, created_at, updated_at FROM store WHERE namespace = ? AND key = ?",
+            (encode_namespace(op.namespace), op.key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at, updated_at = row
+        return Item(value=orjson.loads(value), key=op.key, namespace=op.namespace,
+                    created_at=_timestamp(created_at), updated_at=_timestamp(updated_at))
+
+    def _put(self, cur: sqlite3.Cursor, op: PutOp, vectors: list[tuple[str, bytes]]) -> None:
+        namespace = encode_namespace(op.namespace)
+        if op.value is None:
+            cur.execute("DELETE FROM store WHERE namespace = ? AND key = ?", (namespace, op.key))
+        else:
+            now = time.time()
+            cur.execute(UPSERT, (namespace, op.key, orjson.dumps(op.value).decode(), now, now))
+        if self.embeddings:
+            cur.execute("DELETE FROM store_vectors WHERE namespace = ? AND key = ?", (namespace, op.key))
+            cur.executemany("INSERT INTO store_vectors (namespace, key, field, embedding) VALUES (?, ?, ?, ?)",
+                            [(namespace, op.key, field, embedding) for field, embedding in vectors])
+
+    def _search(self, cur: sqlite3.Cursor, op: SearchOp, query: Optional[list[float]] = None) -> list[SearchItem]:
+        prefix = encode_namespace(op.namespace_prefix)
+        clauses, params, rest = [], [], {}
+        if prefix:
+            clauses.append("namespace >= ? AND namespace < ?")
+            params += [prefix, prefix[:-1] + PREFIX_END]
+        if op.filter:
+            _filter_sql(op.filter, [], clauses, params, rest)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if query is not None:
+            return self._vector_search(cur, op, query, where, params, rest)
+        sql = f"SELECT namespace, key, value, created_at, updated_at FROM store {where} ORDER BY namespace, updated_at DESC, key"
+        if not rest:
+            # Everything was checked in SQL, so SQL can page too
+            sql += " LIMIT ? OFFSET ?"
+            params += [op.limit, op.offset]
+
+        items, skipped = [], 0
+        for namespace, key, value, created_at, updated_at in cur.execute(sql, params):
+            value = orjson.loads(value)
+            if rest:
+                if not all(_compare(_lookup(value, path), expected) for path, expected in rest.items()):
+                    continue
+                if skipped < op.offset:
+                    skipped += 1
+                    continue
+            items.append(SearchItem(namespace=decode_namespace(namespace), key=key, value=value,
+                                    created_at=_timestamp(created_at), updated_at=_timestamp(updated_at)))
+            if len(items) == op.limit:
+                break
+        return items
+
+    def _vector_search(self, cur: sqlite3.Cursor, op: SearchOp, query: list[float],
+                       where: str, params: list, rest: dict) -> list[SearchItem]:
+
+        """ Rank the items that pass the filter by their best field's cosine similarity to the query """
+
+        if op.filter:
+            rows = cur.execute(
+                f"SELECT c.namespace, c.key, c.value, v.embedding FROM "
+                f"(SELECT namespace, key, {'value' if rest else 'NULL AS value'} FROM store {where}) c "
+                f"LEFT JOIN store_vectors v ON v.namespace = c.namespace AND v.key = c.key",
+                params,
+            ).fetchall()
+        else:
+            # Without a filter the vectors table alone covers the namespace range
+            rows = cur.execute(f"SELECT namespace, key, NULL, embedding FROM store_vectors {where}", params).fetchall()
+        if rest:
+            passed = {}
+            for namespace, key, value, _ in rows:
+                if (namespace, key) not in passed:
+                    value = orjson.loads(value)
+                    passed[namespace, key] = all(_compare(_lookup(value, path), expected) for path, expected in rest.items())
+            rows = [row for row in rows if passed[row[0], row[1]]]
+
+        wanted = op.offset + op.limit
+        ranked, seen = [], set()
+        embedded = [row for row in rows if row[3] is not None]
+        if embedded:
+            matrix = np.frombuffer(b"".join(row[3] for row in embedded), dtype=np.float32).reshape(len(embedded), -1)
+            scores = matrix @ np.frombuffer(_encode_vector(query), dtype=np.float32)
+            # An item's first appearance in score order is its best field
+            for i in np.argsort(-scores, kind="stable").tolist():
+                namespace, key = embedded[i][0], embedded[i][1]
+                if (namespace, key) not in seen:
+                    seen.add((namespace, key))
+                    ranked.append((namespace, key, float(scores[i])))
+                    if len(ranked) == wanted:
+                        break
+
+        # Items without an embedding come after the scored ones, as in InMemoryStore
+        if len(ranked) < wanted:
+            if op.filter:
+                unscored = [(namespace, key) for namespace, key, _, embedding in rows if embedding is None]
+            else:
+                unscored = cur.execute(
+                    f"SELECT namespace, key FROM store s {where} {'AND' if where else 'WHERE'} NOT EXISTS "
+                    f"(SELECT 1 FROM store_vectors v WHERE v.namespace = s.namespace AND v.key = s.key) "
+                    f"ORDER BY namespace, updated_at DESC, key LIMIT ?",
+                    [*params, wanted - len(ranked)],
+                ).fetchall()
+            ranked += [(namespace, key, None) for namespace, key in unscored]
+
+        items = []
+        for namespace, key, score in ranked[op.offset:wanted]:
+            value, created_at, updated_at = cur.execute(
+                "SELECT value, created_at, updated_at FROM store WHERE namespace = ? AND key = ?", (namespace, key),
+            ).fetchone()
+            items.append(SearchItem(namespace=decode_namespace(namespace), key=key, value=orjson.loads(value),
+                                    created_at=_timestamp(created_at), updated_at=_timestamp(updated_at), score=score))
+        return items
+
+    def _list_namespaces(self, cur: sqlite3.Cursor, op: ListNamespacesOp) -> list[tuple[str, ...]]:
+        namespaces = [decode_namespace(namespace) for namespace, in cur.execute("SELECT DISTINCT namespace FROM store")]
+        if op.match_conditions:
+            namespaces = [ns for ns in namespaces if all(_matches(ns, condition) for condition in op.match_conditions)]
+        if op.max_depth is not None:
+            namespaces = {ns[:op.max_depth] for ns in namespaces}
+        return sorted(namespaces)[op.offset:op.offset + op.limit]
@@ -0,0 +1,108 @@
+""" Turn latency of task_mAIstro loading its three memory namespaces in one store round trip versus three.
+
+The store is an InMemoryStore that sleeps for a network round trip on every
+batch call, standing in for the Postgres store of docker-compose-example.yml.
+
+sequential   every op of a batch is its own round trip, as the three store.search calls were
+batched      a batch is one round trip, as with the Postgres store
+
+The chat model is a fake that replies without calling tools, so a turn is the
+memory load plus one model call.
+
+Run from this directory:
+
+    python bench_memory_load.py --turns 200 --round-trip 0.005 --jitter 0.002
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+import fakes
+import memory_blocks
+import task_maistro
+
+class LatencyStore(InMemoryStore):
+
+    """ An InMemoryStore that pays a network round trip per batch, or per op when `per_op` is set """
+
+    def __init__(self, round_trip: float, jitter: float = 0.0, per_op: bool = False, seed: int = 0):
+        super().__init__()
+        self.round_trip = round_trip
+        self.jitter = jitter
+        self.per_op = per_op
+        self.round_trips = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self, ops: list) -> float:
+        with self._lock:
+            trips = len(ops) if self.per_op else 1
+            self.round_trips += trips
+            return sum(self.round_trip + (self._rng.expovariate(1 / self.jitter) if self.jitter else 0.0) for _ in range(trips))
+
+    def batch(self, ops):
+        ops = list(ops)
+        time.sleep(self._delay(ops))
+        return super().batch(ops)
+
+    async def abatch(self, ops):
+        ops = list(ops)
+        await asyncio.sleep(self._delay(ops))
+        return await super().abatch(ops)
+
+class ReplyModel(fakes.FakeChatModel):
+
+    """ Always replies with text, so the turn ends after task_mAIstro """
+
+    def _respond(self, messages, tools=None, tool_choice=None):
+        return super()._respond(messages)
+
+def seed(store: InMemoryStore, user_id: str, todos: int) -> None:
+    store.put(("profile", "general", user_id), "profile", {"name": "Lance", "location": "San Francisco", "job": "engineer",
+                                                          "connections": [], "interests": ["biking"]})
+    for i in range(todos):
+        store.put(("todo", "general", user_id), f"todo-{i}", {"task": f"Task {i}", "time_to_complete": 30, "deadline": None,
+                                                             "solutions": ["Look it up"], "status": "not started"})
+    store.put(("instructions", "general", user_id), "user_instructions", {"memory": "Always add deadlines."})
+    for memory_type in ("profile", "todo", "instructions"):
+        memory_blocks.bump(store, memory_type, "general", user_id)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--round-trip", type=float, default=0.005, help="Store latency per round trip (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.002, help="Mean of the exponential extra latency per round trip (seconds)")
+    parser.add_argument("--todos", type=int, default=8)
+    args = parser.parse_args()
+
+    task_maistro.model = ReplyModel()
+    print(f"{'mode':<12}{'round trips/turn':>18}{'p50 ms':>9}{'p99 ms':>9}")
+    for per_op in (True, False):
+        memory_blocks.clear()
+        store = LatencyStore(args.round_trip, args.jitter, per_op=per_op)
+        seed(store, "lance", args.todos)
+        graph = task_maistro.builder.compile(store=store)
+        config = {"configurable": {"user_id": "lance"}}
+        store.round_trips = 0
+        latencies = []
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=f"What should I do first today? ({turn})")]}, config)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{'sequential' if per_op else 'batched':<12}{store.round_trips / args.turns:>18.1f}"
+              f"{statistics.median(latencies) * 1000:>9.1f}{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
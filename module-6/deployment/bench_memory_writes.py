@@ -0,0 +1,180 @@
+""" Store write volume of task_mAIstro's memory updates over a replayed conversation.
+
+The conversation keeps coming back to things it already said: restated facts,
+tasks added twice, a status set to what it already is. A rule-based model
+patches every field a message mentions, as chat models tend to, so many of
+the documents Trustcall hands back are unchanged. Before, each of them was put
+back with its own store call; now unchanged ones are skipped and the rest go
+out in one batch with the namespace's new ETag.
+
+Run from this directory:
+
+    python bench_memory_writes.py --turns 1000
+"""
+
+import argparse
+import ast
+import os
+import re
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.base import PutOp
+from langgraph.store.memory import InMemoryStore
+
+import fakes
+import memory_blocks
+import memory_writes
+import task_maistro
+
+FACTS = [
+    "My name is Lance.",
+    "Add task: book the dentist.",
+    "I live in San Francisco.",
+    "Add task: renew the passport.",
+    "I like biking.",
+    "Start book the dentist.",
+    "I live in San Francisco.",
+    "Add task: book the dentist.",
+    "Mark book the dentist done.",
+    "I work as an engineer.",
+    "Mark book the dentist done.",
+    "I like biking.",
+    "Start renew the passport.",
+    "I live in Oakland.",
+    "Mark renew the passport done.",
+    "Reopen book the dentist.",
+]
+CHATTER = ["How is my week looking?", "Thanks, that helps.", "Anything I should do first?"]
+
+PROFILE = re.compile(r"My name is (?P<name>[^.]+)\.|I live in (?P<location>[^.]+)\.|I work as (?:an? )?(?P<job>[^.]+)\.|I like (?P<interest>[^.]+)\.")
+TODO = re.compile(r"(?P<verb>Add task:|Start|Mark|Reopen) (?P<task>.+?)(?: done)?\.")
+STATUS = {"Start": "in progress", "Mark": "done", "Reopen": "not started"}
+INSTANCE = re.compile(r'<instance id=(\S+) schema_type="(\w+)">\n(.*?)\n</instance>', re.DOTALL)
+
+def said(messages) -> str:
+    return " ".join(m.content for m in messages if isinstance(m, HumanMessage))
+
+class ReplayModel(fakes.FakeChatModel):
+
+    """ Routes facts to memory updates and patches every field they mention, changed or not """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        names = [tool["function"]["name"] for tool in kwargs.get("tools") or []]
+        if "UpdateMemory" in names:
+            message = self._route(messages)
+        elif names:
+            instances = [match for m in messages if isinstance(m, SystemMessage) for match in INSTANCE.findall(m.content)]
+            existing = {doc_id: ast.literal_eval(doc) for doc_id, _, doc in instances}
+            # With existing memories only PatchDoc may be bound, so their type tells the schema
+            extract = self._profile if "Profile" in names + [schema for _, schema, _ in instances] else self._todos
+            message = AIMessage(content="", tool_calls=[{**call, "id": f"call_{i}"}
+                                                        for i, call in enumerate(extract(said(messages), existing))])
+        else:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        time.sleep(self._first_token_latency(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _route(self, messages):
+        turn = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        wanted = [update_type for update_type, pattern in (("user", PROFILE), ("todo", TODO)) if pattern.search(messages[turn].content)]
+        requested = [call["args"]["update_type"] for m in messages[turn:] if isinstance(m, AIMessage) for call in m.tool_calls]
+        pending = [update_type for update_type in wanted if update_type not in requested][:1]
+        if not pending:
+            return AIMessage(content="Noted.")
+        return AIMessage(content="", tool_calls=[{"name": "UpdateMemory", "args": {"update_type": pending[0]}, "id": f"call_{turn}"}])
+
+    def _profile(self, text, existing):
+        doc_id, current = next(iter(existing.items()), (None, None))
+        patches = []
+        for match in PROFILE.finditer(text):
+            field, value = next((k, v) for k, v in match.groupdict().items() if v)
+            if field == "interest":
+                interests = (current or {}).get("interests", [])
+                patches.append({"op": "replace", "path": "/interests", "value": interests + [value] if value not in interests else interests})
+            else:
+                patches.append({"op": "replace", "path": f"/{field}", "value": value})
+        if doc_id is None:
+            profile = {"name": None, "location": None, "job": None, "connections": [], "interests": []}
+            for patch in patches:
+                profile[patch["path"][1:]] = patch["value"]
+            return [{"name": "Profile", "args": profile}]
+        return [{"name": "PatchDoc", "args": {"json_doc_id": doc_id, "planned_edits": "", "patches": patches}}]
+
+    def _todos(self, text, existing):
+        tasks = {doc["task"]: doc_id for doc_id, doc in existing.items()}
+        calls = []
+        for match in TODO.finditer(text):
+            task, status = match["task"], STATUS.get(match["verb"])
+            if task not in tasks:
+                calls.append({"name": "ToDo", "args": {"task": task, "time_to_complete": 30, "deadline": None,
+                                                       "solutions": [f"Set aside time to {task}"], "status": status or "not started"}})
+            else:
+                patch = {"op": "replace", "path": "/status", "value": status} if status else {"op": "replace", "path": "/task", "value": task}
+                calls.append({"name": "PatchDoc", "args": {"json_doc_id": tasks[task], "planned_edits": "", "patches": [patch]}})
+        if not calls and existing:
+            calls.append({"name": "PatchDoc", "args": {"json_doc_id": next(iter(existing)), "planned_edits": "", "patches": []}})
+        return calls
+
+class WriteCountingStore(InMemoryStore):
+
+    """ Counts memory puts, ETag puts and the store calls that carry them """
+
+    def __init__(self):
+        super().__init__()
+        self.puts = 0
+        self.etag_puts = 0
+        self.write_calls = 0
+
+    def batch(self, ops):
+        ops = list(ops)
+        puts = [op for op in ops if isinstance(op, PutOp)]
+        if puts:
+            self.write_calls += 1
+            self.etag_puts += sum(op.namespace[0] == memory_blocks.VERSIONS for op in puts)
+            self.puts += sum(op.namespace[0] != memory_blocks.VERSIONS for op in puts)
+        return super().batch(ops)
+
+def memory_updates(graph, turns: int) -> int:
+    """ The update nodes run across all replayed threads """
+    return sum(1 for thread in range((turns + 49) // 50)
+               for m in graph.get_state({"configurable": {"thread_id": f"replay-{thread}"}}).values["messages"]
+               if m.type == "tool")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    task_maistro.model = ReplayModel()
+    store = WriteCountingStore()
+    graph = task_maistro.builder.compile(checkpointer=MemorySaver(), store=store)
+    start = time.perf_counter()
+    for turn in range(args.turns):
+        line = FACTS[(turn // 2) % len(FACTS)] if turn % 2 == 0 else CHATTER[turn % len(CHATTER)]
+        # A new thread every 50 turns, so the replayed history stays a realistic size
+        config = {"configurable": {"thread_id": f"replay-{turn // 50}", "user_id": "lance"}}
+        graph.invoke({"messages": [HumanMessage(content=line)]}, config)
+    elapsed = time.perf_counter() - start
+
+    stats = memory_writes.stats
+    returned = stats["writes"] + stats["writes_avoided"]
+    updates = memory_updates(graph, args.turns)
+    print(f"{args.turns} turns, {updates} memory updates, {elapsed:.1f} s")
+    print(f"{'':<9}{'doc puts':>10}{'ETag puts':>11}{'store calls':>13}")
+    # Before: one put and one store call per returned document, plus the ETag bump of every update
+    print(f"{'before':<9}{returned:>10}{updates:>11}{returned + updates:>13}")
+    print(f"{'after':<9}{store.puts:>10}{store.etag_puts:>11}{store.write_calls:>13}")
+    print(f"\nwrites avoided: {stats['writes_avoided']} of {returned} ({stats['writes_avoided'] / max(returned, 1):.0%})")
+
+    assert store.puts == stats["writes"]
+    todos = [(item.value["task"], item.value["status"]) for item in store.search(("todo", "general", "lance"))]
+    print(f"profile: {store.search(('profile', 'general', 'lance'))[0].value}\ntodos:   {todos}")
+
+if __name__ == "__main__":
+    main()
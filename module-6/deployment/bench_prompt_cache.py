@@ -0,0 +1,98 @@
+""" Cost of rendering task_mAIstro's memory blocks from fresh searches versus the ETag-validated cache.
+
+uncached   search the three namespaces every turn and render them, as task_mAIstro did
+cached     memory_blocks.render: read the ETags, search and render only what a write touched
+
+Between turns a random memory type is written (with its ETag bumped, as the
+update nodes do) with probability --write-rate. Both paths must render the
+same blocks every turn.
+
+Run from this directory:
+
+    python bench_prompt_cache.py --turns 2000 --todos 50 --write-rate 0.1
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langgraph.store.base import SearchOp
+
+import memory_blocks
+import task_maistro
+from bench_memory_load import LatencyStore, seed
+
+class CountingStore(LatencyStore):
+
+    """ Counts the memories every batch returns """
+
+    items_read = 0
+
+    def batch(self, ops):
+        results = super().batch(ops)
+        self.items_read += sum(len(r) if isinstance(r, list) else r is not None for r in results)
+        return results
+
+def uncached(store, todo_category: str, user_id: str) -> dict[str, str]:
+    memory_types = list(task_maistro.MEMORY_RENDERERS)
+    results = store.batch([SearchOp((t, todo_category, user_id)) for t in memory_types])
+    return {t: task_maistro.MEMORY_RENDERERS[t](memories) for t, memories in zip(memory_types, results)}
+
+def write(store, rng: random.Random, turn: int, todos: int) -> None:
+    memory_type = rng.choice(list(task_maistro.MEMORY_RENDERERS))
+    if memory_type == "profile":
+        store.put(("profile", "general", "lance"), "profile", {"name": "Lance", "location": f"City {turn}", "job": "engineer",
+                                                              "connections": [], "interests": ["biking"]})
+    elif memory_type == "todo":
+        store.put(("todo", "general", "lance"), f"todo-{rng.randrange(todos)}", {"task": f"Task {turn}", "time_to_complete": 30,
+                                                                               "deadline": None, "solutions": ["Look it up"],
+                                                                               "status": "in progress"})
+    else:
+        store.put(("instructions", "general", "lance"), "user_instructions", {"memory": f"Always add deadlines ({turn})."})
+    memory_blocks.bump(store, memory_type, "general", "lance")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--todos", type=int, default=50)
+    parser.add_argument("--write-rate", type=float, default=0.1, help="Chance of a memory write between two turns")
+    args = parser.parse_args()
+
+    store = CountingStore(round_trip=0.0)
+    seed(store, "lance", args.todos)
+    for memory_type in task_maistro.MEMORY_RENDERERS:
+        memory_blocks.bump(store, memory_type, "general", "lance")
+
+    rng = random.Random(0)
+    timings = {"uncached": [], "cached": []}
+    reads = {"uncached": 0, "cached": 0}
+    trips = {"uncached": 0, "cached": 0}
+    for turn in range(args.turns):
+        if rng.random() < args.write_rate:
+            write(store, rng, turn, args.todos)
+        blocks = {}
+        for name, fn in (("uncached", uncached), ("cached", memory_blocks.render)):
+            items, round_trips = store.items_read, store.round_trips
+            start = time.perf_counter()
+            blocks[name] = fn(store, "general", "lance", task_maistro.MEMORY_RENDERERS) if name == "cached" else fn(store, "general", "lance")
+            timings[name].append(time.perf_counter() - start)
+            reads[name] += store.items_read - items
+            trips[name] += store.round_trips - round_trips
+        assert blocks["uncached"] == blocks["cached"]
+
+    print(f"{'path':<10}{'p50 us':>9}{'p99 us':>9}{'items read/turn':>17}{'round trips/turn':>18}")
+    for name, latencies in timings.items():
+        latencies.sort()
+        print(f"{name:<10}{statistics.median(latencies) * 1e6:>9.0f}{latencies[int(len(latencies) * 0.99)] * 1e6:>9.0f}"
+              f"{reads[name] / args.turns:>17.1f}{trips[name] / args.turns:>18.2f}")
+
+    role = task_maistro.configuration.Configuration().task_maistro_role
+    print(f"\nstatic system prompt prefix: {len(task_maistro.MODEL_SYSTEM_MESSAGE.format(task_maistro_role=role))} chars")
+
+if __name__ == "__main__":
+    main()
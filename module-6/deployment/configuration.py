@@ -12,6 +12,9 @@ class Configuration:
     user_id: str = "default-user"
     todo_category: str = "general" 
     task_maistro_role: str = "You are a helpful task management assistant. You help you create, organize, and manage the user's ToDo list."
+    parallel_memory_updates: bool = False # Let the agent request several memory updates at once and run them in parallel
+    incremental_reflection: bool = True # Send the memory extractor only the messages since its last reflection on this thread
+    backend: str = "live" # "fake" runs on the local stand-ins in fakes.py, see backends.py (or set BACKEND)
 
     @classmethod
     def from_runnable_config(
@@ -26,4 +29,13 @@ class Configuration:
             for f in fields(cls)
             if f.init
         }
-        return cls(**{k: v for k, v in values.items() if v})
\ No newline at end of file
+        # Environment variables arrive as strings, and 0 / False are valid overrides
+        types = {f.name: f.type for f in fields(cls)}
+        return cls(**{k: _parse(types[k], v) for k, v in values.items() if v is not None and v != ""})
+
+def _parse(type_, value):
+    if type_ is bool and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    if type_ in (int, float):
+        return type_(value)
+    return value
\ No newline at end of file
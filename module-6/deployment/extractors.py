@@ -0,0 +1,29 @@
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from trustcall import create_extractor
+
+# (model id, schemas, options) -> (model, extractor); the model is kept so its id stays unique
+_pool: dict[tuple, tuple[BaseChatModel, Runnable]] = {}
+_lock = threading.Lock()
+
+def get_extractor(model: BaseChatModel, tools: Sequence[Any], **options) -> Runnable:
+
+    """ A Trustcall extractor for these schemas and options, built on first use and then shared.
+
+    Extractors hold no per-call state, so one instance serves every thread.
+    Capture what a call did with a callback passed in that call's config.
+    """
+
+    key = (id(model), tuple(tools), tuple(sorted(options.items())))
+    with _lock:
+        if key not in _pool:
+            _pool[key] = (model, create_extractor(model, tools=list(tools), **options))
+        return _pool[key][1]
+
+def clear() -> None:
+    with _lock:
+        _pool.clear()
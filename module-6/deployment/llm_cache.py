@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+# Message fields that change between otherwise identical calls
+VOLATILE_MESSAGE_FIELDS = ("id", "usage_metadata", "response_metadata")
+
+# Next to this module, so the cache doesn't land in whatever directory the server was started from
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.db")
+
+def _dumps(generations: RETURN_VAL_TYPE) -> str:
+    return json.dumps([
+        {"message": message_to_dict(g.message)} if isinstance(g, ChatGeneration) else {"text": g.text}
+        for g in generations
+    ])
+
+def _loads(response: str) -> RETURN_VAL_TYPE:
+    return [
+        ChatGeneration(message=messages_from_dict([g["message"]])[0]) if "message" in g else Generation(text=g["text"])
+        for g in json.loads(response)
+    ]
+
+class TieredCache(BaseCache):
+
+    """ Content-addressed LLM response cache: an in-memory LRU tier in front of an on-disk SQLite tier.
+
+    The database is opened on the first lookup or update, so importing a graph
+    that holds the cache doesn't create it.
+    """
+
+    def __init__(self,
+                 database_path: str = DEFAULT_PATH,
+                 maxsize: int = 1024,
+                 ttl: Optional[float] = 7 * 24 * 60 * 60):
+        self.database_path = database_path
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # LRU tier: key -> (created_at, serialized generations)
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # SQLite tier, opened lazily
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            conn = sqlite3.connect(self.database_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, "
+                "response TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created_at ON llm_cache (created_at)")
+            if self.ttl is not None:
+                conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """ Hash the serialized messages together with the model configuration.
+
+        `llm_string` already carries the model name and every bound kwarg, which
+        includes the tools from `bind_tools` and the schema from `with_structured_output`.
+        Per-call bookkeeping (ids, usage and response metadata) is dropped from the
+        messages so a replayed AI message hashes the same as the original one.
+        """
+        try:
+            messages = json.loads(prompt)
+            for message in messages:
+                for field in VOLATILE_MESSAGE_FIELDS:
+                    message.get("kwargs", {}).pop(field, None)
+            prompt = json.dumps(messages, sort_keys=True)
+        except (ValueError, TypeError, AttributeError):
+            pass
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """ Look up in memory first, then on disk """
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+
+            # Memory tier
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return _loads(entry[1])
+                del self._memory[key]
+
+            # Disk tier
+            row = self._conn.execute(
+                "SELECT created_at, response FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                created_at, response = row
+                if not self._expired(created_at):
+                    self._remember(key, created_at, response)
+                    self.disk_hits += 1
+                    return _loads(response)
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """ Write through to both tiers """
+        key = self.make_key(prompt, llm_string)
+        response = _dumps(return_val)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, response)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, created_at),
+            )
+            self._conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        """ Drop every cached response """
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def evict_expired(self) -> int:
+        """ Delete entries older than the TTL from both tiers """
+        if self.ttl is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in [k for k, (created_at, _) in self._memory.items() if created_at < cutoff]:
+                del self._memory[key]
+            deleted = self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (cutoff,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> dict:
+        """ Hit / miss counters since the cache was created """
+        lookups = self.hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_cache: Optional[TieredCache] = None
+
+def get_cache() -> Optional[TieredCache]:
+    """ Shared cache for every model in this process, configured from the environment.
+
+    LLM_CACHE=off disables caching. LLM_CACHE_PATH (default: .llm_cache.db next
+    to this module), LLM_CACHE_MAXSIZE and LLM_CACHE_TTL (seconds, 0 for no
+    expiry) tune the two tiers.
+    """
+    global _cache
+    if os.environ.get("LLM_CACHE", "on").lower() in ("off", "false", "0"):
+        return None
+    if _cache is None:
+        ttl = float(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 60 * 60))
+        _cache = TieredCache(database_path=os.environ.get("LLM_CACHE_PATH", DEFAULT_PATH),
+                             maxsize=int(os.environ.get("LLM_CACHE_MAXSIZE", 1024)),
+                             ttl=ttl or None)
+    return _cache
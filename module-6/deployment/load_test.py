@@ -0,0 +1,207 @@
+""" Load test for task_maistro: N simulated users chatting at once across many ToDo categories.
+
+in-process (default)  compiles the graph with a deterministic fake chat model (bench_memory_writes.ReplayModel),
+                      a MemorySaver and a local InMemoryStore that can add a round trip of latency per store call
+--url                 drives a running `langgraph dev` or langgraph-api server through the SDK; the server's own
+                      model and store are used (start it with BACKEND=fake for the fake chat model), so store
+                      ops and store growth are not reported
+
+Every user keeps one ToDo category and states facts, adds tasks, changes their
+status and chats, drawn from a per-user seeded script. Reports throughput,
+turn latency percentiles, store ops per turn and, every --sample seconds, how
+the store and the process grow.
+
+Run from this directory:
+
+    python load_test.py --users 20 --categories 4 --duration 30 --latency 0.2
+    python load_test.py --users 20 --duration 30 --url http://localhost:2024
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+os.environ.setdefault("LLM_CACHE", "off")
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.store.base import PutOp
+
+import task_maistro
+from bench_memory_load import LatencyStore
+from bench_memory_writes import CHATTER, ReplayModel
+
+PROFILE_FACTS = ["My name is {name}.", "I live in {city}.", "I work as a {job}.", "I like {interest}."]
+NAMES = ["Lance", "Ada", "Grace", "Alan", "Barbara", "Ken"]
+CITIES = ["San Francisco", "Oakland", "Berlin", "Lisbon", "Tokyo"]
+JOBS = ["engineer", "teacher", "designer", "nurse"]
+INTERESTS = ["biking", "baking", "chess", "climbing", "jazz"]
+TASKS = ["book the dentist", "renew the passport", "plan the offsite", "buy a gift", "fix the bike", "call the bank"]
+
+class LoadStore(LatencyStore):
+
+    """ A LatencyStore that also counts ops by type and tracks how many memories it holds and their size """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ops = Counter()
+        self.sizes: dict[tuple, int] = {}
+
+    def batch(self, ops):
+        ops = list(ops)
+        with self._lock:
+            self.ops["batch"] += 1
+            for op in ops:
+                self.ops[type(op).__name__] += 1
+                if isinstance(op, PutOp):
+                    if op.value is None:
+                        self.sizes.pop((op.namespace, op.key), None)
+                    else:
+                        self.sizes[(op.namespace, op.key)] = len(json.dumps(op.value))
+        return super().batch(ops)
+
+def script(user: int, seed: int):
+    """ An endless, seeded stream of one user's messages """
+    rng = random.Random(f"{seed}:{user}")
+    tasks = []
+    while True:
+        roll = rng.random()
+        if roll < 0.25:
+            yield rng.choice(PROFILE_FACTS).format(name=rng.choice(NAMES), city=rng.choice(CITIES),
+                                                   job=rng.choice(JOBS), interest=rng.choice(INTERESTS))
+        elif roll < 0.45 or not tasks:
+            tasks.append(f"{rng.choice(TASKS)} {len(tasks) + 1}")
+            yield f"Add task: {tasks[-1]}."
+        elif roll < 0.6:
+            yield f"{rng.choice(['Start', 'Mark', 'Reopen'])} {rng.choice(tasks)}{' done' if rng.random() < 0.5 else ''}."
+        else:
+            yield rng.choice(CHATTER)
+
+def rss_mb() -> float:
+    """ Resident set size of this process; the peak where /proc is not available """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def in_process(args):
+    """ A turn function running the graph in this process, and its store """
+    task_maistro.model = ReplayModel(latency=args.latency, prompt_token_latency=args.prompt_token_latency)
+    store = LoadStore(args.store_latency, args.store_jitter)
+    graph = task_maistro.builder.compile(checkpointer=MemorySaver(), store=store)
+
+    def turn(user: int, thread: int, message: str) -> None:
+        graph.invoke({"messages": [HumanMessage(content=message)]}, config(args, user, thread))
+
+    return turn, store
+
+def remote(args):
+    """ A turn function running the graph on a LangGraph server """
+    from langgraph_sdk import get_sync_client
+
+    client = get_sync_client(url=args.url)
+    threads: dict[tuple[int, int], str] = {}
+
+    def turn(user: int, thread: int, message: str) -> None:
+        if (user, thread) not in threads:
+            threads[(user, thread)] = client.threads.create()["thread_id"]
+        client.runs.wait(threads[(user, thread)], args.assistant, input={"messages": [{"role": "user", "content": message}]},
+                         config={"configurable": config(args, user, thread)["configurable"]})
+
+    return turn, None
+
+def config(args, user: int, thread: int) -> dict:
+    return {"configurable": {"thread_id": f"load-{user}-{thread}", "user_id": f"user-{user}",
+                             "todo_category": f"category-{user % args.categories}",
+                             "parallel_memory_updates": args.parallel}}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--categories", type=int, default=4, help="Distinct todo_category values the users are spread over")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep the users chatting")
+    parser.add_argument("--think", type=float, default=0.5, help="Pause between a reply and the user's next message")
+    parser.add_argument("--thread-turns", type=int, default=20, help="Turns before a user starts a new thread")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="Fake LLM latency per prompt token (seconds)")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="Store latency per round trip (seconds)")
+    parser.add_argument("--store-jitter", type=float, default=0.0, help="Mean of the exponential extra store latency (seconds)")
+    parser.add_argument("--parallel", action="store_true", help="Let the agent run memory updates in parallel")
+    parser.add_argument("--sample", type=float, default=5.0, help="Seconds between growth samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="LangGraph server to load instead of running the graph in-process")
+    parser.add_argument("--assistant", default="task_maistro", help="Assistant or graph id on the server")
+    args = parser.parse_args()
+
+    turn, store = remote(args) if args.url else in_process(args)
+    latencies: list[float] = []
+    errors = Counter()
+    guard = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    done = threading.Event()
+
+    def user(i: int) -> None:
+        messages = script(i, args.seed)
+        count = 0
+        while time.perf_counter() < deadline:
+            begin = time.perf_counter()
+            try:
+                turn(i, count // args.thread_turns, next(messages))
+            except Exception as e:
+                with guard:
+                    errors[type(e).__name__] += 1
+            else:
+                with guard:
+                    latencies.append(time.perf_counter() - begin)
+            count += 1
+            time.sleep(args.think)
+
+    samples = []
+
+    def sample() -> None:
+        while not done.wait(args.sample):
+            with guard:
+                turns = len(latencies)
+            items, size = (len(store.sizes), sum(store.sizes.values())) if store else (None, None)
+            samples.append((time.perf_counter() - start, turns, items, size, rss_mb()))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(args.users) as pool:
+        list(pool.map(user, range(args.users)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    latencies.sort()
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{'in-process' if store else args.url}: {args.users} users, {args.categories} categories, {elapsed:.1f} s")
+    print(f"turns {len(latencies)}, errors {sum(errors.values())} {dict(errors) or ''}")
+    if latencies:
+        print(f"throughput {len(latencies) / elapsed:.1f} turns/s")
+        print(f"turn latency ms  p50 {statistics.median(latencies) * 1000:.0f}  p95 {percentile(0.95):.0f}  p99 {percentile(0.99):.0f}"
+              f"  max {latencies[-1] * 1000:.0f}")
+    if store and latencies:
+        print("store ops/turn   " + "  ".join(f"{name} {count / len(latencies):.2f}" for name, count in sorted(store.ops.items())))
+
+    print(f"\n{'t s':>7}{'turns':>8}{'turns/s':>9}{'memories':>10}{'store KB':>10}{'RSS MB':>9}")
+    previous_t, previous_turns = 0.0, 0
+    for t, turns, items, size, rss in samples:
+        print(f"{t:>7.1f}{turns:>8}{(turns - previous_turns) / (t - previous_t):>9.1f}"
+              f"{items if items is not None else '-':>10}{f'{size / 1024:.1f}' if size is not None else '-':>10}{rss:>9.1f}")
+        previous_t, previous_turns = t, turns
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+
+from langgraph.store.base import BaseStore, GetOp, Item, PutOp, SearchOp
+
+# Namespace prefix of the ETags the memory writes leave behind, one item per memory type
+VERSIONS = "memory_versions"
+
+# Rendered blocks kept for the most recently served (memory type, category, user)
+MAX_BLOCKS = 10_000
+
+# Seconds a cached block is trusted for (MEMORY_BLOCKS_TTL, 0 to disable the cache). Only writes that go
+# through `bump` move the ETag; a memory written any other way (a Studio edit, another graph sharing the
+# store) shows up once the block ages out, or at once if the writer calls `bump` after it.
+TTL = float(os.environ.get("MEMORY_BLOCKS_TTL", 60))
+
+# (memory type, category, user id) -> (ETag, rendered block, time cached)
+_blocks: OrderedDict[tuple[str, str, str], tuple[str, str, float]] = OrderedDict()
+_lock = threading.Lock()
+
+def bump(store: BaseStore, memory_type: str, todo_category: str, user_id: str) -> None:
+
+    """ Give a memory type a new ETag after writing to it, so every cached rendering of it goes stale.
+
+    A random ETag rather than a counter: writers need no read-modify-write, so
+    concurrent writes can't end up sharing a version.
+    """
+
+    store.batch([bump_op(memory_type, todo_category, user_id)])
+
+def bump_op(memory_type: str, todo_category: str, user_id: str) -> PutOp:
+    """ The write `bump` makes, to send in the same batch as the memory writes """
+    return PutOp((VERSIONS, todo_category, user_id), memory_type, {"etag": uuid.uuid4().hex})
+
+def render(store: BaseStore, todo_category: str, user_id: str,
+           renderers: dict[str, Callable[[list[Item]], str]]) -> dict[str, str]:
+
+    """ The rendered block of every memory type in `renderers`, reusing cached ones whose ETag still matches.
+
+    The ETags are read in one batch, together with the memories of types that
+    have nothing cached (or only blocks older than TTL); stale types are searched
+    in a second batch. Memories written without an ETag (before any write went
+    through `bump`) are never cached.
+    """
+
+    memory_types = list(renderers)
+    now = time.monotonic()
+    with _lock:
+        cached = {t: _blocks.get((t, todo_category, user_id)) for t in memory_types}
+    cached = {t: entry if entry is not None and now - entry[2] < TTL else None for t, entry in cached.items()}
+    cold = [t for t in memory_types if cached[t] is None]
+
+    results = store.batch([GetOp((VERSIONS, todo_category, user_id), t) for t in memory_types] +
+                          [SearchOp((t, todo_category, user_id)) for t in cold])
+    etags = {t: item.value["etag"] if item else None for t, item in zip(memory_types, results)}
+    memories = dict(zip(cold, results[len(memory_types):]))
+
+    stale = [t for t in memory_types if t not in memories and (etags[t] is None or cached[t][0] != etags[t])]
+    if stale:
+        memories.update(zip(stale, store.batch([SearchOp((t, todo_category, user_id)) for t in stale])))
+
+    blocks = {}
+    with _lock:
+        for t in memory_types:
+            key = (t, todo_category, user_id)
+            if t in memories:
+                blocks[t] = renderers[t](memories[t])
+                if etags[t] is not None and TTL > 0:
+                    _blocks[key] = (etags[t], blocks[t], now)
+            else:
+                blocks[t] = cached[t][1]
+            if key in _blocks:
+                _blocks.move_to_end(key)
+        while len(_blocks) > MAX_BLOCKS:
+            _blocks.popitem(last=False)
+    return blocks
+
+def clear() -> None:
+    with _lock:
+        _blocks.clear()
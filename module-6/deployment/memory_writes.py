@@ -0,0 +1,42 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+from typing import Optional
+
+from langgraph.store.base import BaseStore, Item, PutOp
+
+import memory_blocks
+
+# Documents written and writes skipped because the content was unchanged, across all users
+stats: Counter = Counter()
+_lock = threading.Lock()
+
+def content_hash(value: dict) -> str:
+    """ Hash of a memory's JSON content, independent of key order """
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def write(store: BaseStore, memory_type: str, todo_category: str, user_id: str,
+          existing: Optional[list[Item]], docs: list[tuple[str, dict]]) -> int:
+
+    """ Write the (key, value) docs of a memory type whose content changed, in one batch with a new ETag.
+
+    Trustcall hands back every document it looked at, patched or not; those
+    that hash the same as the stored copy in `existing` are skipped, so they
+    keep their updated_at and the rendered prompt blocks stay cached.
+    Returns the number of documents written.
+    """
+
+    hashes = {item.key: content_hash(item.value) for item in existing or []}
+    namespace = (memory_type, todo_category, user_id)
+    puts = [memory_blocks.bump_op(memory_type, todo_category, user_id)]
+    for key, value in docs:
+        if hashes.get(key) != content_hash(value):
+            hashes[key] = content_hash(value)
+            puts.append(PutOp(namespace, key, value))
+    with _lock:
+        stats["writes"] += len(puts) - 1
+        stats["writes_avoided"] += len(docs) - (len(puts) - 1)
+    if len(puts) > 1:
+        store.batch(puts)
+    return len(puts) - 1
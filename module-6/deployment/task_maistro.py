@@ -3,40 +3,40 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
-from trustcall import create_extractor
-
-from typing import Literal, Optional, TypedDict
+from typing import Annotated, Literal, Optional, TypedDict
 
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
 from langchain_core.messages import merge_message_runs
 from langchain_core.messages import SystemMessage, HumanMessage
 
-from langchain_openai import ChatOpenAI
 
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, MessagesState, START, END
+from langgraph.types import Send
 from langgraph.store.base import BaseStore
 from langgraph.store.memory import InMemoryStore
 
+import backends
 import configuration
+import extractors
+import llm_cache
+import memory_blocks
+import memory_writes
 
 ## Utilities 
 
 # Inspect the tool calls for Trustcall
-class Spy:
+class Spy(BaseCallbackHandler):
+    """ Collects the tool calls of every chat model call in the run it is passed to """
     def __init__(self):
         self.called_tools = []
 
-    def __call__(self, run):
-        q = [run]
-        while q:
-            r = q.pop()
-            if r.child_runs:
-                q.extend(r.child_runs)
-            if r.run_type == "chat_model":
-                self.called_tools.append(
-                    r.outputs["generations"][0][0]["message"]["kwargs"]["tool_calls"]
-                )
+    def on_llm_end(self, response, **kwargs):
+        message = getattr(response.generations[0][0], "message", None)
+        if message is not None:
+            self.called_tools.append(message.tool_calls)
 
 # Extract information from tool calls for both patches and new memories in Trustcall
 def extract_tool_info(tool_calls, schema_name="Memory"):
@@ -95,6 +95,19 @@ def extract_tool_info(tool_calls, schema_name="Memory"):
     
     return "\n\n".join(result_parts)
 
+## State
+
+def merge_watermarks(left: dict, right: dict) -> dict:
+    return {**(left or {}), **(right or {})}
+
+class State(MessagesState):
+    # Id of the last message each memory type has reflected on in this thread
+    reflected: Annotated[dict[str, str], merge_watermarks]
+
+class UpdateState(State):
+    # Input of the update nodes: the tool calls route_message sent them, in parallel mode
+    tool_call_ids: list[str]
+
 ## Schema definitions
 
 # User profile schema
@@ -138,18 +151,12 @@ class UpdateMemory(TypedDict):
     update_type: Literal['user', 'todo', 'instructions']
 
 # Initialize the model
-model = ChatOpenAI(model="gpt-4o", temperature=0)
-
-## Create the Trustcall extractors for updating the user profile and ToDo list
-profile_extractor = create_extractor(
-    model,
-    tools=[Profile],
-    tool_choice="Profile",
-)
+model = backends.chat_model(model="gpt-4o", temperature=0, cache=llm_cache.get_cache())
 
 ## Prompts 
 
 # Chatbot instruction for choosing what to update and what tools to call 
+# Holds nothing that changes between turns, so it stays a stable prefix for provider-side prompt caching
 MODEL_SYSTEM_MESSAGE = """{task_maistro_role} 
 
 You have a long term memory which keeps track of three things:
@@ -157,21 +164,6 @@ You have a long term memory which keeps track of three things:
 2. The user's ToDo list
 3. General instructions for updating the ToDo list
 
-Here is the current User Profile (may be empty if no information has been collected yet):
-<user_profile>
-{user_profile}
-</user_profile>
-
-Here is the current ToDo List (may be empty if no tasks have been added yet):
-<todo>
-{todo}
-</todo>
-
-Here are the current user-specified preferences for updating the ToDo list (may be empty if no preferences have been specified yet):
-<instructions>
-{instructions}
-</instructions>
-
 Here are your instructions for reasoning about the user's messages:
 
 1. Reason carefully about the user's messages as presented below. 
@@ -190,6 +182,29 @@ Here are your instructions for reasoning about the user's messages:
 
 5. Respond naturally to user user after a tool call was made to save memories, or if no tool call was made."""
 
+# The memories, appended after the static part of the system message
+MEMORY_MESSAGE = """Here is the current User Profile (may be empty if no information has been collected yet):
+<user_profile>
+{user_profile}
+</user_profile>
+
+Here is the current ToDo List (may be empty if no tasks have been added yet):
+<todo>
+{todo}
+</todo>
+
+Here are the current user-specified preferences for updating the ToDo list (may be empty if no preferences have been specified yet):
+<instructions>
+{instructions}
+</instructions>"""
+
+# How each memory type is rendered into MEMORY_MESSAGE
+MEMORY_RENDERERS = {
+    "profile": lambda memories: f"{memories[0].value if memories else None}",
+    "todo": lambda memories: "\n".join(f"{mem.value}" for mem in memories),
+    "instructions": lambda memories: f"{memories[0].value if memories else ''}",
+}
+
 # Trustcall instruction
 TRUSTCALL_INSTRUCTION = """Reflect on following interaction. 
 
@@ -212,7 +227,29 @@ Your current instructions are:
 
 ## Node definitions
 
-def task_mAIstro(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def answered_tool_call_ids(state: UpdateState) -> list[str]:
+    """The tool calls an update node answers: those sent to it in parallel mode, otherwise the first one."""
+    return state.get("tool_call_ids") or [state['messages'][-1].tool_calls[0]['id']]
+
+def messages_to_reflect(state: State, memory_type: str, incremental: bool) -> tuple[list, Optional[str]]:
+    """The messages a reflection for `memory_type` reads, and the watermark to record once it is done.
+
+    Incrementally, that is only the messages after the last one this memory type
+    reflected on; the existing memories carry what was learned before.
+    """
+    messages = state['messages'][:-1]
+    watermark = messages[-1].id if messages else None
+    if not incremental:
+        return messages, watermark
+    ids = [m.id for m in messages]
+    last = (state.get("reflected") or {}).get(memory_type)
+    new = messages[ids.index(last) + 1:] if last in ids else messages
+    # Tool results can't open a conversation, nor can the tool calls they answer
+    while new and (new[0].type == "tool" or (new[0].type == "ai" and new[0].tool_calls)):
+        new = new[1:]
+    return new, watermark
+
+def task_mAIstro(state: State, config: RunnableConfig, store: BaseStore):
 
     """Load memories from the store and use them to personalize the chatbot's response."""
     
@@ -222,35 +259,19 @@ def task_mAIstro(state: MessagesState, config: RunnableConfig, store: BaseStore)
     todo_category = configurable.todo_category
     task_maistro_role = configurable.task_maistro_role
 
-   # Retrieve profile memory from the store
-    namespace = ("profile", todo_category, user_id)
-    memories = store.search(namespace)
-    if memories:
-        user_profile = memories[0].value
-    else:
-        user_profile = None
-
-    # Retrieve people memory from the store
-    namespace = ("todo", todo_category, user_id)
-    memories = store.search(namespace)
-    todo = "\n".join(f"{mem.value}" for mem in memories)
+    # Render the profile, ToDo and instruction memories, reusing the blocks no write has touched since
+    blocks = memory_blocks.render(store, todo_category, user_id, MEMORY_RENDERERS)
 
-    # Retrieve custom instructions
-    namespace = ("instructions", todo_category, user_id)
-    memories = store.search(namespace)
-    if memories:
-        instructions = memories[0].value
-    else:
-        instructions = ""
-    
-    system_msg = MODEL_SYSTEM_MESSAGE.format(task_maistro_role=task_maistro_role, user_profile=user_profile, todo=todo, instructions=instructions)
+    # Static instructions first, memories last
+    system_msg = (MODEL_SYSTEM_MESSAGE.format(task_maistro_role=task_maistro_role) + "\n\n" +
+                  MEMORY_MESSAGE.format(user_profile=blocks["profile"], todo=blocks["todo"], instructions=blocks["instructions"]))
 
     # Respond using memory as well as the chat history
-    response = model.bind_tools([UpdateMemory], parallel_tool_calls=False).invoke([SystemMessage(content=system_msg)]+state["messages"])
+    response = model.bind_tools([UpdateMemory], parallel_tool_calls=configurable.parallel_memory_updates).invoke([SystemMessage(content=system_msg)]+state["messages"])
 
     return {"messages": [response]}
 
-def update_profile(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_profile(state: UpdateState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
@@ -273,25 +294,31 @@ def update_profile(state: MessagesState, config: RunnableConfig, store: BaseStor
                           else None
                         )
 
+    # Only the messages this memory type has not reflected on yet, unless configured otherwise
+    reflect_on, watermark = messages_to_reflect(state, "profile", configurable.incremental_reflection)
+    if not reflect_on:
+        return {"messages": [{"role": "tool", "content": "nothing new to reflect on", "tool_call_id": tool_call_id}
+                             for tool_call_id in answered_tool_call_ids(state)]}
+
     # Merge the chat history and the instruction
     TRUSTCALL_INSTRUCTION_FORMATTED=TRUSTCALL_INSTRUCTION.format(time=datetime.now().isoformat())
-    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + state["messages"][:-1]))
+    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + reflect_on))
 
-    # Invoke the extractor
+    # Invoke the shared profile extractor; it follows `model` if that is swapped
+    profile_extractor = extractors.get_extractor(model, [Profile], tool_choice="Profile")
     result = profile_extractor.invoke({"messages": updated_messages, 
                                          "existing": existing_memories})
 
-    # Save save the memories from Trustcall to the store
-    for r, rmeta in zip(result["responses"], result["response_metadata"]):
-        store.put(namespace,
-                  rmeta.get("json_doc_id", str(uuid.uuid4())),
-                  r.model_dump(mode="json"),
-            )
-    tool_calls = state['messages'][-1].tool_calls
+    # Save the memories from Trustcall to the store, skipping those it left unchanged
+    memory_writes.write(store, "profile", todo_category, user_id, existing_items,
+                        [(rmeta.get("json_doc_id", str(uuid.uuid4())), r.model_dump(mode="json"))
+                         for r, rmeta in zip(result["responses"], result["response_metadata"])])
     # Return tool message with update verification
-    return {"messages": [{"role": "tool", "content": "updated profile", "tool_call_id":tool_calls[0]['id']}]}
+    return {"messages": [{"role": "tool", "content": "updated profile", "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_call_ids(state)],
+            "reflected": {"profile": watermark}}
 
-def update_todos(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_todos(state: UpdateState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
@@ -314,40 +341,40 @@ def update_todos(state: MessagesState, config: RunnableConfig, store: BaseStore)
                           else None
                         )
 
+    # Only the messages this memory type has not reflected on yet, unless configured otherwise
+    reflect_on, watermark = messages_to_reflect(state, "todo", configurable.incremental_reflection)
+    if not reflect_on:
+        return {"messages": [{"role": "tool", "content": "nothing new to reflect on", "tool_call_id": tool_call_id}
+                             for tool_call_id in answered_tool_call_ids(state)]}
+
     # Merge the chat history and the instruction
     TRUSTCALL_INSTRUCTION_FORMATTED=TRUSTCALL_INSTRUCTION.format(time=datetime.now().isoformat())
-    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + state["messages"][:-1]))
+    updated_messages=list(merge_message_runs(messages=[SystemMessage(content=TRUSTCALL_INSTRUCTION_FORMATTED)] + reflect_on))
 
     # Initialize the spy for visibility into the tool calls made by Trustcall
     spy = Spy()
     
-    # Create the Trustcall extractor for updating the ToDo list 
-    todo_extractor = create_extractor(
-    model,
-    tools=[ToDo],
-    tool_choice=tool_name,
-    enable_inserts=True
-    ).with_listeners(on_end=spy)
-
-    # Invoke the extractor
+    # The Trustcall extractor for updating the ToDo list is built once and shared
+    todo_extractor = extractors.get_extractor(model, [ToDo], tool_choice=tool_name, enable_inserts=True)
+
+    # Invoke the extractor, with the spy attached to this call only
     result = todo_extractor.invoke({"messages": updated_messages, 
-                                         "existing": existing_memories})
+                                         "existing": existing_memories},
+                                   merge_configs(config, {"callbacks": [spy]}))
 
-    # Save save the memories from Trustcall to the store
-    for r, rmeta in zip(result["responses"], result["response_metadata"]):
-        store.put(namespace,
-                  rmeta.get("json_doc_id", str(uuid.uuid4())),
-                  r.model_dump(mode="json"),
-            )
+    # Save the memories from Trustcall to the store, skipping those it left unchanged
+    memory_writes.write(store, "todo", todo_category, user_id, existing_items,
+                        [(rmeta.get("json_doc_id", str(uuid.uuid4())), r.model_dump(mode="json"))
+                         for r, rmeta in zip(result["responses"], result["response_metadata"])])
         
     # Respond to the tool call made in task_mAIstro, confirming the update    
-    tool_calls = state['messages'][-1].tool_calls
-
     # Extract the changes made by Trustcall and add the the ToolMessage returned to task_mAIstro
     todo_update_msg = extract_tool_info(spy.called_tools, tool_name)
-    return {"messages": [{"role": "tool", "content": todo_update_msg, "tool_call_id":tool_calls[0]['id']}]}
+    return {"messages": [{"role": "tool", "content": todo_update_msg, "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_call_ids(state)],
+            "reflected": {"todo": watermark}}
 
-def update_instructions(state: MessagesState, config: RunnableConfig, store: BaseStore):
+def update_instructions(state: UpdateState, config: RunnableConfig, store: BaseStore):
 
     """Reflect on the chat history and update the memory collection."""
     
@@ -364,33 +391,44 @@ def update_instructions(state: MessagesState, config: RunnableConfig, store: Bas
     system_msg = CREATE_INSTRUCTIONS.format(current_instructions=existing_memory.value if existing_memory else None)
     new_memory = model.invoke([SystemMessage(content=system_msg)]+state['messages'][:-1] + [HumanMessage(content="Please update the instructions based on the conversation")])
 
-    # Overwrite the existing memory in the store 
+    # Overwrite the existing memory in the store, unless the instructions came back unchanged
     key = "user_instructions"
-    store.put(namespace, key, {"memory": new_memory.content})
-    tool_calls = state['messages'][-1].tool_calls
+    memory_writes.write(store, "instructions", todo_category, user_id, [existing_memory] if existing_memory else None,
+                        [(key, {"memory": new_memory.content})])
     # Return tool message with update verification
-    return {"messages": [{"role": "tool", "content": "updated instructions", "tool_call_id":tool_calls[0]['id']}]}
+    return {"messages": [{"role": "tool", "content": "updated instructions", "tool_call_id": tool_call_id}
+                         for tool_call_id in answered_tool_call_ids(state)]}
 
 # Conditional edge
-def route_message(state: MessagesState, config: RunnableConfig, store: BaseStore) -> Literal[END, "update_todos", "update_instructions", "update_profile"]:
+def route_message(state: State, config: RunnableConfig, store: BaseStore) -> Literal[END, "update_todos", "update_instructions", "update_profile"]:
 
     """Reflect on the memories and chat history to decide whether to update the memory collection."""
     message = state['messages'][-1]
     if len(message.tool_calls) ==0:
         return END
+
+    configurable = configuration.Configuration.from_runnable_config(config)
+    if configurable.parallel_memory_updates:
+        # Run every requested update at once; calls for the same memory type share one node
+        tool_call_ids = {}
+        for tool_call in message.tool_calls:
+            tool_call_ids.setdefault(update_node(tool_call), []).append(tool_call['id'])
+        return [Send(node, {**state, "tool_call_ids": ids}) for node, ids in tool_call_ids.items()]
+    return update_node(message.tool_calls[0])
+
+def update_node(tool_call) -> str:
+    """The node that handles an UpdateMemory tool call."""
+    if tool_call['args']['update_type'] == "user":
+        return "update_profile"
+    elif tool_call['args']['update_type'] == "todo":
+        return "update_todos"
+    elif tool_call['args']['update_type'] == "instructions":
+        return "update_instructions"
     else:
-        tool_call = message.tool_calls[0]
-        if tool_call['args']['update_type'] == "user":
-            return "update_profile"
-        elif tool_call['args']['update_type'] == "todo":
-            return "update_todos"
-        elif tool_call['args']['update_type'] == "instructions":
-            return "update_instructions"
-        else:
-            raise ValueError
+        raise ValueError
 
 # Create the graph + all nodes
-builder = StateGraph(MessagesState, config_schema=configuration.Configuration)
+builder = StateGraph(State, config_schema=configuration.Configuration)
 
 # Define the flow of the memory extraction process
 builder.add_node(task_mAIstro)